@@ -16,15 +16,18 @@ from shared.system_hooks import create_system_reminder_hook
 from .tools import (
     LS,
     Bash,
+    BashJobs,
     Edit,
     ExitPlanMode,
     Git,
     Glob,
     Grep,
     MultiEdit,
+    MultiFileEdit,
     NotebookEdit,
     NotebookRead,
     Read,
+    Rollback,
     TodoWrite,
     Write,
     ClaudeWebSearch,
@@ -57,6 +60,7 @@ def create_agency_code_agent(
         hooks=reminder_hook,
         tools=[
             Bash,
+            BashJobs,
             Glob,
             Grep,
             LS,
@@ -64,7 +68,9 @@ def create_agency_code_agent(
             Read,
             Edit,
             MultiEdit,
+            MultiFileEdit,
             Write,
+            Rollback,
             NotebookRead,
             NotebookEdit,
             TodoWrite,
@@ -1,4 +1,5 @@
 from .bash import Bash
+from .bash_jobs import BashJobs
 from .edit import Edit
 from .exit_plan_mode import ExitPlanMode
 from .git import Git
@@ -6,15 +7,18 @@ from .glob import Glob
 from .grep import Grep
 from .ls import LS
 from .multi_edit import MultiEdit
+from .multi_file_edit import MultiFileEdit
 from .notebook_edit import NotebookEdit
 from .notebook_read import NotebookRead
 from .read import Read
+from .rollback import Rollback
 from .todo_write import TodoWrite
 from .write import Write
 from .claude_web_search import ClaudeWebSearch
 
 __all__ = [
     "Bash",
+    "BashJobs",
     "Glob",
     "Grep",
     "LS",
@@ -22,7 +26,9 @@ __all__ = [
     "Read",
     "Edit",
     "MultiEdit",
+    "MultiFileEdit",
     "Write",
+    "Rollback",
     "NotebookRead",
     "NotebookEdit",
     "TodoWrite",
@@ -1,14 +1,32 @@
 import os
 import subprocess
 import threading
+import time
 from typing import Optional
 
 from agency_swarm.tools import BaseTool
 from pydantic import Field
 
-# Global execution lock to prevent parallel bash commands
-_bash_execution_lock = threading.Lock()
-_bash_busy = False  # Track if a bash command is currently executing
+from agency_code_agent.tools.utils import (
+    ResourceUsage,
+    describe_limit_signal,
+    get_job_manager,
+    get_metrics_registry,
+    get_shell_session,
+    invalidate_all,
+    tail_lines,
+)
+
+# Background commands that exit within this time are reported as failures
+BACKGROUND_START_CHECK_SECONDS = 1.0
+
+# Commands of one agent session run one at a time; across sessions at most
+# this many run at once
+MAX_CONCURRENT_COMMANDS = int(os.getenv("AGENCY_CODE_BASH_CONCURRENCY", "4"))
+# How long a command may wait for its turn before giving up
+QUEUE_TIMEOUT_SECONDS = float(os.getenv("AGENCY_CODE_BASH_QUEUE_TIMEOUT", "300"))
+
+_bash_slots = threading.BoundedSemaphore(MAX_CONCURRENT_COMMANDS)
 
 
 class Bash(BaseTool):
@@ -35,7 +53,7 @@ class Bash(BaseTool):
       - The command argument is required.
       - You can specify an optional timeout in milliseconds (up to 600000ms / 10 minutes). If not specified, commands will timeout after 120000ms (2 minutes).
       - It is very helpful if you write a clear, concise description of what this command does in 5-10 words.
-      - If the output exceeds 30000 characters, output will be truncated before being returned to you.
+      - If the output exceeds 30000 characters, output will be truncated before being returned to you: you get the beginning and the end, with the number of bytes left out in between.
       - VERY IMPORTANT: Prefer the specialized tools (Grep, Glob, Read, LS, Task) over shell commands with the same names. Do not call CLI `grep`, `find`, or `rg` here for code/content search; use the Grep tool. Do not call CLI `ls` to enumerate; use the LS tool. Do not call CLI `cat`/`head`/`tail` to read files; use the Read tool.
       - When issuing multiple commands, use the ';' or '&&' operator to separate them. Multiline scripts are allowed when needed.
       - Try to maintain your current working directory throughout the session by using absolute paths and avoiding usage of `cd`. You may use `cd` if the User explicitly requests it.
@@ -45,6 +63,10 @@ class Bash(BaseTool):
         <bad-example>
         cd /foo/bar && pytest tests
         </bad-example>
+      - The shell keeps its state between commands: the working directory, exported variables and activated virtualenvs carry over to the next call. A command that times out restarts the shell in the same directory, resetting that state.
+      - Each result reports what the command used: wall time, user and system CPU time, peak memory (RSS, when measured) and bytes of output.
+      - A command that times out is killed together with every process it started. On Linux, each process is limited in CPU time, memory (address space), open files and process count.
+      - Calls made while an earlier command of this session is still running wait for it to finish and then run in order; they are not rejected.
 
 
 
@@ -129,7 +151,7 @@ class Bash(BaseTool):
     )
     background: bool = Field(
         False,
-        description="If True, run the command in the background and return immediately. The command will be validated first (with a 5-second timeout) to catch immediate errors before starting the background process. Useful for long-running processes like development servers.",
+        description="If True, run the command in the background as a job and return its job ID. The command's output goes to a log file. Use the BashJobs tool to poll, tail, wait for or kill the job. The command is syntax-checked first, and a command that fails within a second is reported immediately. Useful for long-running processes like development servers and long builds.",
     )
 
     description: Optional[str] = Field(
@@ -139,25 +161,7 @@ class Bash(BaseTool):
 
     def run(self):
         """Execute the bash command."""
-        global _bash_busy
-
         try:
-            # Check if another bash command is currently executing
-            if _bash_busy:
-                return """Exit code: 1
-Error: Terminal is currently busy executing another command.
-
-🔄 Only one bash command can execute at a time to prevent conflicts.
-
-💡 Please wait for the current command to complete before submitting the next one.
-   Submit your commands sequentially, not in parallel.
-
-ℹ️  If you have multiple commands to run, either:
-   - Wait and submit them one at a time, or
-   - Combine them using ';' or '&&' operators in a single command
-
-Example: echo "first" && echo "second" && ls -la"""
-
             # Set timeout (convert from milliseconds to seconds)
             timeout_seconds = self.timeout / 1000
 
@@ -178,20 +182,28 @@ Example: echo "first" && echo "second" && ls -la"""
                     command = modifier(command)
                     break
 
-            # Execute with proper locking to prevent parallel execution
-            with _bash_execution_lock:
-                _bash_busy = True
+            # Wait for this session's earlier commands, then for a free slot
+            session = get_shell_session(self.context, wrapper=self._sandbox_wrapper())
+            deadline = time.monotonic() + QUEUE_TIMEOUT_SECONDS
+            if not session.queue.acquire(QUEUE_TIMEOUT_SECONDS):
+                return _queue_timeout_message("earlier commands of this session")
+            try:
+                if not _bash_slots.acquire(timeout=max(0.0, deadline - time.monotonic())):
+                    return _queue_timeout_message("commands of other sessions")
                 try:
                     return self._execute_bash_command(command, timeout_seconds)
                 finally:
-                    _bash_busy = False
+                    _bash_slots.release()
+                    # The command may have changed anything on disk
+                    invalidate_all()
+            finally:
+                session.queue.release()
 
         except Exception as e:
-            _bash_busy = False  # Make sure to clear busy flag on exception
             return f"Exit code: 1\nError executing command: {str(e)}"
 
     def _execute_bash_command(self, command, timeout_seconds):
-        """Execute a bash command using subprocess.run with proper timeout."""
+        """Execute a bash command in the session's persistent shell with proper timeout."""
         output = ""
         try:
             # Build execution command, handling different operating systems
@@ -207,67 +219,79 @@ Example: echo "first" && echo "second" && ls -la"""
             # Handle background execution
             if self.background:
                 return self._execute_background_command(exec_cmd, command)
-            try:
-                if platform.system() == "Darwin" and os.path.exists(
-                    "/usr/bin/sandbox-exec"
-                ):
-                    cwd = os.getcwd()
-                    policy = f"""(version 1)
-(allow default)
-(deny file-write*)
-(allow file-write* (subpath \"{cwd}\"))
-(allow file-write* (subpath \"/tmp\"))
-(allow file-write* (subpath \"/private/tmp\"))
-"""
-                    exec_cmd = [
-                        "/usr/bin/sandbox-exec",
-                        "-p",
-                        policy,
-                        "/bin/bash",
-                        "-c",
-                        command,
-                    ]
-            except Exception:
-                # If sandbox detection/build fails, fall back to normal execution
-                if platform.system() == "Windows":
-                    exec_cmd = ["powershell", "-Command", command]
-                else:
-                    exec_cmd = ["/bin/bash", "-c", command]
-
-            result = subprocess.run(
-                exec_cmd,
-                capture_output=True,
-                text=True,
-                timeout=timeout_seconds,
-                cwd=os.getcwd(),
-                env=os.environ.copy(),
-            )
 
-            # Combine stdout and stderr
-            if result.stdout:
-                output += result.stdout
-            if result.stderr:
-                if output:
-                    output += "\n"
-                output += result.stderr
+            session = get_shell_session(self.context, wrapper=self._sandbox_wrapper())
+            if platform.system() == "Windows":
+                # No persistent shell on Windows; each command runs in a fresh PowerShell
+                started = time.monotonic()
+                result = subprocess.run(
+                    exec_cmd,
+                    capture_output=True,
+                    text=True,
+                    timeout=timeout_seconds,
+                    cwd=os.getcwd(),
+                    env=os.environ.copy(),
+                )
+                exit_code = result.returncode
+                output = result.stdout or ""
+                if result.stderr:
+                    if output:
+                        output += "\n"
+                    output += result.stderr
+                usage = ResourceUsage(time.monotonic() - started, output_bytes=len(output.encode()))
+                output = _truncate(output)
+                status = "ok"
+            else:
+                # Output is already bounded: the first and last bytes are kept as it streams
+                exit_code, output_buffer, status, usage = session.run(command, timeout_seconds)
+                output = output_buffer.render()
+            get_metrics_registry().observe(session.id, command, usage)
+
+            if status == "timeout":
+                return (
+                    f"Exit code: 124\nCommand timed out after {timeout_seconds} seconds\n"
+                    f"Usage: {usage.summary()}\n"
+                    f"--- OUTPUT ---\n{output.strip()}\n"
+                    f"(The shell session was restarted in {session.cwd}; exported variables and other shell state were reset)"
+                )
+            note = ""
+            limit_note = describe_limit_signal(exit_code)
+            if limit_note:
+                note += f"\n({limit_note})"
+            if status == "exited":
+                note += "\n(The shell exited; a new shell session will be started for the next command)"
 
             # Handle empty output
             if not output.strip():
-                return f"Exit code: {result.returncode}\n(Command completed with no output)"
+                return f"Exit code: {exit_code}\nUsage: {usage.summary()}\n(Command completed with no output){note}"
 
-            # Truncate if too long
-            if len(output) > 30000:
-                output = (
-                    output[-30000:] + "\n (output truncated to last 30000 characters)"
-                )
-
-            return f"Exit code: {result.returncode}\n--- OUTPUT ---\n{output.strip()}"
+            return f"Exit code: {exit_code}\nUsage: {usage.summary()}\n--- OUTPUT ---\n{output.strip()}{note}"
 
         except subprocess.TimeoutExpired:
             return f"Exit code: 124\nCommand timed out after {timeout_seconds} seconds\n--- OUTPUT ---\n{output.strip()}"
         except Exception as e:
             return f"Exit code: 1\nError executing command: {str(e)}\n--- OUTPUT ---\n{output.strip()}"
 
+    def _sandbox_wrapper(self):
+        """On macOS, confine writes to the working directory and /tmp with sandbox-exec."""
+        import platform
+
+        try:
+            if platform.system() == "Darwin" and os.path.exists("/usr/bin/sandbox-exec"):
+                cwd = os.getcwd()
+                policy = f"""(version 1)
+(allow default)
+(deny file-write*)
+(allow file-write* (subpath \"{cwd}\"))
+(allow file-write* (subpath \"/tmp\"))
+(allow file-write* (subpath \"/private/tmp\"))
+"""
+                return ["/usr/bin/sandbox-exec", "-p", policy]
+        except Exception:
+            # If sandbox detection/build fails, fall back to normal execution
+            pass
+        return None
+
     def _execute_background_command(self, exec_cmd, command):
         """Execute a command in the background and return immediately."""
         import platform
@@ -335,27 +359,48 @@ try {{
                     env=os.environ.copy(),
                 )
 
-            else:
-                # On Unix-like systems, start the background process directly
-                background_cmd = (
-                    f"cd {os.getcwd()} && nohup {command} > /dev/null 2>&1 &"
-                )
-                result = subprocess.run(
-                    ["/bin/bash", "-c", background_cmd],
-                    capture_output=True,
-                    text=True,
-                    cwd=os.getcwd(),
-                    env=os.environ.copy(),
-                )
+                if result.returncode == 0:
+                    return f"Exit code: 0\n--- OUTPUT ---\nCommand syntax validated and started in background successfully.\nProcess ID: {result.pid if hasattr(result, 'pid') else 'N/A'}"
+                else:
+                    return f"Exit code: {result.returncode}\n--- OUTPUT ---\nFailed to start background process:\n{result.stderr}"
+
+            # On Unix-like systems, run it as a job with a captured log, in the
+            # persistent shell's current directory and with its exported variables
+            session = get_shell_session(self.context, wrapper=self._sandbox_wrapper())
+            job = get_job_manager(self.context).start(
+                command,
+                session.cwd,
+                wrapper=self._sandbox_wrapper(),
+                on_exit=lambda job: get_metrics_registry().observe(session.id, command, job.usage),
+                env=session.environ(),
+            )
 
-            if result.returncode == 0:
-                return f"Exit code: 0\n--- OUTPUT ---\nCommand syntax validated and started in background successfully.\nProcess ID: {result.pid if hasattr(result, 'pid') else 'N/A'}"
-            else:
-                return f"Exit code: {result.returncode}\n--- OUTPUT ---\nFailed to start background process:\n{result.stderr}"
+            # Report commands that fail straight away instead of leaving them to be discovered later
+            if job.wait(BACKGROUND_START_CHECK_SECONDS):
+                output = "\n".join(tail_lines(job.log.files(), 20))
+                return f"Exit code: {job.exit_code}\n--- OUTPUT ---\nBackground command exited immediately.\n{job.describe()}\n{output}".rstrip()
+            return (
+                f"Exit code: 0\n--- OUTPUT ---\nStarted background job {job.id}.\n{job.describe()}\n"
+                f"Use the BashJobs tool to poll, tail, wait for or kill it."
+            )
 
         except Exception as e:
             return f"Exit code: 1\nError starting background command: {str(e)}"
 
 
+def _queue_timeout_message(blocker: str) -> str:
+    return (
+        f"Exit code: 1\nError: The command did not start: it waited {QUEUE_TIMEOUT_SECONDS:g} seconds "
+        f"for {blocker} to finish.\nLong-running commands are better started with background=True."
+    )
+
+
+def _truncate(output: str) -> str:
+    """Keep the last 30000 characters of long output."""
+    if len(output) > 30000:
+        return output[-30000:] + "\n (output truncated to last 30000 characters)"
+    return output
+
+
 # Create alias for Agency Swarm tool loading (expects class name = file name)
 bash = Bash
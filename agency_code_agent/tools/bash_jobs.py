@@ -0,0 +1,84 @@
+from typing import Literal, Optional
+
+from agency_swarm.tools import BaseTool
+from pydantic import Field
+
+from agency_code_agent.tools.utils import get_job_manager, tail_lines
+
+
+class BashJobs(BaseTool):
+    """
+    Inspects and controls background jobs started with the Bash tool's `background=True`.
+
+    Usage:
+    - action=list shows every job of this session with its state, pid, output size and log file.
+    - action=poll shows the state of one job without waiting.
+    - action=tail returns the last `lines` lines of a job's output (stdout and stderr interleaved).
+    - action=wait blocks until the job exits or `timeout` milliseconds pass, then shows its state and the end of its output. Use it for long builds instead of polling repeatedly.
+    - action=kill stops the job and every process it started (SIGTERM, then SIGKILL after 5 seconds).
+    - Jobs keep running while you use other tools, so start a dev server or a long build in the background and keep working.
+    """
+
+    action: Literal["list", "poll", "tail", "wait", "kill"] = Field(
+        ..., description="What to do: list, poll, tail, wait or kill"
+    )
+    job_id: Optional[int] = Field(
+        None, description="The job ID printed by Bash when the job was started. Required except for list."
+    )
+    lines: int = Field(50, ge=1, le=2000, description="Number of output lines to return for tail and wait")
+    timeout: int = Field(
+        30000,
+        ge=0,
+        le=600000,
+        description="For wait: how long to wait in milliseconds (max 600000)",
+    )
+
+    def run(self):
+        try:
+            manager = get_job_manager(self.context)
+
+            if self.action == "list":
+                jobs = manager.jobs()
+                if not jobs:
+                    return "No background jobs have been started in this session."
+                return "\n\n".join(job.describe() for job in jobs)
+
+            if self.job_id is None:
+                return f"Error: job_id is required for {self.action}"
+            job = manager.get(self.job_id)
+            if job is None:
+                return f"Error: No background job with ID {self.job_id}. Use action=list to see the jobs."
+
+            if self.action == "poll":
+                return job.describe()
+
+            if self.action == "tail":
+                output = "\n".join(tail_lines(job.log.files(), self.lines))
+                return f"{job.describe()}\n--- OUTPUT (last {self.lines} lines) ---\n{output}"
+
+            if self.action == "wait":
+                finished = job.wait(self.timeout / 1000)
+                output = "\n".join(tail_lines(job.log.files(), self.lines))
+                note = "" if finished else f"Still running after waiting {self.timeout / 1000}s.\n"
+                return f"{note}{job.describe()}\n--- OUTPUT (last {self.lines} lines) ---\n{output}"
+
+            if not job.kill():
+                return f"Job {job.id} had already finished.\n{job.describe()}"
+            return f"Killed job {job.id}.\n{job.describe()}"
+
+        except Exception as e:
+            return f"Error managing background job: {str(e)}"
+
+
+# Create alias for Agency Swarm tool loading (expects class name = file name)
+bash_jobs = BashJobs
+
+if __name__ == "__main__":
+    from agency_code_agent.tools.bash import Bash
+
+    print(Bash(command="for i in 1 2 3; do echo tick $i; sleep 1; done", background=True).run())
+    print(BashJobs(action="list").run())
+    print(BashJobs(action="wait", job_id=1, timeout=10000).run())
+
+    print(Bash(command="sleep 60", background=True).run())
+    print(BashJobs(action="kill", job_id=2).run())
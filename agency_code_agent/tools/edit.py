@@ -1,3 +1,5 @@
+import hashlib
+import mmap
 import os
 from typing import Optional
 
@@ -6,6 +8,22 @@ from pydantic import Field
 
 # Import the global read files registry
 from agency_code_agent.tools.read import _global_read_files
+from agency_code_agent.tools.utils import (
+    checkpoint,
+    get_content_cache,
+    get_line_index,
+    invalidate_path,
+    splice_file,
+    syntax_report,
+)
+
+# Constants
+MAX_RANGE_PREVIEW_LINES = 200
+# Files above this size are edited by streaming through an mmap instead of in memory
+STREAMING_EDIT_THRESHOLD = int(
+    os.getenv("AGENCY_CODE_EDIT_STREAM_THRESHOLD", str(16 * 1024 * 1024))
+)
+BINARY_SNIFF_BYTES = 8192
 
 
 class Edit(BaseTool):
@@ -19,10 +37,15 @@ class Edit(BaseTool):
     - Only use emojis if the user explicitly requests it. Avoid adding emojis to files unless asked.
     - The edit will FAIL if `old_string` is not unique in the file. Either provide a larger string with more surrounding context to make it unique or use `replace_all` to change every instance of `old_string`.
     - Use `replace_all` for replacing and renaming strings across the file. This parameter is useful if you want to rename a variable for instance.
+    - Line-range mode (useful for large or repetitive files): give start_line/end_line (1-based, inclusive, as shown by Read) together with old_string set to the current text of exactly those lines (without line number prefixes). new_string replaces those whole lines; an empty new_string deletes them.
+    - If old_string does not match the lines in the range, nothing is changed and the current lines are returned along with their hash. For a range too long to repeat, expected_hash (from that message or an earlier line-range edit) can guard the edit instead of old_string.
     """
 
     file_path: str = Field(..., description="The absolute path to the file to modify")
-    old_string: str = Field(..., description="The text to replace")
+    old_string: Optional[str] = Field(
+        None,
+        description="The text to replace. In line-range mode, the current text of lines start_line-end_line.",
+    )
     new_string: str = Field(
         ...,
         description="The text to replace it with (must be different from old_string)",
@@ -30,6 +53,20 @@ class Edit(BaseTool):
     replace_all: Optional[bool] = Field(
         False, description="Replace all occurrences of old_string (default false)"
     )
+    start_line: Optional[int] = Field(
+        None,
+        ge=1,
+        description="Line-range mode: first line to replace (1-based).",
+    )
+    end_line: Optional[int] = Field(
+        None,
+        ge=1,
+        description="Line-range mode: last line to replace, inclusive. Defaults to start_line.",
+    )
+    expected_hash: Optional[str] = Field(
+        None,
+        description="Line-range mode: hash of the range reported by an earlier Edit, accepted instead of old_string.",
+    )
 
     def run(self):
         try:
@@ -49,6 +86,11 @@ class Edit(BaseTool):
             if not file_has_been_read:
                 return "Error: You must use Read tool at least once before editing this file. This tool will error if you attempt an edit without reading the file first."
 
+            if self.start_line is not None:
+                return self._edit_line_range()
+            if self.old_string is None:
+                return "Error: Provide old_string, or start_line/end_line for a line-range edit"
+
             # Validate that old_string and new_string are different
             if self.old_string == self.new_string:
                 return "Error: old_string and new_string must be different"
@@ -61,10 +103,14 @@ class Edit(BaseTool):
             if not os.path.isfile(self.file_path):
                 return f"Error: Path is not a file: {self.file_path}"
 
-            # Read the file
+            # Very large files are never loaded into memory as a whole
+            if self.old_string and os.path.getsize(self.file_path) > STREAMING_EDIT_THRESHOLD:
+                return self._edit_streaming()
+
+            # Read the file (usually already cached by Read)
+            content_cache = get_content_cache(self.context)
             try:
-                with open(self.file_path, "r", encoding="utf-8") as file:
-                    content = file.read()
+                content = content_cache.read_text(self.file_path)
             except UnicodeDecodeError:
                 return f"Error: Unable to decode file {self.file_path}. It may be a binary file."
 
@@ -106,8 +152,11 @@ class Edit(BaseTool):
 
             # Write the modified content back to the file
             try:
-                with open(self.file_path, "w", encoding="utf-8") as file:
-                    file.write(new_content)
+                with checkpoint(self.context, "Edit", [self.file_path]):
+                    with open(self.file_path, "w", encoding="utf-8") as file:
+                        file.write(new_content)
+                invalidate_path(self.file_path)
+                content_cache.update(self.file_path, new_content)
 
                 # Create a short diff-like preview snippet (first and last replacement context)
                 preview_lines = []
@@ -150,7 +199,7 @@ class Edit(BaseTool):
                 msg = f"Successfully replaced {replacement_count} occurrence(s) in {self.file_path}"
                 if preview:
                     msg += f"\nPreview:\n{preview}"
-                return msg
+                return msg + syntax_report([(self.file_path, new_content)])
 
             except PermissionError:
                 return f"Error: Permission denied writing to file: {self.file_path}"
@@ -160,6 +209,196 @@ class Edit(BaseTool):
         except Exception as e:
             return f"Error during edit operation: {str(e)}"
 
+    def _edit_streaming(self):
+        """Replace old_string in a large file using bytes search on an mmap.
+
+        The new file is streamed (head, replacement, tail) into a temp file that
+        atomically replaces the original, so memory stays bounded by the copy
+        window rather than the file size.
+        """
+        with open(self.file_path, "rb") as file:
+            st = os.fstat(file.fileno())
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+                if b"\x00" in buf[:BINARY_SNIFF_BYTES]:
+                    return f"Error: Unable to decode file {self.file_path}. It may be a binary file."
+
+                # Match the file's line endings, as text-mode reads would hide them
+                old_bytes = self.old_string.encode("utf-8")
+                new_bytes = self.new_string.encode("utf-8")
+                if b"\r\n" in buf[:BINARY_SNIFF_BYTES]:
+                    old_bytes = old_bytes.replace(b"\r\n", b"\n").replace(b"\n", b"\r\n")
+                    new_bytes = new_bytes.replace(b"\r\n", b"\n").replace(b"\n", b"\r\n")
+
+                # Non-overlapping occurrences, like str.count/str.replace
+                positions = []
+                idx = buf.find(old_bytes)
+                while idx != -1:
+                    positions.append(idx)
+                    idx = buf.find(old_bytes, idx + len(old_bytes))
+
+                if not positions:
+                    return f"Error: String to replace not found in file.\\nString: {repr(self.old_string)}"
+
+                if len(positions) > 1 and not self.replace_all:
+                    previews = [
+                        "..." + _context(buf, idx, len(old_bytes), 30) + "..."
+                        for idx in positions[:2]
+                    ]
+                    preview_block = "\n".join(previews)
+                    return (
+                        f"Error: String appears {len(positions)} times in file. Either provide a larger string with more "
+                        f"surrounding context to make it unique or use replace_all=True to change every instance.\n"
+                        f"First matches:\n{preview_block}"
+                    )
+
+                try:
+                    # splice_file swaps in a new inode, so the old one can be hardlinked
+                    with checkpoint(self.context, "Edit", [self.file_path], link=True):
+                        splice_file(
+                            self.file_path,
+                            buf,
+                            st.st_size,
+                            [(idx, idx + len(old_bytes), new_bytes) for idx in positions],
+                            st.st_mode,
+                        )
+                except PermissionError:
+                    return f"Error: Permission denied writing to file: {self.file_path}"
+
+                # Create a short diff-like preview snippet (first and last replacement context)
+                preview_indices = [positions[0]]
+                if len(positions) > 1:
+                    preview_indices.append(positions[-1])
+                preview_lines = []
+                for idx in preview_indices:
+                    before = _decode_window(buf[max(0, idx - 30) : idx])
+                    after = _decode_window(buf[idx + len(old_bytes) : idx + len(old_bytes) + 30])
+                    preview_lines.append(
+                        f"...{before}[{self.old_string}->{self.new_string}]{after}..."
+                    )
+
+        invalidate_path(self.file_path)
+        get_content_cache(self.context).discard(self.file_path)
+
+        msg = f"Successfully replaced {len(positions)} occurrence(s) in {self.file_path}"
+        msg += "\nPreview:\n" + "\n".join(preview_lines)
+        # Files this large are not re-read just to be checked
+        return msg + syntax_report([(self.file_path, None)])
+
+    def _edit_line_range(self):
+        """Replace whole lines located through the cached line index."""
+        start_line = self.start_line
+        end_line = self.end_line if self.end_line is not None else start_line
+        if end_line < start_line:
+            return "Error: end_line must be greater than or equal to start_line"
+
+        # Check if file exists
+        if not os.path.exists(self.file_path):
+            return f"Error: File does not exist: {self.file_path}"
+
+        # Check if it's a file
+        if not os.path.isfile(self.file_path):
+            return f"Error: Path is not a file: {self.file_path}"
+
+        with open(self.file_path, "rb") as file:
+            st = os.fstat(file.fileno())
+            if st.st_size == 0:
+                return f"Error: Line range {start_line}-{end_line} is outside the file (0 lines)"
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+                index = get_line_index(os.path.abspath(self.file_path), st)
+                total_lines = index.line_count(buf)
+                if end_line > total_lines:
+                    return f"Error: Line range {start_line}-{end_line} is outside the file ({total_lines} lines)"
+
+                start = index.line_start(buf, start_line - 1)
+                end = index.line_start(buf, end_line)
+                old_bytes = buf[start:end]
+                actual_hash = line_range_hash(old_bytes)
+                expected_hash = (self.expected_hash or "").strip().lower()
+                if self.old_string is not None:
+                    matches = _range_text_matches(self.old_string, old_bytes)
+                    problem = f"old_string does not match lines {start_line}-{end_line}."
+                elif expected_hash:
+                    matches = expected_hash == actual_hash
+                    problem = f"Content hash mismatch for lines {start_line}-{end_line} (expected {expected_hash}, actual {actual_hash})."
+                else:
+                    matches = False
+                    problem = f"Line-range edits need old_string (the current text of lines {start_line}-{end_line}) or expected_hash."
+                if not matches:
+                    return (
+                        f"Error: {problem} Nothing was changed. The lines currently are:\n"
+                        f"{_preview(old_bytes, start_line)}\n"
+                        f"If these are the lines you mean to replace, retry with their text as old_string "
+                        f'or with expected_hash="{actual_hash}".'
+                    )
+
+                # new_string replaces whole lines, so keep the range's line ending
+                new_bytes = self.new_string.encode("utf-8")
+                if b"\n" in old_bytes:
+                    line_ending = b"\r\n" if b"\r\n" in old_bytes else b"\n"
+                else:
+                    # The last line, unterminated: go by the rest of the file
+                    line_ending = b"\r\n" if b"\r\n" in buf[:BINARY_SNIFF_BYTES] else b"\n"
+                if line_ending == b"\r\n":
+                    new_bytes = new_bytes.replace(b"\r\n", b"\n").replace(b"\n", b"\r\n")
+                if new_bytes and old_bytes.endswith(b"\n") and not new_bytes.endswith(b"\n"):
+                    new_bytes += line_ending
+
+                # Splice only the affected region; the rest is streamed from the map
+                try:
+                    with checkpoint(self.context, "Edit", [self.file_path], link=True):
+                        splice_file(
+                            self.file_path, buf, st.st_size, [(start, end, new_bytes)], st.st_mode
+                        )
+                except PermissionError:
+                    return f"Error: Permission denied writing to file: {self.file_path}"
+
+        invalidate_path(self.file_path)
+        get_content_cache(self.context).discard(self.file_path)
+
+        old_count = end_line - start_line + 1
+        new_count = new_bytes.count(b"\n") + (0 if not new_bytes or new_bytes.endswith(b"\n") else 1)
+        report = syntax_report([(self.file_path, None)])
+        if new_count == 0:
+            return f"Successfully deleted lines {start_line}-{end_line} ({old_count} lines) in {self.file_path}{report}"
+        new_end = start_line + new_count - 1
+        return (
+            f"Successfully replaced lines {start_line}-{end_line} ({old_count} lines) with {new_count} lines in {self.file_path}\n"
+            f"The new lines {start_line}-{new_end} hash to {line_range_hash(new_bytes)}{report}"
+        )
+
+
+def line_range_hash(data: bytes) -> str:
+    """Hash identifying the exact bytes of a line range."""
+    return hashlib.sha256(data).hexdigest()[:12]
+
+
+def _range_text_matches(text: str, data: bytes) -> bool:
+    """True when text is the content of the line range data, with or without its final newline."""
+    text = text.replace("\r\n", "\n")
+    current = _decode_window(data)
+    return text == current or (current.endswith("\n") and text == current[:-1])
+
+
+def _decode_window(data: bytes) -> str:
+    return data.decode("utf-8", errors="replace").replace("\r\n", "\n")
+
+
+def _context(buf, idx: int, length: int, radius: int) -> str:
+    """Decode a match plus radius bytes of context on each side."""
+    return _decode_window(buf[max(0, idx - radius) : idx + length + radius])
+
+
+def _preview(data: bytes, first_line: int) -> str:
+    """Render a line range in Read's cat -n format, capped for huge ranges."""
+    lines = data.decode("utf-8", errors="replace").splitlines()
+    shown = [
+        f"{n:>6}\t{line[:2000]}"
+        for n, line in enumerate(lines[:MAX_RANGE_PREVIEW_LINES], start=first_line)
+    ]
+    if len(lines) > MAX_RANGE_PREVIEW_LINES:
+        shown.append(f"[... {len(lines) - MAX_RANGE_PREVIEW_LINES} more lines]")
+    return "\n".join(shown)
+
 
 # Create alias for Agency Swarm tool loading (expects class name = file name)
 edit = Edit
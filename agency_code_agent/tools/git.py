@@ -4,11 +4,15 @@ from typing import List, Optional
 from agency_swarm.tools import BaseTool
 from pydantic import Field
 
+from agency_code_agent.tools.utils import get_repo
+
 
 class Git(BaseTool):
     """Read-only git operations using dulwich library only.
 
     Supports: status, diff, log, show. All operations are safe and non-destructive.
+    diff shows the working tree against `ref` (like `git diff <ref>`).
+    Repeated status and diff calls are fast: only files changed since the last call are re-read.
     """
 
     cmd: str = Field(..., description="Git command: status, diff, log, show")
@@ -17,7 +21,7 @@ class Git(BaseTool):
 
     def run(self):
         try:
-            from io import StringIO
+            from io import BytesIO, StringIO
 
             from dulwich import porcelain
         except Exception:
@@ -28,13 +32,14 @@ class Git(BaseTool):
             )
 
         try:
-            repo = porcelain.open_repo(os.getcwd())
+            cached = get_repo(os.getcwd())
+            repo = cached.repo
         except Exception as e:
             return f"Exit code: 1\nError opening git repo: {e}"
 
         try:
             if self.cmd == "status":
-                st = porcelain.status(repo)
+                st = cached.status()
                 out = []
                 for p in sorted(st.untracked):
                     name = p.decode() if isinstance(p, bytes) else p
@@ -51,15 +56,23 @@ class Git(BaseTool):
                 return "\n".join(out) or "(clean)"
 
             if self.cmd == "diff":
-                # Show unstaged changes using dulwich
-                out = StringIO()
+                from dulwich.patch import write_blob_diff
+
+                out = BytesIO()
                 try:
-                    # Get working tree vs HEAD diff
-                    porcelain.diff_tree(repo, repo.head(), None, outstream=out)
-                    lines = out.getvalue().splitlines()
+                    # Working tree vs ref; only files whose stat changed are re-hashed
+                    for path, (old_mode, old_blob), (new_mode, new_blob) in cached.diff(self.ref.encode()):
+                        write_blob_diff(
+                            out,
+                            (path if old_blob is not None else None, old_mode, old_blob),
+                            (path if new_blob is not None else None, new_mode, new_blob),
+                        )
+                    lines = out.getvalue().decode("utf-8", errors="replace").splitlines()
                     if len(lines) > self.max_lines:
                         lines = lines[: self.max_lines] + ["(truncated)"]
                     return "\n".join(lines)
+                except KeyError:
+                    return f"Exit code: 1\nError in diff: unknown ref {self.ref}"
                 except Exception as e:
                     return f"Exit code: 1\nError in diff: {e}"
 
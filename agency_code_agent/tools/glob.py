@@ -1,17 +1,27 @@
-import fnmatch
+import heapq
 import os
-from typing import List, Optional
+from typing import List, Optional, Tuple
 
 from agency_swarm.tools import BaseTool
 from pydantic import Field
 
+from agency_code_agent.tools.utils import (
+    FilesystemSnapshot,
+    IgnoreMatcher,
+    compile_glob,
+    get_snapshot,
+    literal_prefix,
+    max_depth,
+)
+
 
 class Glob(BaseTool):
     """
     Fast file pattern matching tool that works with any codebase size.
 
-    - Supports glob patterns like "**/*.js" or "src/**/*.ts"
+    - Supports glob patterns like "**/*.js", "src/**/*.ts" or "src/**/test_*.{py,pyi}"
     - Returns matching file paths sorted by modification time
+    - Use limit to get only the N most recently modified matches on large trees
     - Use this tool when you need to find files by name patterns
     - When doing open-ended searches that may require multiple rounds, use the Task tool instead
     """
@@ -21,6 +31,11 @@ class Glob(BaseTool):
         None,
         description="The directory to search in. If not specified, the current working directory will be used. IMPORTANT: Omit this field to use the default directory. DO NOT enter 'undefined' or 'null' - simply omit it for the default behavior. Must be a valid directory path if provided.",
     )
+    limit: Optional[int] = Field(
+        None,
+        description="Return only the N most recently modified matches. When unspecified, all matches are returned.",
+        ge=1,
+    )
 
     def run(self):
         try:
@@ -31,204 +46,97 @@ class Glob(BaseTool):
             if not os.path.isdir(search_dir):
                 return f"Error: Directory does not exist: {search_dir}"
 
-            # Use our own glob implementation and respect .gitignore patterns
-            gitignore_patterns = self._load_gitignore_patterns(search_dir)
-            matches = self._find_files_matching_pattern(
-                search_dir, self.pattern, gitignore_patterns
+            # Use our own glob implementation and respect .gitignore rules
+            ignore_matcher = IgnoreMatcher(search_dir)
+            total, matches = self._find_files_matching_pattern(
+                search_dir,
+                self.pattern,
+                ignore_matcher,
+                self.limit,
+                snapshot=get_snapshot(self.context),
             )
 
             if not matches:
                 return f"No files found matching pattern: {self.pattern}"
 
-            # Sort by modification time (newest first)
-            try:
-                matches.sort(key=lambda x: os.path.getmtime(x), reverse=True)
-            except (OSError, IOError):
-                # If we can't get modification times, just sort alphabetically
-                matches.sort()
-
-            # Return results
-            result = f"Found {len(matches)} files matching '{self.pattern}':\\n\\n"
-            for match in matches:
-                result += f"{match}\\n"
-
-            return result.strip()
+            # Return results, newest first (mtimes come from the walk's stat calls)
+            header = f"Found {total} files matching '{self.pattern}'"
+            if len(matches) < total:
+                header += f" (showing the {len(matches)} most recently modified)"
+            lines = [os.path.abspath(path) for _, path in matches]
+            return (header + ":\\n\\n" + "\\n".join(lines)).strip()
 
         except Exception as e:
             return f"Error during glob search: {str(e)}"
 
     def _find_files_matching_pattern(
-        self, root_dir: str, pattern: str, gitignore_patterns: List[str]
-    ):
-        """Custom implementation to find files matching a glob pattern."""
-        matches = []
-
-        # Handle different pattern types
-        if "**" in pattern:
-            # Recursive pattern
-            matches = self._recursive_glob(root_dir, pattern, gitignore_patterns)
-        else:
-            # Simple pattern
-            matches = self._simple_glob(root_dir, pattern, gitignore_patterns)
-
-        return [os.path.abspath(match) for match in matches]
-
-    def _recursive_glob(
-        self, root_dir: str, pattern: str, gitignore_patterns: List[str]
-    ):
-        """Handle recursive patterns with **."""
-        matches = []
-
-        # Split the pattern at **
-        if "**/" in pattern:
-            before, after = pattern.split("**/", 1)
-        else:
-            before = ""
-            after = pattern.replace("**", "*")
-
-        # Walk the directory tree
-        for dirpath, dirnames, filenames in os.walk(root_dir):
-            # Prune ignored directories per .gitignore
-            for d in list(dirnames):
-                full_d = os.path.join(dirpath, d)
-                if self._is_ignored(root_dir, full_d, gitignore_patterns):
-                    dirnames.remove(d)
-            # Check if current directory matches the 'before' part
-            rel_path = os.path.relpath(dirpath, root_dir)
-            if before and not fnmatch.fnmatch(rel_path, before):
-                continue
-
-            # Check files in this directory against the 'after' pattern
-            for filename in filenames:
-                full_path = os.path.join(dirpath, filename)
-                if self._is_ignored(root_dir, full_path, gitignore_patterns):
-                    continue
-                if fnmatch.fnmatch(filename, after):
-                    matches.append(full_path)
-
-        return matches
-
-    def _simple_glob(self, root_dir: str, pattern: str, gitignore_patterns: List[str]):
-        """Handle simple patterns without **."""
-        matches = []
-
-        # If pattern contains path separators, handle directory structure
-        if "/" in pattern or "\\\\" in pattern:
-            # Split pattern into directory and file parts
-            pattern_parts = pattern.replace("\\\\", "/").split("/")
-            self._match_path_pattern(
-                root_dir, pattern_parts, "", matches, gitignore_patterns
-            )
-        else:
-            # Simple filename pattern
-            try:
-                for item in os.listdir(root_dir):
-                    item_path = os.path.join(root_dir, item)
-                    if self._is_ignored(root_dir, item_path, gitignore_patterns):
-                        continue
-                    if os.path.isfile(item_path) and fnmatch.fnmatch(item, pattern):
-                        matches.append(item_path)
-            except PermissionError:
-                pass
-
-        return matches
-
-    def _match_path_pattern(
         self,
-        base_dir: str,
-        pattern_parts: List[str],
-        current_path: str,
-        matches: List[str],
-        gitignore_patterns: List[str],
-    ):
-        """Recursively match path patterns."""
-        if not pattern_parts:
-            # End of pattern, check if it's a file
-            full_path = (
-                os.path.join(base_dir, current_path) if current_path else base_dir
-            )
-            if os.path.isfile(full_path) and not self._is_ignored(
-                base_dir, full_path, gitignore_patterns
-            ):
-                matches.append(full_path)
-            return
-
-        current_pattern = pattern_parts[0]
-        remaining_patterns = pattern_parts[1:]
-
-        search_path = os.path.join(base_dir, current_path) if current_path else base_dir
-
-        if not os.path.isdir(search_path):
-            return
-
-        try:
-            for item in os.listdir(search_path):
-                full_item = os.path.join(search_path, item)
-                if self._is_ignored(base_dir, full_item, gitignore_patterns):
-                    continue
-                if fnmatch.fnmatch(item, current_pattern):
-                    new_path = (
-                        os.path.join(current_path, item) if current_path else item
-                    )
-                    self._match_path_pattern(
-                        base_dir,
-                        remaining_patterns,
-                        new_path,
-                        matches,
-                        gitignore_patterns,
-                    )
-        except PermissionError:
-            pass
-
-    def _load_gitignore_patterns(self, root_dir: str) -> List[str]:
-        patterns: List[str] = []
-        try:
-            gi = os.path.join(root_dir, ".gitignore")
-            if os.path.isfile(gi):
-                with open(gi, "r", encoding="utf-8") as f:
-                    for line in f:
-                        s = line.strip()
-                        if not s or s.startswith("#"):
-                            continue
-                        patterns.append(s)
-        except Exception:
-            pass
-        return patterns
-
-    def _is_ignored(self, root_dir: str, path: str, patterns: List[str]) -> bool:
-        if not patterns:
-            return False
-        try:
-            rel = os.path.relpath(path, root_dir)
-        except Exception:
-            rel = path
-        rel_norm = rel.replace(os.sep, "/")
-        for pat in patterns:
-            pat_norm = pat.replace(os.sep, "/")
-            # Directory patterns (e.g., "ignored_dir/")
-            if pat_norm.endswith("/"):
-                base = pat_norm[:-1]
-                # Anchored directory
-                if pat_norm.startswith("/"):
-                    if ("/" + rel_norm == pat_norm[:-1]) or ("/" + rel_norm).startswith(
-                        pat_norm
-                    ):
-                        return True
+        root_dir: str,
+        pattern: str,
+        ignore_matcher: IgnoreMatcher,
+        limit: Optional[int] = None,
+        snapshot: Optional[FilesystemSnapshot] = None,
+    ) -> Tuple[int, List[Tuple[float, str]]]:
+        """Walk once, matching relative paths against the compiled pattern.
+
+        Returns (total match count, [(mtime, path)] newest first). With a limit,
+        only the newest matches are kept in a bounded heap. Directory listings
+        and stats are served from snapshot when one is given.
+        """
+        regex = compile_glob(pattern)
+        depth_limit = max_depth(pattern)
+        start_rel = literal_prefix(pattern)
+
+        # Start below the literal part of the pattern (e.g. "src/app" in "src/app/**/*.ts")
+        start_dir = os.path.join(root_dir, start_rel) if start_rel else root_dir
+        if start_rel:
+            parts = start_rel.split("/")
+            for idx in range(len(parts)):
+                if ignore_matcher.is_ignored("/".join(parts[: idx + 1]), is_dir=True):
+                    return 0, []
+            if not os.path.isdir(start_dir):
+                return 0, []
+
+        total = 0
+        heap: List[Tuple[float, str]] = []
+        stack = [(start_dir, start_rel + "/" if start_rel else "")]
+        while stack:
+            dir_path, rel_prefix = stack.pop()
+            depth = rel_prefix.count("/")
+            try:
+                if snapshot is not None:
+                    entries = snapshot.scandir(dir_path)
                 else:
-                    if (rel_norm == base) or rel_norm.startswith(pat_norm):
-                        return True
+                    with os.scandir(dir_path) as it:
+                        entries = list(it)
+            except OSError:
                 continue
+            for entry in entries:
+                rel = rel_prefix + entry.name
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        if (depth_limit is None or depth + 1 < depth_limit) and not (
+                            ignore_matcher.is_ignored(rel, is_dir=True)
+                        ):
+                            stack.append((entry.path, rel + "/"))
+                        continue
+                    if not regex.fullmatch(rel) or not entry.is_file():
+                        continue
+                    if ignore_matcher.is_ignored(rel):
+                        continue
+                    # Fresh stat: cached entries may predate an in-place edit
+                    mtime = os.stat(entry.path).st_mtime
+                except OSError:
+                    continue
+
+                total += 1
+                item = (mtime, entry.path)
+                if limit is None or len(heap) < limit:
+                    heapq.heappush(heap, item)
+                elif item > heap[0]:
+                    heapq.heapreplace(heap, item)
 
-            # File or general patterns
-            if pat_norm.startswith("/"):
-                if fnmatch.fnmatch("/" + rel_norm, pat_norm):
-                    return True
-            else:
-                if fnmatch.fnmatch(rel_norm, pat_norm) or fnmatch.fnmatch(
-                    os.path.basename(rel_norm), pat_norm
-                ):
-                    return True
-        return False
+        return total, sorted(heap, reverse=True)
 
 
 # Create alias for Agency Swarm tool loading (expects class name = file name)
@@ -1,14 +1,48 @@
+import base64
+import json
 import os
+import re
 import subprocess
-from typing import Literal, Optional
+import threading
+import time
+from typing import Dict, List, Literal, Optional
 
 from agency_swarm.tools import BaseTool
-from pydantic import Field
+from pydantic import BaseModel, Field
+
+from agency_code_agent.tools.utils import TrigramIndex, get_snapshot, py_search
+
+# Opt-in persistent trigram index for large trees (see utils/trigram_index.py)
+GREP_INDEX_ENABLED = os.getenv("AGENCY_CODE_GREP_INDEX", "").lower() in ("1", "true", "yes")
+MAX_ARGS_LENGTH = 100000  # Keep rg command lines well below ARG_MAX
+MAX_OUTPUT_CHARS = 30000  # Output budget returned to the model
+MAX_STDERR_CHARS = 4000  # stderr is drained in the background and capped
+MAX_COLUMNS = 500  # Longer matching lines are shown as a preview by rg
+MAX_STREAM_LINE_CHARS = 1024 * 1024  # Longest rg output line kept in memory; the rest is skipped
+
+# Escapes that mean the same in ripgrep and Python's re. The batched union
+# search lets Python decide which pattern a line matched, so it only takes
+# patterns limited to these, plain classes, (?: groups and a trailing $
+PORTABLE_ESCAPES = set("wWdDsSbBt") | set(".\\()[]{}*+?|^$/-#&~ \"'<>=:,!@%;`_")
+
+
+class GrepPattern(BaseModel):
+    pattern: str = Field(
+        ..., description="The regular expression pattern to search for in file contents"
+    )
+    output_mode: Optional[Literal["content", "files_with_matches", "count"]] = Field(
+        None,
+        description="Output mode for this pattern. Defaults to the tool's output_mode.",
+    )
+    head_limit: Optional[int] = Field(
+        None,
+        description="Limit this pattern's output to the first N lines/entries. Defaults to the tool's head_limit.",
+    )
 
 
 class Grep(BaseTool):
     """
-    A powerful search tool built on ripgrep.
+    A powerful search tool built on ripgrep, with a built-in Python engine used when rg is not installed.
 
     Usage:
     - ALWAYS use Grep for search tasks. NEVER invoke `grep` or `rg` as a Bash command
@@ -17,10 +51,16 @@ class Grep(BaseTool):
     - Output modes: "content" shows matching lines, "files_with_matches" shows only file paths, "count" shows match counts
     - Pattern syntax: Uses ripgrep (not grep) - literal braces need escaping
     - Multiline matching: By default patterns match within single lines only
+    - Related symbols: pass several patterns in `patterns` to search them in one pass; results are grouped per pattern
     """
 
-    pattern: str = Field(
-        ..., description="The regular expression pattern to search for in file contents"
+    pattern: Optional[str] = Field(
+        None,
+        description="The regular expression pattern to search for in file contents. Required unless patterns is given.",
+    )
+    patterns: Optional[List[GrepPattern]] = Field(
+        None,
+        description="Several patterns to search in a single pass over the tree, each with its own optional output_mode and head_limit. Results are grouped per pattern. If pattern is also given it is searched first.",
     )
     path: Optional[str] = Field(
         None,
@@ -72,120 +112,641 @@ class Grep(BaseTool):
 
     def run(self):
         try:
-            # Check if ripgrep is available
-            try:
-                subprocess.run(["rg", "--version"], capture_output=True, check=True)
-            except (subprocess.CalledProcessError, FileNotFoundError):
-                return "Error: ripgrep (rg) is not installed. Please install ripgrep first."
-
-            # Build ripgrep command
-            cmd = ["rg", "--color=never"]
-
-            # Add case insensitive flag
-            if getattr(self, "i", None):
-                cmd.append("-i")
-
-            # Add multiline flag
-            if self.multiline:
-                cmd.extend(["-U", "--multiline-dotall"])
-
-            # Add file type filter
-            if self.type:
-                cmd.extend(["--type", self.type])
-
-            # Add glob filter
-            if self.glob:
-                cmd.extend(["--glob", self.glob])
-
-            # Handle output mode
-            if self.output_mode == "files_with_matches":
-                cmd.append("-l")
-            elif self.output_mode == "count":
-                cmd.append("-c")
-            elif self.output_mode == "content":
-                # Add line numbers if requested
-                if getattr(self, "n", None):
-                    cmd.append("-n")
-
-                # Add context lines
-                if getattr(self, "C", None):
-                    cmd.extend(["-C", str(getattr(self, "C"))])
-                elif getattr(self, "A", None) or getattr(self, "B", None):
-                    if getattr(self, "A", None):
-                        cmd.extend(["-A", str(getattr(self, "A"))])
-                    if getattr(self, "B", None):
-                        cmd.extend(["-B", str(getattr(self, "B"))])
-
-            # Add pattern
-            cmd.append(self.pattern)
-
-            # Add search path; respect .gitignore by default via ripgrep
-            if self.path:
-                cmd.append(self.path)
-            else:
-                cmd.append(".")
-
-            # Execute ripgrep
+            queries = self._queries()
+            if not queries:
+                return "Error: Provide either pattern or patterns to search for."
+
             try:
-                result = subprocess.run(
-                    cmd,
-                    capture_output=True,
-                    text=True,
-                    timeout=30,  # 30 second timeout
-                    cwd=os.getcwd(),
+                if self.patterns:
+                    return self._run_batch(queries)
+
+                query = queries[0]
+                returncode, stdout, stderr, stopped_early = self._search(
+                    query.pattern, query.output_mode, query.head_limit
+                )
+                return self._format_result(
+                    query.pattern, query.head_limit, returncode, stdout, stderr, stopped_early
                 )
 
-                stdout = (result.stdout or "").rstrip()
-                stderr = (result.stderr or "").rstrip()
-
-                # Exit code handling: 1 means no matches, other non-zero means error
-                if result.returncode == 1 and not stdout:
-                    return f"Exit code: 1\nNo matches found for pattern: {self.pattern}"
-
-                if result.returncode not in (0, 1):
-                    sections = [f"Exit code: {result.returncode}"]
-                    if stdout:
-                        sections.append("--- STDOUT ---")
-                        sections.append(stdout)
-                    if stderr:
-                        sections.append("--- STDERR ---")
-                        sections.append(stderr)
-                    return "\n".join(sections).strip()
-
-                output = stdout
-
-                # Apply head_limit if specified
-                if self.head_limit and output:
-                    lines = output.split("\n")
-                    if len(lines) > self.head_limit:
-                        output = "\n".join(lines[: self.head_limit])
-                        output += (
-                            f"\n... (output limited to first {self.head_limit} lines)"
-                        )
+            except (subprocess.TimeoutExpired, TimeoutError):
+                return "Error: Search timed out after 30 seconds"
+
+        except Exception as e:
+            return f"Error during grep search: {str(e)}"
+
+    def _queries(self) -> List[GrepPattern]:
+        """Normalize pattern/patterns into a list with per-pattern defaults filled in."""
+        queries = []
+        if self.pattern:
+            queries.append(GrepPattern(pattern=self.pattern))
+        queries.extend(self.patterns or [])
+        return [
+            GrepPattern(
+                pattern=q.pattern,
+                output_mode=q.output_mode or self.output_mode or "files_with_matches",
+                head_limit=q.head_limit if q.head_limit is not None else self.head_limit,
+            )
+            for q in queries
+        ]
+
+    def _context_args(self):
+        """rg -A/-B/-C flags requested for content output."""
+        args = []
+        if getattr(self, "C", None):
+            args.extend(["-C", str(getattr(self, "C"))])
+        elif getattr(self, "A", None) or getattr(self, "B", None):
+            if getattr(self, "A", None):
+                args.extend(["-A", str(getattr(self, "A"))])
+            if getattr(self, "B", None):
+                args.extend(["-B", str(getattr(self, "B"))])
+        return args
+
+    def _build_command(self, output_mode):
+        """Build the rg command (without pattern and paths) for an output mode."""
+        cmd = ["rg", "--color=never"]
+
+        # Add case insensitive flag
+        if getattr(self, "i", None):
+            cmd.append("-i")
+
+        # Add multiline flag
+        if self.multiline:
+            cmd.extend(["-U", "--multiline-dotall"])
+
+        # Add file type and glob filters
+        cmd.extend(self._filter_args())
+
+        # Handle output mode
+        if output_mode == "files_with_matches":
+            cmd.append("-l")
+        elif output_mode == "count":
+            cmd.append("-c")
+        elif output_mode == "content":
+            # Add line numbers if requested
+            if getattr(self, "n", None):
+                cmd.append("-n")
+
+            # Minified or generated files can have lines of many megabytes
+            cmd.extend(["--max-columns", str(MAX_COLUMNS), "--max-columns-preview"])
+
+            # Add context lines
+            cmd.extend(self._context_args())
+        return cmd
+
+    def _search(self, pattern, output_mode, head_limit):
+        """Run a single-pattern search. Returns (returncode, stdout, stderr, stopped_early).
+
+        Uses ripgrep when installed and the built-in Python engine otherwise.
+        """
+        if not _ripgrep_available():
+            return self._search_python(pattern, output_mode, head_limit)
+
+        cmd = self._build_command(output_mode)
+
+        # Add pattern
+        cmd.append(pattern)
+
+        # Add search path; respect .gitignore by default via ripgrep
+        search_path = self.path if self.path else "."
+
+        targets = self._index_candidates(search_path, [pattern]) if GREP_INDEX_ENABLED else None
+        if targets is None:
+            targets = [search_path]
+        elif not targets:
+            return 1, "", "", False
+        else:
+            # Explicit file arguments would otherwise drop the "path:" prefix
+            cmd.insert(-1, "--with-filename")
+
+        return self._collect_lines(
+            lambda on_line: self._stream_ripgrep(cmd, targets, timeout=30, on_line=on_line),
+            max_lines=head_limit,
+            max_chars=MAX_OUTPUT_CHARS,
+        )
+
+    def _search_python(self, pattern, output_mode, head_limit):
+        """Fallback search with the built-in engine when rg is not installed."""
+        search_path = self.path if self.path else "."
+        if not os.path.exists(search_path):
+            return (
+                2,
+                "",
+                f"rg: {search_path}: IO error for operation on {search_path}: No such file or directory (os error 2)",
+                False,
+            )
+
+        try:
+            targets = self._index_candidates(search_path, [pattern]) if GREP_INDEX_ENABLED else None
+            if targets is None:
+                targets = py_search.list_files(
+                    search_path, self.type, self.glob, snapshot=get_snapshot(self.context)
+                )
+        except ValueError as e:
+            return 2, "", f"rg: {e}", False
+
+        is_content = output_mode == "content"
+        before = (getattr(self, "C", None) or getattr(self, "B", None) or 0) if is_content else 0
+        after = (getattr(self, "C", None) or getattr(self, "A", None) or 0) if is_content else 0
+        return self._collect_lines(
+            lambda on_line: py_search.search_files(
+                targets,
+                pattern,
+                on_line,
+                output_mode=output_mode,
+                ignore_case=bool(getattr(self, "i", None)),
+                multiline=bool(self.multiline),
+                before=before,
+                after=after,
+                line_numbers=is_content and bool(getattr(self, "n", None)),
+                with_filename=not os.path.isfile(search_path),
+                timeout=30,
+            ),
+            max_lines=head_limit,
+            max_chars=MAX_OUTPUT_CHARS,
+        )
+
+    def _format_result(self, pattern, head_limit, returncode, stdout, stderr, stopped_early):
+        """Render one rg result the way the tool reports it to the model."""
+        stdout = stdout.rstrip()
+        stderr = stderr.rstrip()
+
+        # Exit code handling: 1 means no matches, other non-zero means error
+        if returncode == 1 and not stdout:
+            return f"Exit code: 1\nNo matches found for pattern: {pattern}"
+
+        if returncode not in (0, 1):
+            sections = [f"Exit code: {returncode}"]
+            if stdout:
+                sections.append("--- STDOUT ---")
+                sections.append(stdout)
+            if stderr:
+                sections.append("--- STDERR ---")
+                sections.append(stderr)
+            return "\n".join(sections).strip()
+
+        output = _apply_head_limit(stdout, head_limit)
+
+        # Truncate very large outputs to MAX_OUTPUT_CHARS characters
+        truncated = False
+        if len(output) > MAX_OUTPUT_CHARS:
+            output = output[:MAX_OUTPUT_CHARS]
+            truncated = True
 
-                # Truncate very large outputs to 30000 characters
-                truncated = False
-                if len(output) > 30000:
-                    output = output[:30000]
-                    truncated = True
+        sections = [f"Exit code: {returncode}"]
+        if output:
+            sections.append("--- STDOUT ---")
+            sections.append(output)
+        if stderr:
+            sections.append("--- STDERR ---")
+            sections.append(stderr)
+        if truncated:
+            sections.append(
+                f"... (output truncated to {MAX_OUTPUT_CHARS} characters)"
+            )
+        if stopped_early:
+            sections.append(
+                "... (search stopped early once the output limit was reached; results are incomplete)"
+            )
 
-                sections = [f"Exit code: {result.returncode}"]
-                if output:
-                    sections.append("--- STDOUT ---")
-                    sections.append(output)
+        return "\n".join(sections).strip()
+
+    def _run_batch(self, queries: List[GrepPattern]):
+        """Search several patterns in one rg traversal and group results per pattern."""
+        flags = re.IGNORECASE if getattr(self, "i", None) else 0
+        compiled = {}
+        if not self.multiline and _ripgrep_available():
+            for idx, query in enumerate(queries):
+                regex = _portable_regex(query.pattern, flags)
+                if regex is not None:
+                    compiled[idx] = regex
+            if len(compiled) < 2:
+                # A union of one pattern saves nothing over a plain search
+                compiled = {}
+
+        results = {}
+        stderr_parts = []
+        if compiled:
+            returncode, per_pattern, stderr, stopped_early = self._search_union(
+                [queries[idx] for idx in compiled], list(compiled.values())
+            )
+            if returncode not in (0, 1):
+                return self._format_result(
+                    queries[0].pattern, None, returncode, "", stderr, False
+                )
+            if per_pattern is not None:
                 if stderr:
-                    sections.append("--- STDERR ---")
-                    sections.append(stderr)
-                if truncated:
-                    sections.append("... (output truncated to 30000 characters)")
+                    stderr_parts.append(stderr.rstrip())
+                for (idx, query), rendered in zip(compiled.items(), per_pattern):
+                    results[idx] = (0 if rendered else 1, rendered, stopped_early)
 
-                return "\n".join(sections).strip()
+        for idx, query in enumerate(queries):
+            if idx in results:
+                continue
+            returncode, stdout, stderr, stopped_early = self._search(
+                query.pattern, query.output_mode, query.head_limit
+            )
+            if returncode not in (0, 1):
+                stderr_parts.append(stderr.rstrip())
+            results[idx] = (returncode, stdout.rstrip(), stopped_early)
 
-            except subprocess.TimeoutExpired:
-                return "Error: Search timed out after 30 seconds"
+        any_match = any(results[idx][0] == 0 for idx in results)
+        sections = [f"Exit code: {0 if any_match else 1}"]
+        for idx, query in enumerate(queries):
+            returncode, stdout, stopped_early = results[idx]
+            sections.append(
+                f"=== Pattern {idx + 1}/{len(queries)}: {query.pattern} ({query.output_mode}) ==="
+            )
+            if returncode == 1 and not stdout:
+                sections.append(f"No matches found for pattern: {query.pattern}")
+                continue
+            if returncode not in (0, 1):
+                sections.append(f"Error: rg exited with code {returncode}")
+                continue
+            sections.append(_apply_head_limit(stdout, query.head_limit))
+            if stopped_early:
+                sections.append("... (search stopped early; results are incomplete)")
 
-        except Exception as e:
-            return f"Error during grep search: {str(e)}"
+        output = "\n".join(sections)
+        if stderr_parts:
+            output += "\n--- STDERR ---\n" + "\n".join(p for p in stderr_parts if p)
+        if len(output) > MAX_OUTPUT_CHARS:
+            output = output[:MAX_OUTPUT_CHARS] + (
+                f"\n... (output truncated to {MAX_OUTPUT_CHARS} characters)"
+            )
+        return output.strip()
+
+    def _search_union(self, queries: List[GrepPattern], regexes):
+        """Run one rg --json pass for all queries and render each query's output.
+
+        Every matched line is attributed to the queries whose regex matches it;
+        context lines are kept so each query can rebuild its own -A/-B/-C window.
+        Returns (returncode, rendered outputs, stderr, stopped_early); rendered
+        outputs is None when a matched line was too long to attribute, in which
+        case each query has to be run on its own.
+        """
+        needs_context = any(q.output_mode == "content" for q in queries)
+        cmd = ["rg", "--color=never", "--json"]
+        if getattr(self, "i", None):
+            cmd.append("-i")
+        cmd.extend(self._filter_args())
+        if needs_context:
+            cmd.extend(self._context_args())
+        for query in queries:
+            cmd.extend(["-e", query.pattern])
+
+        search_path = self.path if self.path else "."
+        targets = (
+            self._index_candidates(search_path, [q.pattern for q in queries])
+            if GREP_INDEX_ENABLED
+            else None
+        )
+        if targets is None:
+            targets = [search_path]
+        elif not targets:
+            return 1, ["" for _ in queries], "", False
+        # Like a plain rg search, a single file is reported without its path
+        with_filename = not os.path.isfile(search_path)
+
+        # path -> {line_number: text}, and per query: path -> [matched line numbers]
+        file_lines: Dict[str, Dict[int, str]] = {}
+        matches: List[Dict[str, List[int]]] = [{} for _ in queries]
+        sizes = [0 for _ in queries]
+        overflowed = False
+
+        def is_full(q_idx):
+            query = queries[q_idx]
+            if sizes[q_idx] > MAX_OUTPUT_CHARS:
+                return True
+            if not query.head_limit:
+                return False
+            if query.output_mode == "content":
+                return sum(len(v) for v in matches[q_idx].values()) > query.head_limit
+            # Files are streamed contiguously, so earlier files are complete once the next starts
+            return len(matches[q_idx]) > query.head_limit
+
+        def on_line(raw):
+            nonlocal overflowed
+            try:
+                event = json.loads(raw)
+            except ValueError:
+                # Cut at MAX_STREAM_LINE_CHARS; --max-columns does not apply to --json
+                if raw.startswith('{"type":"match"'):
+                    overflowed = True
+                    return True
+                return False
+            if event.get("type") not in ("match", "context"):
+                return False
+            data = event["data"]
+            path = _json_text(data.get("path"))
+            text = _json_text(data.get("lines")).rstrip("\n").rstrip("\r")
+            line_number = data.get("line_number") or 0
+            file_lines.setdefault(path, {})[line_number] = text
+            if event["type"] != "match":
+                return False
+            for q_idx, regex in enumerate(regexes):
+                if regex.search(text):
+                    matches[q_idx].setdefault(path, []).append(line_number)
+                    sizes[q_idx] += len(path) + len(text) + 2
+            return all(is_full(q_idx) for q_idx in range(len(queries)))
+
+        returncode, stderr, stopped_early = self._stream_ripgrep(
+            cmd, targets, timeout=30, on_line=on_line
+        )
+        if returncode not in (0, 1):
+            return returncode, [], stderr, False
+        if overflowed:
+            return returncode, None, stderr, False
+
+        before = getattr(self, "C", None) or getattr(self, "B", None) or 0
+        after = getattr(self, "C", None) or getattr(self, "A", None) or 0
+        show_numbers = bool(getattr(self, "n", None))
+        rendered = []
+        for q_idx, query in enumerate(queries):
+            lines = []
+            for path, line_numbers in matches[q_idx].items():
+                if query.output_mode == "files_with_matches":
+                    lines.append(path)
+                elif query.output_mode == "count":
+                    lines.append(f"{path}:{len(line_numbers)}" if with_filename else str(len(line_numbers)))
+                else:
+                    lines.extend(
+                        _render_content(
+                            path if with_filename else None,
+                            file_lines[path],
+                            line_numbers,
+                            before,
+                            after,
+                            show_numbers,
+                            separate=bool(lines),
+                        )
+                    )
+            rendered.append("\n".join(lines))
+        return returncode, rendered, stderr, stopped_early
+
+    def _filter_args(self):
+        """rg flags that restrict which files are searched."""
+        args = []
+        if self.type:
+            args.extend(["--type", self.type])
+        if self.glob:
+            args.extend(["--glob", self.glob])
+        return args
+
+    def _index_candidates(self, search_path: str, patterns: List[str]):
+        """Use the trigram index to narrow the files rg has to open.
+
+        Returns a list of file paths (in the same form rg would print them) or
+        None when the index cannot help and the whole path should be scanned.
+        Several patterns are OR-ed: a file is kept if any of them may match.
+        """
+        root = os.path.abspath(search_path)
+        if not os.path.isdir(root):
+            return None
+        # The index reads patterns with Python's re; rg syntax it would misread
+        # (POSIX classes, \p{..}, inline flags) must not narrow the search
+        flags = re.IGNORECASE if getattr(self, "i", None) else 0
+        if any(_portable_regex(pattern, flags) is None for pattern in patterns):
+            return None
+
+        if not _ripgrep_available():
+            rel_paths = [
+                os.path.relpath(p, search_path)
+                for p in py_search.list_files(
+                    search_path, self.type, self.glob, snapshot=get_snapshot(self.context)
+                )
+            ]
+            return self._narrow_with_index(root, search_path, rel_paths, patterns)
+
+        # Let rg enumerate files so .gitignore/hidden/type/glob rules stay identical
+        listing = subprocess.run(
+            ["rg", "--files", "--color=never"] + self._filter_args(),
+            capture_output=True,
+            text=True,
+            timeout=30,
+            cwd=root,
+        )
+        if listing.returncode not in (0, 1):
+            return None
+        rel_paths = [line for line in listing.stdout.splitlines() if line]
+        return self._narrow_with_index(root, search_path, rel_paths, patterns)
+
+    def _narrow_with_index(self, root, search_path, rel_paths, patterns):
+        ignore_case = bool(getattr(self, "i", None))
+        index = TrigramIndex.for_root(root)
+        snapshot = get_snapshot(self.context)
+        selected = set()
+        for pattern in patterns:
+            candidates = index.candidates(
+                rel_paths,
+                pattern,
+                ignore_case=ignore_case,
+                stat=snapshot.stat,
+                # Without type/glob filters the listing covers the whole root
+                prune=not (self.type or self.glob),
+            )
+            if candidates is None:
+                return None
+            selected.update(candidates)
+        return [os.path.join(search_path, rel) for rel in rel_paths if rel in selected]
+
+    def _collect_lines(self, stream, max_lines=None, max_chars=None):
+        """Collect lines from a streaming search, stopping it once a limit is reached.
+
+        stream is called with an on_line callback and returns
+        (returncode, stderr, stopped_early). Returns (returncode, stdout, stderr, stopped_early).
+        """
+        out_lines = []
+        out_chars = 0
+
+        def collect(line):
+            nonlocal out_chars
+            out_lines.append(line)
+            out_chars += len(line) + 1
+            # Keep one line past head_limit so the caller can report the cut
+            return bool(
+                (max_lines and len(out_lines) > max_lines)
+                or (max_chars and out_chars > max_chars)
+            )
+
+        returncode, stderr, stopped_early = stream(collect)
+        return returncode, "\n".join(out_lines), stderr, stopped_early
+
+    def _stream_ripgrep(self, cmd, targets, timeout, on_line):
+        """Feed rg stdout lines to on_line until it returns True or rg exits.
+
+        Long path lists are split into several rg calls sharing one deadline.
+        Returns (returncode, stderr, stopped_early).
+        """
+        batches = [[]]
+        batch_length = 0
+        for target in targets:
+            if batches[-1] and batch_length + len(target) > MAX_ARGS_LENGTH:
+                batches.append([])
+                batch_length = 0
+            batches[-1].append(target)
+            batch_length += len(target) + 1
+
+        deadline = time.monotonic() + timeout
+        returncode = 1
+        stderr_parts = []
+        for batch in batches:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise subprocess.TimeoutExpired(cmd, timeout)
+
+            process = subprocess.Popen(
+                cmd + batch,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+                text=True,
+                encoding="utf-8",
+                errors="replace",
+                cwd=os.getcwd(),
+            )
+            timed_out = threading.Event()
+
+            def on_timeout(process=process, timed_out=timed_out):
+                timed_out.set()
+                process.kill()
+
+            timer = threading.Timer(remaining, on_timeout)
+            timer.daemon = True
+            timer.start()
+            stderr_reader = threading.Thread(
+                target=_drain_capped, args=(process.stderr, stderr_parts), daemon=True
+            )
+            stderr_reader.start()
+
+            stopped = False
+            try:
+                while True:
+                    line = process.stdout.readline(MAX_STREAM_LINE_CHARS)
+                    if not line:
+                        break
+                    if not line.endswith("\n"):
+                        # Skip the rest of an overlong line instead of buffering it
+                        while True:
+                            rest = process.stdout.readline(MAX_STREAM_LINE_CHARS)
+                            if not rest or rest.endswith("\n"):
+                                break
+                    if on_line(line.rstrip("\n")):
+                        stopped = True
+                        break
+            finally:
+                if stopped:
+                    process.kill()
+                process.stdout.close()
+                process.wait()
+                timer.cancel()
+                stderr_reader.join()
+
+            if timed_out.is_set():
+                raise subprocess.TimeoutExpired(cmd, timeout)
+            if stopped:
+                return 0, "".join(stderr_parts), True
+            if process.returncode not in (0, 1):
+                returncode = process.returncode
+            elif process.returncode == 0 and returncode == 1:
+                returncode = 0
+        return returncode, "".join(stderr_parts), False
+
+
+_rg_available = None
+
+
+def _ripgrep_available():
+    """Check once per process whether the rg binary can be executed."""
+    global _rg_available
+    if _rg_available is None:
+        try:
+            subprocess.run(["rg", "--version"], capture_output=True, check=True)
+            _rg_available = True
+        except (subprocess.CalledProcessError, FileNotFoundError):
+            _rg_available = False
+    return _rg_available
+
+
+def _apply_head_limit(output, head_limit):
+    """Keep the first head_limit lines of output, noting when lines were dropped."""
+    if head_limit and output:
+        lines = output.split("\n")
+        if len(lines) > head_limit:
+            output = "\n".join(lines[:head_limit])
+            output += f"\n... (output limited to first {head_limit} lines)"
+    return output
+
+
+def _json_text(value):
+    """Decode an rg --json text/bytes field."""
+    if not value:
+        return ""
+    if "text" in value:
+        return value["text"]
+    return base64.b64decode(value.get("bytes", "")).decode("utf-8", errors="replace")
+
+
+def _portable_regex(pattern, flags):
+    """Compile pattern with re if it means the same to ripgrep, else return None."""
+    i = 0
+    while i < len(pattern):
+        ch = pattern[i]
+        if ch == "\\":
+            if pattern[i + 1 : i + 2] not in PORTABLE_ESCAPES:
+                return None
+            i += 2
+            continue
+        if ch == "(" and pattern.startswith("(?", i) and not pattern.startswith("(?:", i):
+            return None
+        if ch == "[":
+            # Nested classes, POSIX classes and set operations differ
+            end = pattern.find("]", i + 2)
+            body = pattern[i + 1 : end] if end != -1 else pattern[i + 1 :]
+            if "[" in body or "&&" in body or "--" in body or "~~" in body:
+                return None
+        if ch == "$" and i + 1 < len(pattern):
+            return None  # Only a trailing $ behaves the same on a single line
+        i += 1
+    try:
+        return re.compile(pattern, flags)
+    except re.error:
+        return None
+
+
+def _render_content(path, lines, match_numbers, before, after, show_numbers, separate):
+    """Render matches of one file in rg's content format, including context.
+
+    path is None for a single-file search, which rg prints without file names.
+    """
+    wanted = {}
+    for number in match_numbers:
+        for ctx in range(number - before, number + after + 1):
+            if ctx in lines and wanted.get(ctx) != ":":
+                wanted[ctx] = ":" if ctx == number else "-"
+        wanted[number] = ":"
+
+    rendered = []
+    previous = None
+    for number in sorted(wanted):
+        if (before or after) and (separate or rendered) and previous != number - 1:
+            rendered.append("--")
+        sep = wanted[number]
+        if path is None:
+            prefix = f"{number}{sep}" if show_numbers else ""
+        else:
+            prefix = f"{path}{sep}{number}{sep}" if show_numbers else f"{path}{sep}"
+        rendered.append(f"{prefix}{lines.get(number, '')}")
+        previous = number
+    return rendered
+
+
+def _drain_capped(stream, sink, limit=MAX_STDERR_CHARS):
+    """Read a stream to EOF, keeping at most limit characters in sink."""
+    kept = 0
+    for chunk in iter(lambda: stream.read(4096), ""):
+        if kept < limit:
+            sink.append(chunk[: limit - kept])
+            kept += len(sink[-1])
+    stream.close()
 
 
 # Create alias for Agency Swarm tool loading (expects class name = file name)
@@ -1,4 +1,3 @@
-import glob as glob_module
 import os
 from datetime import datetime
 from typing import List, Optional
@@ -6,6 +5,8 @@ from typing import List, Optional
 from agency_swarm.tools import BaseTool
 from pydantic import Field
 
+from agency_code_agent.tools.utils import compile_patterns, get_snapshot
+
 
 class LS(BaseTool):
     """
@@ -37,43 +38,41 @@ class LS(BaseTool):
                 return f"Error: Path is not a directory: {self.path}"
 
             try:
-                # Get directory contents
-                items = os.listdir(self.path)
+                # Get directory contents (cached per session, re-checked by mtime)
+                entries = get_snapshot(self.context).scandir(self.path)
             except PermissionError:
                 return f"Error: Permission denied accessing: {self.path}"
 
-            # Apply ignore patterns if provided
+            # Apply ignore patterns if provided (compiled once, gitignore syntax)
             if self.ignore:
-                filtered_items = []
-                for item in items:
-                    should_ignore = False
-                    for pattern in self.ignore:
-                        if glob_module.fnmatch.fnmatch(item, pattern):
-                            should_ignore = True
-                            break
-                    if not should_ignore:
-                        filtered_items.append(item)
-                items = filtered_items
-
-            if not items:
+                ignore_rules = compile_patterns(self.ignore)
+                entries = [
+                    entry
+                    for entry in entries
+                    if not ignore_rules.match(entry.name, _is_dir(entry))
+                ]
+
+            if not entries:
                 return f"Directory is empty (or all items were filtered): {self.path}"
 
             # Sort items
-            items.sort()
+            entries = sorted(entries, key=lambda entry: entry.name)
 
-            # Get detailed information for each item
+            # Get detailed information for each item; the listing may be cached,
+            # so sizes and mtimes come from a fresh stat
             detailed_items = []
-            for item in items:
+            for entry in entries:
+                item = entry.name
                 full_path = os.path.join(self.path, item)
                 try:
-                    stat_info = os.stat(full_path)
+                    stat_info = os.stat(entry.path)
 
-                    # Determine type (check symlink first since os.stat follows links)
-                    if os.path.islink(full_path):
+                    # Determine type (check symlink first since stat follows links)
+                    if entry.is_symlink():
                         item_type = "LINK"
-                    elif os.path.isdir(full_path):
+                    elif entry.is_dir():
                         item_type = "DIR"
-                    elif os.path.isfile(full_path):
+                    elif entry.is_file():
                         item_type = "FILE"
                     else:
                         item_type = "OTHER"
@@ -148,6 +147,13 @@ class LS(BaseTool):
             return f"Error listing directory: {str(e)}"
 
 
+def _is_dir(entry) -> bool:
+    try:
+        return entry.is_dir()
+    except OSError:
+        return False
+
+
 # Create alias for Agency Swarm tool loading (expects class name = file name)
 ls = LS
 
@@ -1,11 +1,20 @@
 import os
-from typing import List, Optional
+from typing import List, Optional, Tuple
 
 from agency_swarm.tools import BaseTool
 from pydantic import BaseModel, Field
 
 # Import the global read files registry
 from agency_code_agent.tools.read import _global_read_files
+from agency_code_agent.tools.utils import (
+    apply_spans,
+    checkpoint,
+    find_occurrences,
+    get_content_cache,
+    invalidate_path,
+    non_overlapping,
+    syntax_report,
+)
 
 
 class EditOperation(BaseModel):
@@ -32,8 +41,8 @@ class MultiEdit(BaseTool):
        - replace_all: Replace all occurrences of old_string. This parameter is optional and defaults to false.
 
     IMPORTANT:
-    - All edits are applied in sequence, in the order they are provided
-    - Each edit operates on the result of the previous edit
+    - All edits are located in the file contents as they were before this call, in a single pass
+    - Edits must not overlap each other, and an edit cannot target text introduced by another edit
     - All edits must be valid for the operation to succeed - if any edit fails, none will be applied
     - This tool is ideal when you need to make several changes to different parts of the same file
     - For Jupyter notebooks (.ipynb files), use the NotebookEdit instead
@@ -41,12 +50,12 @@ class MultiEdit(BaseTool):
     CRITICAL REQUIREMENTS:
     1. All edits follow the same requirements as the single Edit tool
     2. The edits are atomic - either all succeed or none are applied
-    3. Plan your edits carefully to avoid conflicts between sequential operations
+    3. Plan your edits carefully so that no two edits touch the same text
 
     WARNING:
     - The tool will fail if edits.old_string doesn't match the file contents exactly (including whitespace)
     - The tool will fail if edits.old_string and edits.new_string are the same
-    - Since edits are applied in sequence, ensure that earlier edits don't affect the text that later edits are trying to find
+    - The tool will fail if two edits match overlapping text; merge them into one edit instead
 
     When making edits:
     - Ensure all edits result in idiomatic, correct code
@@ -58,14 +67,17 @@ class MultiEdit(BaseTool):
     If you want to create a new file, use:
     - A new file path, including dir name if needed
     - First edit: empty old_string and the new file's contents as new_string
-    - Subsequent edits: normal edit operations on the created content
+    - Subsequent edits: normal edit operations on the created content (the first edit's new_string)
     """
 
     file_path: str = Field(..., description="The absolute path to the file to modify")
     edits: List[EditOperation] = Field(
         ...,
         min_length=1,
-        description="Array of edit operations to perform sequentially on the file",
+        description=(
+            "Edit operations, all matched against the file as it was before this call (not applied one "
+            "after another); they must not overlap and all must succeed or none is applied"
+        ),
     )
 
     def run(self):
@@ -111,52 +123,34 @@ class MultiEdit(BaseTool):
                 if not file_has_been_read:
                     return "Error: You must use Read tool at least once before editing this file. This tool will error if you attempt an edit without reading the file first."
 
-                # Read the existing file
+                # Read the existing file (usually already cached by Read)
                 try:
-                    with open(self.file_path, "r", encoding="utf-8") as file:
-                        content = file.read()
+                    content = get_content_cache(self.context).read_text(self.file_path)
                 except UnicodeDecodeError:
                     return f"Error: Unable to decode file {self.file_path}. It may be a binary file."
 
                 remaining_edits = self.edits
 
-            # Validate all edits before applying any
-            for i, edit in enumerate(remaining_edits):
-                # Check that old_string and new_string are different
-                if edit.old_string == edit.new_string:
-                    return f"Error in edit {i + 1}: old_string and new_string must be different"
-
-                # Check if old_string exists in current content
-                if edit.old_string not in content:
-                    return f"Error in edit {i + 1}: String to replace not found in file.\\nString: {repr(edit.old_string)}"
-
-                # If not replace_all, check for uniqueness
-                if not edit.replace_all and content.count(edit.old_string) > 1:
-                    count = content.count(edit.old_string)
-                    return f"Error in edit {i + 1}: String appears {count} times in file. Either provide a larger string with more surrounding context to make it unique or use replace_all=True."
-
-            # Apply all edits sequentially
-            edit_count = 0
-            for i, edit in enumerate(remaining_edits):
-                if edit.replace_all:
-                    occurrences = content.count(edit.old_string)
-                    content = content.replace(edit.old_string, edit.new_string)
-                    edit_count += occurrences
-                else:
-                    content = content.replace(edit.old_string, edit.new_string, 1)
-                    edit_count += 1
+            try:
+                content, edit_count = apply_edits(content, remaining_edits)
+            except ValueError as e:
+                return f"Error in {e}"
 
             # Write the final content to the file
             try:
-                with open(self.file_path, "w", encoding="utf-8") as file:
-                    file.write(content)
+                with checkpoint(self.context, "MultiEdit", [self.file_path]):
+                    with open(self.file_path, "w", encoding="utf-8") as file:
+                        file.write(content)
+                invalidate_path(self.file_path)
+                get_content_cache(self.context).update(self.file_path, content)
 
+                report = syntax_report([(self.file_path, content)])
                 if creating_new_file:
                     total_operations = len(self.edits)
-                    return f"Successfully created new file {self.file_path} and applied {total_operations} edit operations ({edit_count} total replacements)"
+                    return f"Successfully created new file {self.file_path} and applied {total_operations} edit operations ({edit_count} total replacements){report}"
                 else:
                     total_operations = len(self.edits)
-                    return f"Successfully applied {total_operations} edit operations ({edit_count} total replacements) to {self.file_path}"
+                    return f"Successfully applied {total_operations} edit operations ({edit_count} total replacements) to {self.file_path}{report}"
 
             except PermissionError:
                 return f"Error: Permission denied writing to file: {self.file_path}"
@@ -167,6 +161,53 @@ class MultiEdit(BaseTool):
             return f"Error during multi-edit operation: {str(e)}"
 
 
+def apply_edits(content: str, edits: List[EditOperation]) -> Tuple[str, int]:
+    """Apply edits located in a single pass over content.
+
+    Returns (new content, number of replacements). Raises ValueError with a
+    message starting with "edit N:" when an edit is invalid.
+    """
+    # Validate all edits before applying any
+    for i, edit in enumerate(edits):
+        # Check that old_string and new_string are different
+        if edit.old_string == edit.new_string:
+            raise ValueError(f"edit {i + 1}: old_string and new_string must be different")
+        if not edit.old_string:
+            raise ValueError(f"edit {i + 1}: old_string must not be empty")
+
+    # Locate every old_string in a single pass over the content
+    occurrences = find_occurrences(content, [e.old_string for e in edits])
+    spans = []
+    for i, edit in enumerate(edits):
+        positions = non_overlapping(occurrences[edit.old_string], len(edit.old_string))
+
+        # Check if old_string exists in current content
+        if not positions:
+            raise ValueError(
+                f"edit {i + 1}: String to replace not found in file.\\nString: {repr(edit.old_string)}"
+            )
+
+        # If not replace_all, check for uniqueness
+        if not edit.replace_all and len(positions) > 1:
+            raise ValueError(
+                f"edit {i + 1}: String appears {len(positions)} times in file. Either provide a larger string with more surrounding context to make it unique or use replace_all=True."
+            )
+
+        spans.extend((pos, pos + len(edit.old_string), edit.new_string, i) for pos in positions)
+
+    # Edits are applied together, so their matches must not overlap
+    spans.sort()
+    for previous, current in zip(spans, spans[1:]):
+        if current[0] < previous[1]:
+            first, second = sorted((previous[3], current[3]))
+            raise ValueError(
+                f"edit {second + 1}: String overlaps the text matched by edit {first + 1}. Combine them into a single edit."
+            )
+
+    # Build the new content in one pass over the precomputed spans
+    return apply_spans(content, [span[:3] for span in spans]), len(spans)
+
+
 # Create alias for Agency Swarm tool loading (expects class name = file name)
 multi_edit = MultiEdit
 
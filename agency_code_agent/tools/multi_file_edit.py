@@ -0,0 +1,313 @@
+import os
+import shutil
+import stat
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+
+from agency_swarm.tools import BaseTool
+from pydantic import BaseModel, Field
+
+from agency_code_agent.tools.multi_edit import EditOperation, apply_edits
+
+# Import the global read files registry
+from agency_code_agent.tools.read import _global_read_files
+from agency_code_agent.tools.utils import (
+    checkpoint,
+    get_content_cache,
+    get_journal,
+    invalidate_path,
+    syntax_report,
+)
+
+# Constants
+MAX_EDIT_WORKERS = 8
+
+_umask_lock = threading.Lock()
+
+
+def _current_umask() -> int:
+    """The process umask, read from /proc without changing it.
+
+    os.umask can only be read by setting it, which briefly changes it for every
+    thread; that is the fallback where /proc does not report the umask.
+    """
+    try:
+        with open("/proc/self/status", "rb") as status:
+            for line in status:
+                if line.startswith(b"Umask:"):
+                    return int(line.split()[1], 8)
+    except (OSError, ValueError, IndexError):
+        pass
+    with _umask_lock:
+        umask = os.umask(0o022)
+        os.umask(umask)
+    return umask
+
+
+class FileEdits(BaseModel):
+    file_path: str = Field(..., description="The absolute path to the file to modify")
+    edits: List[EditOperation] = Field(
+        ...,
+        min_length=1,
+        description="Edit operations for this file, with the same rules as MultiEdit",
+    )
+
+
+class MultiFileEdit(BaseTool):
+    """
+    Applies edits to many files as one transaction: either every file is changed or none is.
+
+    Use this for refactors that touch several files (renames, signature changes, moving code) instead of a series of Edit/MultiEdit calls.
+
+    Usage:
+    - You must use your `Read` tool on every existing file before editing it. This tool will error otherwise.
+    - Each entry in `files` has a file_path and a list of edits with the same rules as MultiEdit: old_string must match exactly and be unique unless replace_all is set, and edits to one file must not overlap.
+    - To create a new file, give it a first edit with an empty old_string and the new file's contents as new_string.
+    - All files are read and validated before anything is written. If any edit in any file is invalid, no file is modified and the errors for every failing file are reported.
+    - Each file may appear only once; put all of its edits in one entry.
+    - For Jupyter notebooks (.ipynb files), use the NotebookEdit instead.
+    """
+
+    files: List[FileEdits] = Field(
+        ...,
+        min_length=1,
+        description="The files to edit, each with its own list of edit operations",
+    )
+
+    def run(self):
+        try:
+            # Each file may only appear once so the transaction has one plan per file
+            seen = set()
+            for entry in self.files:
+                real_path = os.path.realpath(entry.file_path)
+                if real_path in seen:
+                    return f"Error: {entry.file_path} appears more than once. Combine its edits into a single entry."
+                seen.add(real_path)
+
+            # Read and validate every file concurrently; nothing is written yet
+            workers = min(MAX_EDIT_WORKERS, len(self.files))
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                plans = list(pool.map(self._plan, self.files))
+
+            errors = [(entry, plan) for entry, plan in zip(self.files, plans) if isinstance(plan, str)]
+            if errors:
+                lines = [
+                    f"Error: No files were changed. {len(errors)} of {len(self.files)} files failed validation:"
+                ]
+                lines.extend(f"- {entry.file_path}: {message}" for entry, message in errors)
+                return "\n".join(lines)
+
+            # Every file gets a new inode, so the old ones can be hardlinked
+            with checkpoint(
+                self.context, "MultiFileEdit", [plan["path"] for plan in plans], link=True
+            ) as operation:
+                commit_error = self._commit(plans)
+            if commit_error:
+                get_journal(self.context).discard(operation)
+                return commit_error
+
+            content_cache = get_content_cache(self.context)
+            summary = []
+            total_replacements = 0
+            for entry, plan in zip(self.files, plans):
+                for path in {os.path.abspath(entry.file_path), plan["path"]}:
+                    invalidate_path(path)
+                    content_cache.update(path, plan["content"])
+                total_replacements += plan["replacements"]
+                action = "created with" if plan["creating"] else "applied"
+                summary.append(
+                    f"- {entry.file_path}: {action} {len(entry.edits)} edit operations ({plan['replacements']} replacements)"
+                )
+            header = f"Successfully edited {len(self.files)} files ({total_replacements} total replacements):"
+            # Check every touched file together on the worker pool
+            report = syntax_report(
+                [(entry.file_path, plan["content"]) for entry, plan in zip(self.files, plans)]
+            )
+            return "\n".join([header] + summary) + report
+
+        except Exception as e:
+            return f"Error during multi-file edit: {str(e)}"
+
+    def _plan(self, entry: FileEdits):
+        """Compute the new content for one file, or return an error message."""
+        try:
+            path = os.path.realpath(entry.file_path)
+            creating = entry.edits[0].old_string == ""
+
+            if creating:
+                if os.path.exists(entry.file_path):
+                    return "File already exists, cannot create new file"
+                content = entry.edits[0].new_string
+                remaining_edits = entry.edits[1:]
+                original_stat = None
+            else:
+                if not os.path.exists(entry.file_path):
+                    return "File does not exist"
+                if not os.path.isfile(entry.file_path):
+                    return "Path is not a file"
+
+                # Enforce prior Read for all existing files
+                abs_file_path = os.path.abspath(entry.file_path)
+                file_has_been_read = False
+                if self.context is not None:
+                    read_files = self.context.get("read_files", set())
+                    file_has_been_read = abs_file_path in read_files
+                if not file_has_been_read:
+                    file_has_been_read = abs_file_path in _global_read_files
+                if not file_has_been_read:
+                    return "You must use Read tool at least once before editing this file."
+
+                original_stat = os.stat(path)
+                try:
+                    content = get_content_cache(self.context).read_text(path)
+                except UnicodeDecodeError:
+                    return "Unable to decode file. It may be a binary file."
+                remaining_edits = entry.edits
+
+            if remaining_edits:
+                try:
+                    content, replacements = apply_edits(content, remaining_edits)
+                except ValueError as e:
+                    return f"Error in {e}"
+            else:
+                replacements = 0
+
+            return {
+                "path": path,
+                "content": content,
+                "creating": creating,
+                "stat": original_stat,
+                "replacements": replacements,
+            }
+        except PermissionError:
+            return "Permission denied"
+        except Exception as e:
+            return str(e)
+
+    def _commit(self, plans) -> str:
+        """Write every plan through a temp file and os.replace, all or nothing.
+
+        Returns an error message (after restoring every file) or "" on success.
+        """
+        umask = _current_umask()
+
+        staged = []  # (plan, temp path)
+        backups = []  # (plan, backup path or None for new files), in replace order
+        try:
+            # Stage: write every new version next to its target
+            for plan in plans:
+                directory = os.path.dirname(plan["path"])
+                if plan["creating"]:
+                    os.makedirs(directory, exist_ok=True)
+                fd, temp_path = tempfile.mkstemp(
+                    dir=directory, prefix=f".{os.path.basename(plan['path'])}.", suffix=".tmp"
+                )
+                staged.append((plan, temp_path))
+                with os.fdopen(fd, "w", encoding="utf-8") as file:
+                    file.write(plan["content"])
+                if plan["stat"] is not None:
+                    os.chmod(temp_path, stat.S_IMODE(plan["stat"].st_mode))
+                else:
+                    os.chmod(temp_path, 0o666 & ~umask)
+
+            # Refuse to commit over files that changed since they were validated
+            for plan, _ in staged:
+                if plan["creating"]:
+                    if os.path.exists(plan["path"]):
+                        raise RuntimeError(f"{plan['path']} was created by someone else during the edit")
+                    continue
+                current = os.stat(plan["path"])
+                if (current.st_mtime_ns, current.st_size) != (
+                    plan["stat"].st_mtime_ns,
+                    plan["stat"].st_size,
+                ):
+                    raise RuntimeError(f"{plan['path']} changed on disk during the edit")
+
+            # Commit: keep the original inode under a backup name, then swap
+            for plan, temp_path in staged:
+                backup_path = None
+                if not plan["creating"]:
+                    backup_path = temp_path[: -len(".tmp")] + ".orig"
+                    try:
+                        os.link(plan["path"], backup_path)
+                    except OSError:
+                        shutil.copy2(plan["path"], backup_path)
+                backups.append((plan, backup_path))
+                os.replace(temp_path, plan["path"])
+
+        except Exception as e:
+            # Roll back whatever was already replaced, newest first
+            for plan, backup_path in reversed(backups):
+                try:
+                    if backup_path is None:
+                        os.unlink(plan["path"])
+                    else:
+                        os.replace(backup_path, plan["path"])
+                        # rename() is a no-op when both names link the same inode
+                        if os.path.lexists(backup_path):
+                            os.unlink(backup_path)
+                except OSError:
+                    pass
+            for _, temp_path in staged:
+                if os.path.exists(temp_path):
+                    os.unlink(temp_path)
+            return f"Error: No files were changed. Commit failed: {str(e)}"
+
+        for _, backup_path in backups:
+            if backup_path is not None:
+                os.unlink(backup_path)
+        return ""
+
+
+# Create alias for Agency Swarm tool loading (expects class name = file name)
+multi_file_edit = MultiFileEdit
+
+if __name__ == "__main__":
+    from agency_code_agent.tools.read import Read
+
+    # Test the tool on two temporary files
+    test_dir = tempfile.mkdtemp()
+    first = os.path.join(test_dir, "models.py")
+    second = os.path.join(test_dir, "views.py")
+    with open(first, "w") as f:
+        f.write("class OldName:\n    pass\n")
+    with open(second, "w") as f:
+        f.write("from models import OldName\n\nitem = OldName()\n")
+    for path in (first, second):
+        Read(file_path=path).run()
+
+    tool = MultiFileEdit(
+        files=[
+            FileEdits(
+                file_path=first,
+                edits=[EditOperation(old_string="OldName", new_string="NewName")],
+            ),
+            FileEdits(
+                file_path=second,
+                edits=[EditOperation(old_string="OldName", new_string="NewName", replace_all=True)],
+            ),
+        ]
+    )
+    print(tool.run())
+
+    # A failing edit leaves both files untouched
+    tool2 = MultiFileEdit(
+        files=[
+            FileEdits(
+                file_path=first,
+                edits=[EditOperation(old_string="NewName", new_string="Renamed")],
+            ),
+            FileEdits(
+                file_path=second,
+                edits=[EditOperation(old_string="missing", new_string="x")],
+            ),
+        ]
+    )
+    print("\n" + "=" * 50 + "\n")
+    print(tool2.run())
+    with open(first) as f:
+        print(f.read())
+
+    shutil.rmtree(test_dir)
@@ -5,6 +5,8 @@ from typing import Literal, Optional
 from agency_swarm.tools import BaseTool
 from pydantic import Field
 
+from agency_code_agent.tools.utils import checkpoint, invalidate_path
+
 
 class NotebookEdit(BaseTool):
     """
@@ -236,8 +238,10 @@ class NotebookEdit(BaseTool):
 
     def _save_notebook(self, notebook_data):
         """Save the notebook data to file."""
-        with open(self.notebook_path, "w", encoding="utf-8") as f:
-            json.dump(notebook_data, f, indent=2, ensure_ascii=False)
+        with checkpoint(self.context, "NotebookEdit", [self.notebook_path]):
+            with open(self.notebook_path, "w", encoding="utf-8") as f:
+                json.dump(notebook_data, f, indent=2, ensure_ascii=False)
+        invalidate_path(self.notebook_path)
 
 
 # Create alias for Agency Swarm tool loading (expects class name = file name)
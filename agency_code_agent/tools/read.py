@@ -1,14 +1,51 @@
+import bz2
+import gzip
+import lzma
 import mimetypes
+import mmap
 import os
-from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
 
 from agency_swarm.tools import BaseTool
-from pydantic import Field
+from pydantic import BaseModel, Field
+
+from agency_code_agent.tools.utils import (
+    LineIndex,
+    content_hash,
+    decode_text,
+    get_content_cache,
+    get_line_index,
+    get_read_versions,
+    get_stream_line_index,
+    line_diff,
+)
+
+# Constants
+DEFAULT_LINE_LIMIT = 2000
+MAX_LINE_BYTES = 8 * 1024  # Enough bytes for any 2000-character line
+MAX_BATCH_OUTPUT_CHARS = 100000  # Output budget shared by the files of one batch
+MAX_READ_WORKERS = 8
+CACHE_FILL_MAX_BYTES = 1024 * 1024  # Smaller files are kept decoded for Edit/MultiEdit
+BINARY_SNIFF_BYTES = 8192
+TEXT_CONTROL_BYTES = {7, 8, 9, 10, 12, 13, 27}  # Control characters common in text/logs
+
+# Compressed logs are decompressed transparently
+DECOMPRESSORS = {".gz": gzip.open, ".bz2": bz2.open, ".xz": lzma.open}
 
 # Global registry for tracking read files when context is not available
 _global_read_files = set()
 
 
+class FileToRead(BaseModel):
+    file_path: str = Field(..., description="The absolute path to the file to read")
+    offset: Optional[int] = Field(
+        None,
+        description="The line number to start reading from. A negative value reads from the end of the file.",
+    )
+    limit: Optional[int] = Field(None, description="The number of lines to read.")
+
+
 class Read(BaseTool):
     """
     Reads a file from the local filesystem. You can access any file directly by using this tool.
@@ -18,109 +55,354 @@ class Read(BaseTool):
     - The file_path parameter must be an absolute path, not a relative path
     - By default, it reads up to 2000 lines starting from the beginning of the file
     - You can optionally specify a line offset and limit (especially handy for long files), but it's recommended to read the whole file by not providing these parameters
+    - A negative offset reads the end of the file, like tail (e.g. offset=-50 for the last 50 lines)
     - Any lines longer than 2000 characters will be truncated
     - Results are returned using cat -n format, with line numbers starting at 1
     - This tool allows you to read images (eg PNG, JPG, etc). When reading an image file the contents are presented visually as you are a multimodal LLM.
     - For Jupyter notebooks (.ipynb files), use the NotebookRead instead
+    - Compressed logs (.gz, .bz2, .xz) are decompressed transparently, with the same offset/limit paging (far pages of large .bz2/.xz files are slower, as they are decompressed from the start)
     - You will regularly be asked to read screenshots. If the user provides a path to a screenshot ALWAYS use this tool to view the file at the path. This tool will work with all temporary file paths like /var/folders/123/abc/T/TemporaryItems/NSIRD_screencaptureui_ZfB1tD/Screenshot.png
     - If you read a file that exists but has empty contents you will receive a system reminder warning in place of file contents.
+    - To understand a module, read several files at once by passing them in `files`; they are read concurrently and returned in one result
+    - To re-read a file you have already read (e.g. after editing it or running a command that changes it), set diff=True to get only what changed since you last read it, as a unified diff
     """
 
-    file_path: str = Field(..., description="The absolute path to the file to read")
+    file_path: Optional[str] = Field(
+        None,
+        description="The absolute path to the file to read. Required unless files is given.",
+    )
+    files: Optional[List[FileToRead]] = Field(
+        None,
+        description="Several files to read in one call, each with its own optional offset and limit. Results are returned in order, one section per file, sharing one output budget. If file_path is also given it is read first.",
+    )
     offset: Optional[int] = Field(
         None,
-        description="The line number to start reading from. Only provide if the file is too large to read at once",
+        description="The line number to start reading from. Only provide if the file is too large to read at once. A negative value reads from the end of the file (e.g. -100 starts 100 lines before the end)",
     )
     limit: Optional[int] = Field(
         None,
         description="The number of lines to read. Only provide if the file is too large to read at once.",
     )
+    diff: bool = Field(
+        False,
+        description="If the file was already read in this session, return a unified diff against the version you last saw (or a note that it is unchanged) instead of its contents. Falls back to a normal read when there is no earlier version or the diff would be longer than a page.",
+    )
 
     def run(self):
         try:
-            # Track that this file has been read in shared state (or global fallback)
-            abs_path = os.path.abspath(self.file_path)
+            requests = self._requests()
+            if not requests:
+                return "Error: Provide either file_path or files to read."
+
+            # Track that these files have been read in shared state (or global fallback)
+            abs_paths = [os.path.abspath(r.file_path) for r in requests]
             if self.context is not None:
                 read_files = self.context.get("read_files", set())
-                read_files.add(abs_path)
+                read_files.update(abs_paths)
                 self.context.set("read_files", read_files)
             # Always mirror into global registry to ensure persistence across tool instances in tests
             global _global_read_files
-            _global_read_files.add(abs_path)
+            _global_read_files.update(abs_paths)
 
+            if self.files:
+                return self._run_batch(requests)
+            request = requests[0]
+            return self._read_file(request.file_path, request.offset, request.limit)
+
+        except Exception as e:
+            return f"Error reading file: {str(e)}"
+
+    def _requests(self) -> List[FileToRead]:
+        """Normalize file_path/files into one list of read requests."""
+        requests = []
+        if self.file_path:
+            requests.append(
+                FileToRead(file_path=self.file_path, offset=self.offset, limit=self.limit)
+            )
+        requests.extend(self.files or [])
+        return requests
+
+    def _run_batch(self, requests: List[FileToRead]) -> str:
+        """Read several files concurrently and combine them into delimited sections."""
+        workers = min(MAX_READ_WORKERS, len(requests))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = list(
+                pool.map(lambda r: self._read_file(r.file_path, r.offset, r.limit), requests)
+            )
+
+        caps = _share_budget([len(result) for result in results], MAX_BATCH_OUTPUT_CHARS)
+        sections = []
+        for idx, (request, result, cap) in enumerate(zip(requests, results, caps)):
+            header = f"=== File {idx + 1}/{len(requests)}: {request.file_path} ==="
+            if len(result) > cap:
+                cut = result.rfind("\n", 0, cap)
+                result = result[: cut if cut > 0 else cap]
+                result += "\n[Truncated: batch output budget reached; read this file again with offset/limit to see more]"
+                # What was cut was never seen, so it cannot be diffed against
+                get_read_versions(self.context).forget(request.file_path)
+            sections.append(f"{header}\n{result}")
+        return "\n\n".join(sections)
+
+    def _read_file(self, file_path: str, offset: Optional[int], limit: Optional[int]) -> str:
+        try:
             # Check if path exists
-            if not os.path.exists(self.file_path):
-                return f"Error: File does not exist: {self.file_path}"
+            if not os.path.exists(file_path):
+                return f"Error: File does not exist: {file_path}"
 
             # Check if it's a file
-            if not os.path.isfile(self.file_path):
-                return f"Error: Path is not a file: {self.file_path}"
+            if not os.path.isfile(file_path):
+                return f"Error: Path is not a file: {file_path}"
 
             # Check if it's an image file (basic check)
-            mime_type, _ = mimetypes.guess_type(self.file_path)
+            mime_type, _ = mimetypes.guess_type(file_path)
             if mime_type and mime_type.startswith("image/"):
-                return f"[IMAGE FILE: {self.file_path}]\nThis is an image file ({mime_type}). In a multimodal environment, the image content would be displayed visually."
+                return f"[IMAGE FILE: {file_path}]\nThis is an image file ({mime_type}). In a multimodal environment, the image content would be displayed visually."
 
             # Check if it's a Jupyter notebook
-            if self.file_path.endswith(".ipynb"):
+            if file_path.endswith(".ipynb"):
                 return f"Error: This is a Jupyter notebook file. Please use the NotebookRead tool instead."
 
-            # Try to read the file
-            try:
-                with open(self.file_path, "r", encoding="utf-8") as file:
-                    lines = file.readlines()
-            except UnicodeDecodeError:
-                # Try with different encodings
-                try:
-                    with open(self.file_path, "r", encoding="latin-1") as file:
-                        lines = file.readlines()
-                except UnicodeDecodeError:
-                    return f"Error: Unable to decode file {self.file_path}. It may be a binary file."
-
-            # Handle empty file
-            if not lines:
-                return f"Warning: File exists but has empty contents: {self.file_path}"
-
-            # Apply offset and limit
-            start_line = (
-                (self.offset - 1) if self.offset else 0
-            )  # Convert to 0-based index
-            start_line = max(0, start_line)  # Ensure non-negative
-
-            if self.limit:
-                end_line = start_line + self.limit
-                selected_lines = lines[start_line:end_line]
-            else:
-                # Default limit of 2000 lines
-                selected_lines = lines[start_line : start_line + 2000]
-
-            # Format output with line numbers (cat -n style)
-            result_lines = []
-            for i, line in enumerate(selected_lines, start=start_line + 1):
-                # Truncate lines longer than 2000 characters
-                if len(line) > 2000:
-                    line = line[:1997] + "...\n"
-                # cat -n style: right-aligned 6-width line number, tab, then content
-                result_lines.append(f"{i:>6}\t{line.rstrip()}\n")
-            result = "".join(result_lines)
-
-            # Add metadata about truncation
-            total_lines = len(lines)
-            lines_shown = len(selected_lines)
-
-            if lines_shown < total_lines:
-                if self.offset or self.limit:
-                    result += f"\n[Truncated: showing lines {start_line + 1}-{start_line + lines_shown} of {total_lines} total lines]"
-                else:
-                    result += f"\n[Truncated: showing first {lines_shown} of {total_lines} total lines]"
+            decompress = DECOMPRESSORS.get(os.path.splitext(file_path)[1].lower())
+            if decompress is not None:
+                return self._read_compressed(file_path, decompress, offset, limit)
 
-            return result.rstrip()
+            # Page through a memory map using the cached line index, decoding
+            # only the requested lines
+            with open(file_path, "rb") as file:
+                st = os.fstat(file.fileno())
+                if st.st_size == 0:
+                    # Empty, or a special file (e.g. /proc) that reports no size
+                    data = file.read()
+                    if not data:
+                        return f"Warning: File exists but has empty contents: {file_path}"
+                    if _looks_binary(data[:BINARY_SNIFF_BYTES]):
+                        return _binary_error(file_path)
+                    return _format_page(LineIndex(len(data)), data, offset, limit)
+                with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+                    if _looks_binary(buf[:BINARY_SNIFF_BYTES]):
+                        return _binary_error(file_path)
+                    if st.st_size <= CACHE_FILL_MAX_BYTES:
+                        self._fill_content_cache(file_path, st, buf)
+                    if self.diff:
+                        changes = self._diff_since_last_read(file_path, st, buf)
+                        if changes is not None:
+                            return changes
+                    index = get_line_index(os.path.abspath(file_path), st)
+                    if _shows_whole_file(index.line_count(buf), offset, limit):
+                        self._remember_version(file_path, st, buf)
+                    return _format_page(index, buf, offset, limit)
 
         except PermissionError:
-            return f"Error: Permission denied reading file: {self.file_path}"
+            return f"Error: Permission denied reading file: {file_path}"
         except Exception as e:
             return f"Error reading file: {str(e)}"
 
+    def _read_compressed(self, file_path, decompress, offset, limit) -> str:
+        """Page through a compressed file, resuming decompression from the cached index."""
+        with decompress(file_path, "rb") as stream:
+            sample = stream.read(BINARY_SNIFF_BYTES)
+        if not sample:
+            return f"Warning: File exists but has empty contents: {file_path}"
+        if _looks_binary(sample):
+            return _binary_error(file_path)
+
+        st = os.stat(file_path)
+        index = get_stream_line_index(
+            os.path.abspath(file_path), st, lambda: decompress(file_path, "rb")
+        )
+        total_lines = index.line_count
+        if offset and offset < 0:
+            start_line = max(0, total_lines + offset)
+        else:
+            start_line = max(0, (offset - 1) if offset else 0)
+        max_lines = limit if limit else DEFAULT_LINE_LIMIT
+
+        segments = []
+        stream, line = index.open_at(start_line)
+        with stream:
+            while line < start_line and _skip_line(stream):
+                line += 1
+            while len(segments) < max_lines:
+                raw = stream.readline(MAX_LINE_BYTES)
+                if not raw:
+                    break
+                if raw.endswith(b"\n"):
+                    segments.append((raw[:-1], False, True))
+                else:
+                    # Either the last line or one longer than the cap
+                    truncated = len(raw) == MAX_LINE_BYTES
+                    terminated = truncated and _skip_line(stream)
+                    segments.append((raw, truncated, terminated))
+        return _render_page(segments, start_line, total_lines, offset, limit)
+
+    def _remember_version(self, file_path: str, st: os.stat_result, buf):
+        """Record the file, returned whole, so a later diff=True read can compare against it."""
+        versions = get_read_versions(self.context)
+        if st.st_size > versions.max_entry_bytes:
+            versions.forget(file_path)
+        elif not versions.unchanged(file_path, st):
+            versions.remember(file_path, st, buf[:])
+
+    def _diff_since_last_read(self, file_path: str, st: os.stat_result, buf) -> Optional[str]:
+        """Describe the changes since the version last returned, or None to read normally."""
+        versions = get_read_versions(self.context)
+        previous = versions.get(file_path)
+        if previous is None:
+            return None
+        if versions.unchanged(file_path, st):
+            return f"[Unchanged since you last read {file_path}]"
+        if st.st_size > versions.max_entry_bytes:
+            return None
+
+        data = buf[:]
+        digest = content_hash(data)
+        if digest == previous[1]:
+            versions.remember(file_path, st, data, digest)
+            return f"[Unchanged since you last read {file_path}]"
+
+        new_lines = _split_lines(data)
+        hunks = line_diff(_split_lines(previous[2]), new_lines)
+        if len(hunks) > DEFAULT_LINE_LIMIT:
+            return None
+        # The earlier version plus this diff is the whole new version
+        versions.remember(file_path, st, data, digest)
+        added = sum(1 for line in hunks if line.startswith("+"))
+        removed = sum(1 for line in hunks if line.startswith("-"))
+        header = f"[Changed since you last read {file_path}: +{added} -{removed} lines, now {len(new_lines)} lines]"
+        return "\n".join([header] + hunks)
+
+    def _fill_content_cache(self, file_path: str, st: os.stat_result, buf):
+        """Keep the decoded file so a following Edit does not read it again."""
+        cache = get_content_cache(self.context)
+        if cache.get(file_path, st) is not None:
+            return
+        try:
+            cache.put(file_path, st, decode_text(buf[:]))
+        except UnicodeDecodeError:
+            pass
+
+
+def _shows_whole_file(total_lines: int, offset: Optional[int], limit: Optional[int]) -> bool:
+    """True when the page for offset/limit covers every line of the file."""
+    if offset and offset < 0:
+        start_line = max(0, total_lines + offset)
+    else:
+        start_line = max(0, (offset - 1) if offset else 0)
+    return start_line == 0 and total_lines <= (limit if limit else DEFAULT_LINE_LIMIT)
+
+
+def _looks_binary(sample: bytes) -> bool:
+    """Sniff the start of a file: NUL bytes or mostly control characters mean binary."""
+    if b"\x00" in sample:
+        return True
+    if not sample:
+        return False
+    control = sum(1 for byte in sample if byte < 32 and byte not in TEXT_CONTROL_BYTES)
+    return control / len(sample) > 0.3
+
+
+def _binary_error(file_path: str) -> str:
+    return f"Error: Unable to decode file {file_path}. It appears to be a binary file."
+
+
+def _split_lines(data: bytes) -> List[str]:
+    """Split file bytes into lines the way Read numbers them."""
+    try:
+        text = data.decode("utf-8")
+    except UnicodeDecodeError:
+        text = data.decode("latin-1")
+    lines = text.split("\n")
+    if lines[-1] == "":
+        lines.pop()
+    return [line.rstrip("\r") for line in lines]
+
+
+def _skip_line(stream) -> bool:
+    """Consume the rest of the current line; False at end of stream."""
+    while True:
+        chunk = stream.readline(MAX_LINE_BYTES)
+        if not chunk:
+            return False
+        if chunk.endswith(b"\n"):
+            return True
+
+
+def _format_page(index: LineIndex, buf, offset: Optional[int], limit: Optional[int]) -> str:
+    """Render the requested lines of buf in cat -n format."""
+    total_lines = index.line_count(buf)
+    max_lines = limit if limit else DEFAULT_LINE_LIMIT
+
+    # Apply offset and limit; a negative offset counts from the end (tail mode)
+    if offset and offset < 0:
+        start_line, start_pos = index.tail_start(buf, -offset)
+    else:
+        start_line = max(0, (offset - 1) if offset else 0)
+        start_pos = index.line_start(buf, start_line)
+
+    # Slice out each line, capped so a huge line is never decoded in full
+    segments = []
+    pos = start_pos
+    while pos < index.size and len(segments) < max_lines:
+        newline = buf.find(b"\n", pos)
+        end = index.size if newline == -1 else newline
+        capped = min(end, pos + MAX_LINE_BYTES)
+        segments.append((buf[pos:capped], capped < end, newline != -1))
+        pos = end + 1
+    return _render_page(segments, start_line, total_lines, offset, limit)
+
+
+def _render_page(segments, start_line: int, total_lines: int, offset, limit) -> str:
+    """Format (raw line, truncated, terminated) segments in cat -n format."""
+    try:
+        texts = [_decode(raw, truncated, "utf-8") for raw, truncated, _ in segments]
+    except UnicodeDecodeError:
+        texts = [_decode(raw, truncated, "latin-1") for raw, truncated, _ in segments]
+
+    # Format output with line numbers (cat -n style)
+    result_lines = []
+    for i, (text, (_, truncated, terminated)) in enumerate(
+        zip(texts, segments), start=start_line + 1
+    ):
+        line = text + "\n" if terminated else text
+        # Truncate lines longer than 2000 characters
+        if truncated or len(line) > 2000:
+            line = line[:1997] + "...\n"
+        # cat -n style: right-aligned 6-width line number, tab, then content
+        result_lines.append(f"{i:>6}\t{line.rstrip()}\n")
+    result = "".join(result_lines)
+
+    # Add metadata about truncation
+    lines_shown = len(segments)
+
+    if lines_shown < total_lines:
+        if offset or limit:
+            result += f"\n[Truncated: showing lines {start_line + 1}-{start_line + lines_shown} of {total_lines} total lines]"
+        else:
+            result += f"\n[Truncated: showing first {lines_shown} of {total_lines} total lines]"
+
+    return result.rstrip()
+
+
+def _share_budget(sizes: List[int], budget: int) -> List[int]:
+    """Split budget between outputs: small ones keep their size, large ones share the rest."""
+    caps = list(sizes)
+    remaining = budget
+    order = sorted(range(len(sizes)), key=sizes.__getitem__)
+    for position, idx in enumerate(order):
+        caps[idx] = min(sizes[idx], remaining // (len(order) - position))
+        remaining -= caps[idx]
+    return caps
+
+
+def _decode(raw: bytes, truncated: bool, encoding: str) -> str:
+    """Decode one line, tolerating a character cut in half by the line cap."""
+    try:
+        return raw.decode(encoding)
+    except UnicodeDecodeError as e:
+        if truncated and e.start >= len(raw) - 3:
+            return raw[: e.start].decode(encoding)
+        raise
+
 
 # Create alias for Agency Swarm tool loading (expects class name = file name)
 read = Read
@@ -139,3 +421,14 @@ if __name__ == "__main__":
     print("\n" + "=" * 50 + "\n")
     print("Reading 5 lines starting from line 20:")
     print(tool2.run())
+
+    # Test batch mode
+    tool3 = Read(
+        files=[
+            {"file_path": current_file, "limit": 5},
+            {"file_path": current_file, "offset": -5},
+        ]
+    )
+    print("\n" + "=" * 50 + "\n")
+    print("Reading the first and last 5 lines in one call:")
+    print(tool3.run())
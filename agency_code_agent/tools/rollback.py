@@ -0,0 +1,115 @@
+import os
+import time
+from typing import Optional
+
+from agency_swarm.tools import BaseTool
+from pydantic import Field
+
+from agency_code_agent.tools.utils import get_content_cache, get_journal, invalidate_path
+
+
+class Rollback(BaseTool):
+    """
+    Undoes file changes made by the Write, Edit, MultiEdit, MultiFileEdit and NotebookEdit tools in this session, without needing git.
+
+    Every call to those tools saves the previous contents of the files it changes. This tool restores them.
+
+    Usage:
+    - With no arguments, undoes the most recent file-changing operation.
+    - Set `operations` to undo the last N operations, or `turns` to undo everything changed while handling the last N user messages.
+    - Each file is restored to its contents before the oldest undone operation; files created by those operations are deleted.
+    - If a file was changed afterwards by something else (for example a Bash command), nothing is restored and the files are listed. Set `force` to restore anyway.
+    - Set `show` to list the recorded operations without changing anything.
+    - Changes made through Bash are not recorded and cannot be undone with this tool.
+    """
+
+    operations: Optional[int] = Field(
+        None, ge=1, description="Number of most recent operations to undo (defaults to 1)"
+    )
+    turns: Optional[int] = Field(
+        None,
+        ge=1,
+        description="Undo every operation from the last N user turns instead of a number of operations",
+    )
+    force: bool = Field(
+        False,
+        description="Restore files even if they were modified after the undone operations",
+    )
+    show: bool = Field(
+        False, description="Only list the recorded operations, newest first, without undoing anything"
+    )
+
+    def run(self):
+        try:
+            if self.operations is not None and self.turns is not None:
+                return "Error: Specify either operations or turns, not both"
+
+            journal = get_journal(self.context)
+            if self.show:
+                return self._show(journal.operations())
+
+            selected = journal.select(operations=self.operations, turns=self.turns)
+            if not selected:
+                return "No file changes have been recorded in this session."
+
+            if not self.force:
+                changed = journal.conflicts(selected)
+                if changed:
+                    lines = [
+                        f"Error: Nothing was restored. {len(changed)} files were modified after the operations being undone:"
+                    ]
+                    lines.extend(f"- {path}" for path in changed)
+                    lines.append("Use force=True to restore them anyway and discard those changes.")
+                    return "\n".join(lines)
+
+            results = journal.rollback(selected)
+
+            content_cache = get_content_cache(self.context)
+            for path in results:
+                invalidate_path(path)
+                content_cache.discard(path)
+
+            lines = [f"Rolled back {len(selected)} operations ({len(results)} files):"]
+            lines.extend(f"- {path}: {action}" for path, action in sorted(results.items()))
+            return "\n".join(lines)
+
+        except Exception as e:
+            return f"Error during rollback: {str(e)}"
+
+    def _show(self, operations):
+        if not operations:
+            return "No file changes have been recorded in this session."
+        lines = [f"{len(operations)} recorded operations (newest first):"]
+        for operation in reversed(operations):
+            when = time.strftime("%H:%M:%S", time.localtime(operation["time"]))
+            lines.append(f"#{operation['id']} turn {operation['turn']} {when} {operation['tool']}")
+            for path, change in operation["files"].items():
+                created = " (created)" if change["digest"] is None else ""
+                lines.append(f"    {path}{created}")
+        return "\n".join(lines)
+
+
+# Create alias for Agency Swarm tool loading (expects class name = file name)
+rollback = Rollback
+
+if __name__ == "__main__":
+    import tempfile
+
+    from agency_code_agent.tools.edit import Edit
+    from agency_code_agent.tools.read import Read
+    from agency_code_agent.tools.write import Write
+
+    test_dir = tempfile.mkdtemp()
+    test_file = os.path.join(test_dir, "example.py")
+    print(Write(file_path=test_file, content="value = 1\n").run())
+    Read(file_path=test_file).run()
+    print(Edit(file_path=test_file, old_string="value = 1", new_string="value = 2").run())
+
+    print(Rollback(show=True).run())
+    print(Rollback().run())
+    with open(test_file) as f:
+        print(f"After undoing the edit: {f.read()!r}")
+    print(Rollback().run())
+    print(f"File exists after undoing the write: {os.path.exists(test_file)}")
+
+    os.rmdir(test_dir)
@@ -0,0 +1,85 @@
+# Utils package for agency code agent tools
+
+from . import py_search
+from .checkpoints import BlobStore, CheckpointJournal, checkpoint, get_journal
+from .command_metrics import (
+    MetricsRegistry,
+    ResourceUsage,
+    command_prefix,
+    get_metrics_registry,
+)
+from .content_cache import ContentCache, decode_text, get_content_cache
+from .fs_snapshot import FilesystemSnapshot, get_snapshot, invalidate_all, invalidate_path
+from .git_cache import CachedRepo, GitStatus, get_repo
+from .gitignore import GitignoreRules, IgnoreMatcher, compile_patterns
+from .globbing import compile_glob, expand_braces, literal_prefix, max_depth
+from .jobs import Job, JobManager, get_job_manager, tail_lines
+from .line_index import GzipLineIndex, LineIndex, StreamLineIndex, get_line_index, get_stream_line_index
+from .multi_replace import apply_spans, find_occurrences, non_overlapping
+from .output_buffer import OutputBuffer
+from .process_limits import describe_limit_signal, kill_session, popen_options, session_members, ulimit_script
+from .read_versions import ReadVersions, content_hash, get_read_versions, line_diff
+from .shell_session import CommandQueue, ShellSession, get_shell_session
+from .splice import splice_file
+from .syntax_check import check_files, check_syntax, syntax_report
+from .trigram_index import TrigramIndex, required_trigrams
+
+__all__ = [
+    "py_search",
+    "BlobStore",
+    "CheckpointJournal",
+    "checkpoint",
+    "get_journal",
+    "MetricsRegistry",
+    "ResourceUsage",
+    "command_prefix",
+    "get_metrics_registry",
+    "ContentCache",
+    "decode_text",
+    "get_content_cache",
+    "FilesystemSnapshot",
+    "get_snapshot",
+    "invalidate_all",
+    "invalidate_path",
+    "CachedRepo",
+    "GitStatus",
+    "get_repo",
+    "GitignoreRules",
+    "IgnoreMatcher",
+    "compile_patterns",
+    "compile_glob",
+    "expand_braces",
+    "literal_prefix",
+    "max_depth",
+    "Job",
+    "JobManager",
+    "get_job_manager",
+    "tail_lines",
+    "GzipLineIndex",
+    "LineIndex",
+    "get_line_index",
+    "StreamLineIndex",
+    "get_stream_line_index",
+    "apply_spans",
+    "find_occurrences",
+    "non_overlapping",
+    "OutputBuffer",
+    "describe_limit_signal",
+    "kill_session",
+    "popen_options",
+    "session_members",
+    "ulimit_script",
+    "ReadVersions",
+    "content_hash",
+    "get_read_versions",
+    "line_diff",
+    "CommandQueue",
+    "ShellSession",
+    "get_shell_session",
+    "splice_file",
+    "check_files",
+    "check_syntax",
+    "syntax_report",
+    "TrigramIndex",
+    "required_trigrams",
+]
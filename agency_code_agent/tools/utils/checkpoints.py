@@ -0,0 +1,310 @@
+"""
+Content-addressed checkpoints of files changed by the editing tools.
+
+Before a tool overwrites a file, its previous contents (the pre-image) are
+stored in a blob store under CACHE_DIR, named by their SHA-256 digest, so
+identical versions are stored once. Tools that swap in a new inode with
+os.replace let the store hardlink the old inode instead of copying it, unless
+the inode has other links; tools that rewrite a file in place need a copy, made
+in the same pass as the hash.
+
+Each agent session keeps a journal of operations (one per tool call) that maps
+every touched file to its pre-image. Rolling back the last N operations or
+whole turns restores, for each file, the oldest pre-image in that range, so
+the cost depends on the number of files, not on how many edits are undone.
+"""
+
+import hashlib
+import os
+import shutil
+import stat
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional
+
+from .trigram_index import CACHE_DIR
+
+# Constants
+BLOB_DIR = os.path.join(CACHE_DIR, "checkpoints", "blobs")
+HASH_CHUNK_SIZE = 1024 * 1024
+BLOB_MAX_AGE_SECONDS = 7 * 24 * 3600  # Blobs unused for longer are pruned
+MAX_JOURNAL_ENTRIES = 1000
+CONTEXT_KEY = "checkpoints"
+TURN_KEY = "user_turn"  # Incremented by the system hook on every user message
+
+_prune_lock = threading.Lock()
+_pruned = False
+
+
+class BlobStore:
+    """Files stored under their SHA-256 digest, sharded by the first two hex digits."""
+
+    def __init__(self, root: str = BLOB_DIR):
+        self.root = root
+
+    def path(self, digest: str) -> str:
+        return os.path.join(self.root, digest[:2], digest[2:])
+
+    def put(self, path: str, link: bool = False) -> str:
+        """Store the current contents of path and return their digest.
+
+        With link=True the caller promises to replace path with a new inode,
+        so the old one can be kept by hardlinking instead of copying.
+        """
+        _prune_once(self.root)
+        os.makedirs(self.root, exist_ok=True)
+        digest = hashlib.sha256()
+        fd, temp_path = tempfile.mkstemp(dir=self.root, prefix=".blob.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as out, open(path, "rb") as source:
+                # Other hardlinks to the inode would keep writing into the blob
+                link = link and os.fstat(source.fileno()).st_nlink == 1
+                # Hash (and, unless linking, copy) in a single pass over the file
+                for chunk in iter(lambda: source.read(HASH_CHUNK_SIZE), b""):
+                    digest.update(chunk)
+                    if not link:
+                        out.write(chunk)
+            blob_path = self.path(digest.hexdigest())
+            # A blob that is still the live file (see unshare) is replaced by the copy
+            shared = os.path.exists(blob_path) and os.path.samefile(blob_path, path)
+            if os.path.exists(blob_path) and not shared:
+                # Already stored; refresh it so pruning keeps it
+                os.utime(blob_path)
+                return digest.hexdigest()
+            os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+            if link:
+                os.unlink(temp_path)
+                try:
+                    os.link(path, temp_path)
+                except OSError:
+                    # Another filesystem, or links unsupported
+                    shutil.copyfile(path, temp_path)
+            os.replace(temp_path, blob_path)
+            return digest.hexdigest()
+        finally:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+
+    def unshare(self, digest: str, path: str):
+        """Replace the blob with a private copy if it is still the inode of path.
+
+        A hardlinked pre-image whose write never happened is still the live
+        file, which may later be rewritten in place. The blob is copied rather
+        than removed, since other journals may refer to the same digest.
+        """
+        blob_path = self.path(digest)
+        try:
+            if not os.path.samefile(blob_path, path):
+                return
+        except OSError:
+            return
+        fd, temp_path = tempfile.mkstemp(dir=self.root, prefix=".blob.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as out, open(blob_path, "rb") as blob:
+                shutil.copyfileobj(blob, out, HASH_CHUNK_SIZE)
+            os.replace(temp_path, blob_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+
+    def restore(self, digest: str, path: str, mode: int):
+        """Atomically replace path with a copy of the blob (never a link to it)."""
+        fd, temp_path = tempfile.mkstemp(
+            dir=os.path.dirname(path), prefix=f".{os.path.basename(path)}.", suffix=".tmp"
+        )
+        try:
+            with os.fdopen(fd, "wb") as out, open(self.path(digest), "rb") as blob:
+                shutil.copyfileobj(blob, out, HASH_CHUNK_SIZE)
+            os.chmod(temp_path, stat.S_IMODE(mode))
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            raise
+
+
+def _prune_once(root: str):
+    """Remove blobs older than BLOB_MAX_AGE_SECONDS, once per process.
+
+    Ages come from st_ctime, which link() and utime() both bump, so a blob
+    hardlinked from an old file still counts as new.
+    """
+    global _pruned
+    with _prune_lock:
+        if _pruned:
+            return
+        _pruned = True
+    cutoff = time.time() - BLOB_MAX_AGE_SECONDS
+    try:
+        shards = os.scandir(root)
+    except OSError:
+        return
+    with shards:
+        for shard in shards:
+            if not shard.is_dir(follow_symlinks=False):
+                continue
+            try:
+                for blob in os.scandir(shard.path):
+                    if blob.stat(follow_symlinks=False).st_ctime < cutoff:
+                        os.unlink(blob.path)
+            except OSError:
+                continue
+
+
+class CheckpointJournal:
+    """The checkpoints taken during one agent session, oldest first.
+
+    Each operation is a dict with an id, the tool name, the user turn, a
+    timestamp and a "files" dict mapping a real path to its pre-image
+    (digest, or None if the file did not exist; mode) and the (mtime_ns,
+    size) the tool left behind, used to notice later changes by others.
+    """
+
+    def __init__(self, store: Optional[BlobStore] = None):
+        self.store = store or BlobStore()
+        self._lock = threading.Lock()
+        self._operations: List[dict] = []
+        self._next_id = 1
+
+    def record(self, tool: str, paths: Iterable[str], turn: int = 0, link: bool = False) -> dict:
+        """Store the pre-images of paths and append an operation for them."""
+        files: Dict[str, dict] = {}
+        for path in paths:
+            real_path = os.path.realpath(path)
+            if real_path in files:
+                continue
+            try:
+                st = os.stat(real_path)
+            except FileNotFoundError:
+                files[real_path] = {"digest": None, "mode": None, "after": None}
+                continue
+            files[real_path] = {
+                "digest": self.store.put(real_path, link=link),
+                "mode": st.st_mode,
+                "after": None,
+            }
+        with self._lock:
+            operation = {
+                "id": self._next_id,
+                "tool": tool,
+                "turn": turn,
+                "time": time.time(),
+                "files": files,
+            }
+            self._next_id += 1
+            self._operations.append(operation)
+            del self._operations[:-MAX_JOURNAL_ENTRIES]
+        return operation
+
+    def finish(self, operation: dict):
+        """Note the state each file was left in once the tool has written it."""
+        for path, change in operation["files"].items():
+            try:
+                st = os.stat(path)
+                change["after"] = (st.st_mtime_ns, st.st_size)
+            except FileNotFoundError:
+                change["after"] = None
+
+    def discard(self, operation: dict):
+        """Forget an operation whose write never happened."""
+        with self._lock:
+            if operation in self._operations:
+                self._operations.remove(operation)
+        for path, change in operation["files"].items():
+            if change["digest"] is not None:
+                self.store.unshare(change["digest"], path)
+
+    def operations(self) -> List[dict]:
+        with self._lock:
+            return list(self._operations)
+
+    def select(self, operations: Optional[int] = None, turns: Optional[int] = None) -> List[dict]:
+        """The last `operations` operations, or every operation of the last `turns` turns."""
+        with self._lock:
+            if turns is not None:
+                recent_turns = sorted({op["turn"] for op in self._operations})[-turns:]
+                return [op for op in self._operations if op["turn"] in recent_turns]
+            return self._operations[-(operations or 1) :]
+
+    def conflicts(self, selected: List[dict]) -> List[str]:
+        """Files changed by someone else since the newest selected operation wrote them."""
+        newest = {}
+        for operation in selected:
+            for path, change in operation["files"].items():
+                newest[path] = change["after"]
+        changed = []
+        for path, after in newest.items():
+            try:
+                st = os.stat(path)
+                current = (st.st_mtime_ns, st.st_size)
+            except FileNotFoundError:
+                current = None
+            if current != after:
+                changed.append(path)
+        return changed
+
+    def rollback(self, selected: List[dict]) -> Dict[str, str]:
+        """Restore every file to its state before the oldest selected operation.
+
+        Returns a map of path to "restored", "deleted" or "unchanged", and
+        drops the selected operations from the journal.
+        """
+        oldest: Dict[str, dict] = {}
+        for operation in reversed(selected):
+            oldest.update(operation["files"])
+
+        results = {}
+        for path, change in oldest.items():
+            if change["digest"] is None:
+                if os.path.lexists(path):
+                    os.unlink(path)
+                    results[path] = "deleted"
+                else:
+                    results[path] = "unchanged"
+            else:
+                self.store.restore(change["digest"], path, change["mode"])
+                results[path] = "restored"
+
+        with self._lock:
+            ids = {op["id"] for op in selected}
+            self._operations = [op for op in self._operations if op["id"] not in ids]
+            remaining = list(self._operations)
+        # The restored files now hold what earlier operations left behind
+        for operation in remaining:
+            touched = {path: change for path, change in operation["files"].items() if path in results}
+            if touched:
+                self.finish({"files": touched})
+        return results
+
+
+_global_journal = CheckpointJournal()
+
+
+def get_journal(context=None) -> CheckpointJournal:
+    """Return the journal for the agent session in context (or the global fallback)."""
+    if context is None:
+        return _global_journal
+    journal = context.get(CONTEXT_KEY, None)
+    if journal is None:
+        journal = CheckpointJournal()
+        context.set(CONTEXT_KEY, journal)
+    return journal
+
+
+@contextmanager
+def checkpoint(context, tool: str, paths: Iterable[str], link: bool = False):
+    """Record the pre-images of paths around a write; dropped if the write raises.
+
+    Pass link=True only when the write replaces the files with new inodes.
+    """
+    turn = context.get(TURN_KEY, 0) if context is not None else 0
+    journal = get_journal(context)
+    operation = journal.record(tool, paths, turn=turn, link=link)
+    try:
+        yield operation
+    except BaseException:
+        journal.discard(operation)
+        raise
+    journal.finish(operation)
@@ -0,0 +1,259 @@
+"""
+Resource accounting for commands run by the Bash tool.
+
+Every command yields a ResourceUsage: wall time, user and system CPU time,
+peak resident set size and bytes of output. Background jobs are reaped with
+os.wait4, so their numbers are the kernel's rusage for the job and every
+descendant it waited for. Commands in the persistent shell are children of
+the shell rather than of this process, so the shell reports its children's
+CPU time with the `times` builtin after each command and the difference is
+taken, and the peak RSS is sampled from /proc (VmHWM of each process in the
+shell's session) while the command runs; processes that live shorter than
+the sampling interval may be missed.
+
+Usages are recorded in a process-wide MetricsRegistry as histograms per
+agent session and per command prefix (e.g. "git status", "pytest"), which
+can be read with snapshot() or exported in the Prometheus text format.
+"""
+
+import bisect
+import os
+import re
+import shlex
+import sys
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Constants
+# Tools whose first argument names what they do, e.g. "git status"
+SUBCOMMAND_TOOLS = set("apt apt-get brew cargo docker git go kubectl make npm pip pip3 pnpm poetry uv yarn".split())
+PREFIX_SKIP = {"sudo", "env", "time", "nohup", "exec", "command"}
+COMMAND_SEPARATORS = {"&&", "||", ";", "|", "&"}
+MAX_LABEL_VALUES = 500  # Further sessions or prefixes are counted under "other"
+
+HISTOGRAM_BUCKETS = {
+    "wall_seconds": (0.1, 0.5, 1, 5, 10, 30, 60, 120, 300, 600),
+    "cpu_seconds": (0.1, 0.5, 1, 5, 10, 30, 60, 120, 300, 600),
+    "max_rss_bytes": tuple(2**20 * mb for mb in (16, 64, 256, 1024, 4096, 16384)),
+    "output_bytes": tuple(10**n for n in (3, 4, 5, 6, 7, 8)),
+}
+
+_TIMES_RE = re.compile(r"(\d+)m([\d.]+)s")
+
+
+def _format_bytes(count: float) -> str:
+    if count < 1024:
+        return f"{count:.0f} B"
+    for unit in ("KB", "MB", "GB"):
+        count /= 1024
+        if count < 1024 or unit == "GB":
+            return f"{count:.1f} {unit}"
+
+
+class ResourceUsage:
+    """What one command cost; fields the platform cannot measure are None."""
+
+    def __init__(
+        self,
+        wall: float,
+        user: Optional[float] = None,
+        system: Optional[float] = None,
+        max_rss_bytes: Optional[int] = None,
+        output_bytes: int = 0,
+    ):
+        self.wall = wall
+        self.user = user
+        self.system = system
+        self.max_rss_bytes = max_rss_bytes
+        self.output_bytes = output_bytes
+
+    @property
+    def cpu(self) -> Optional[float]:
+        if self.user is None or self.system is None:
+            return None
+        return self.user + self.system
+
+    def summary(self) -> str:
+        parts = [f"wall {self.wall:.2f}s"]
+        if self.cpu is not None:
+            parts.append(f"cpu {self.user:.2f}s user + {self.system:.2f}s sys")
+        if self.max_rss_bytes:
+            parts.append(f"max RSS {_format_bytes(self.max_rss_bytes)}")
+        parts.append(f"output {_format_bytes(self.output_bytes)}")
+        return ", ".join(parts)
+
+    def values(self) -> Dict[str, float]:
+        """Histogram name -> observed value, for the fields that were measured."""
+        values = {"wall_seconds": self.wall, "output_bytes": self.output_bytes}
+        if self.cpu is not None:
+            values["cpu_seconds"] = self.cpu
+        if self.max_rss_bytes:
+            values["max_rss_bytes"] = self.max_rss_bytes
+        return values
+
+
+def usage_from_rusage(wall: float, rusage, output_bytes: int) -> ResourceUsage:
+    """ResourceUsage from an os.wait4 rusage (None when it was not available)."""
+    if rusage is None:
+        return ResourceUsage(wall, output_bytes=output_bytes)
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    return ResourceUsage(wall, rusage.ru_utime, rusage.ru_stime, rusage.ru_maxrss * scale, output_bytes)
+
+
+def parse_times(text: str) -> Optional[Tuple[float, float]]:
+    """Children's (user, sys) seconds from the output of bash's `times` builtin."""
+    lines = text.strip().splitlines()
+    if len(lines) < 2:
+        return None
+    values = [int(minutes) * 60 + float(seconds) for minutes, seconds in _TIMES_RE.findall(lines[1])]
+    if len(values) != 2:
+        return None
+    return values[0], values[1]
+
+
+def peak_rss_bytes(pids: Sequence[int]) -> Optional[int]:
+    """Largest VmHWM (peak resident set size) among pids, from /proc; None if unknown."""
+    peak = None
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/status", "rb") as status:
+                for line in status:
+                    if line.startswith(b"VmHWM:"):
+                        value = int(line.split()[1]) * 1024
+                        peak = value if peak is None else max(peak, value)
+                        break
+        except (OSError, ValueError, IndexError):
+            continue
+    return peak
+
+
+def command_prefix(command: str) -> str:
+    """Short label for a command: its program, plus the subcommand for tools like git."""
+    first_line = command.strip().splitlines()[0] if command.strip() else ""
+    try:
+        tokens = shlex.split(first_line, comments=True)
+    except ValueError:
+        tokens = first_line.split()
+
+    # Split into simple commands and skip leading `cd dir &&`
+    segments: List[List[str]] = [[]]
+    for token in tokens:
+        if token in COMMAND_SEPARATORS:
+            segments.append([])
+        else:
+            segments[-1].append(token)
+    segments = [segment for segment in segments if segment]
+    while len(segments) > 1 and segments[0][0] in ("cd", "pushd", "source", "."):
+        segments.pop(0)
+    words = segments[0] if segments else []
+    while words and ("=" in words[0] and not words[0].startswith("=") or words[0] in PREFIX_SKIP):
+        words = words[1:]
+    if not words:
+        return "(empty)"
+
+    program = os.path.basename(words[0])
+    rest = words[1:]
+    if re.fullmatch(r"python[\d.]*", program) and len(rest) >= 2 and rest[0] == "-m":
+        return f"{program} -m {rest[1]}"
+    if program in SUBCOMMAND_TOOLS and rest and not rest[0].startswith("-"):
+        return f"{program} {rest[0]}"
+    return program
+
+
+class Histogram:
+    """Counts of observations per bucket (upper bounds), with their sum and count."""
+
+    def __init__(self, bounds: Sequence[float]):
+        self.bounds = tuple(bounds)
+        self.buckets = [0] * (len(self.bounds) + 1)  # The last one is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.buckets[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def snapshot(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "buckets": dict(zip([*map(str, self.bounds), "+Inf"], self.buckets)),
+        }
+
+
+class MetricsRegistry:
+    """Histograms of command usage by agent session and by command prefix."""
+
+    LABELS = ("session", "prefix")
+
+    def __init__(self, max_label_values: int = MAX_LABEL_VALUES):
+        self.max_label_values = max_label_values
+        self._lock = threading.Lock()
+        # (label, label value) -> histogram name -> Histogram
+        self._histograms: Dict[Tuple[str, str], Dict[str, Histogram]] = {}
+        self._label_counts = {label: 0 for label in self.LABELS}
+
+    def _series(self, label: str, value: str) -> Dict[str, Histogram]:
+        key = (label, value)
+        if key not in self._histograms:
+            if self._label_counts[label] >= self.max_label_values:
+                key = (label, "other")
+            if key not in self._histograms:
+                self._label_counts[label] += 1
+                self._histograms[key] = {
+                    name: Histogram(bounds) for name, bounds in HISTOGRAM_BUCKETS.items()
+                }
+        return self._histograms[key]
+
+    def observe(self, session_id: str, command: str, usage: ResourceUsage):
+        values = usage.values()
+        prefix = command_prefix(command)
+        with self._lock:
+            for label, label_value in (("session", session_id), ("prefix", prefix)):
+                series = self._series(label, label_value)
+                for name, value in values.items():
+                    series[name].observe(value)
+
+    def snapshot(self) -> dict:
+        """{"session": {id: {histogram: {...}}}, "prefix": {prefix: {...}}}"""
+        with self._lock:
+            result: dict = {label: {} for label in self.LABELS}
+            for (label, value), series in self._histograms.items():
+                result[label][value] = {name: histogram.snapshot() for name, histogram in series.items()}
+            return result
+
+    def prometheus_text(self, namespace: str = "agency_code_bash") -> str:
+        """All histograms in the Prometheus text exposition format."""
+        lines: List[str] = []
+        with self._lock:
+            for label in self.LABELS:
+                for name in HISTOGRAM_BUCKETS:
+                    metric = f"{namespace}_{name}_by_{label}"
+                    lines.append(f"# TYPE {metric} histogram")
+                    for (series_label, value), series in sorted(self._histograms.items()):
+                        if series_label != label:
+                            continue
+                        histogram = series[name]
+                        escaped = value.replace("\\", "\\\\").replace('"', '\\"')
+                        cumulative = 0
+                        for bound, bucket in zip([*map(str, histogram.bounds), "+Inf"], histogram.buckets):
+                            cumulative += bucket
+                            lines.append(f'{metric}_bucket{{{label}="{escaped}",le="{bound}"}} {cumulative}')
+                        lines.append(f'{metric}_sum{{{label}="{escaped}"}} {histogram.sum}')
+                        lines.append(f'{metric}_count{{{label}="{escaped}"}} {histogram.count}')
+        return "\n".join(lines) + "\n"
+
+
+_registry: Optional[MetricsRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_metrics_registry() -> MetricsRegistry:
+    """Return the process-wide registry shared by all agent sessions."""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = MetricsRegistry()
+    return _registry
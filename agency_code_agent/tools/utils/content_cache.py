@@ -0,0 +1,119 @@
+"""
+Session-scoped cache of decoded file contents shared by Read, Edit, MultiEdit and Write.
+
+Entries are keyed by absolute path and validated against the file's
+(inode, mtime_ns, size) on every lookup, so a file changed behind the agent's
+back is simply re-read. A file modified within RACY_WINDOW_NS of being cached
+is not cached, since a second write of the same size in the same timestamp
+tick would leave the key unchanged. Text is stored the way Edit sees it (UTF-8 with
+universal newlines). The cache is an LRU bounded by the total size of the
+cached files.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+# Constants
+MAX_CACHE_BYTES = 64 * 1024 * 1024
+MAX_ENTRY_BYTES = 8 * 1024 * 1024  # Larger files are never cached
+RACY_WINDOW_NS = 2_000_000_000  # Coarser than the mtime granularity of common filesystems
+
+CONTEXT_KEY = "file_contents"
+
+
+def _key(st: os.stat_result) -> Tuple[int, int, int, int]:
+    return (st.st_dev, st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+def decode_text(data: bytes) -> str:
+    """Decode file bytes like open(path, "r", encoding="utf-8").read() does."""
+    return data.decode("utf-8").replace("\r\n", "\n").replace("\r", "\n")
+
+
+class ContentCache:
+    """LRU of decoded file contents, evicted by total file size."""
+
+    def __init__(self, max_bytes: int = MAX_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._lock = threading.Lock()
+        # abs path -> (stat key, text)
+        self._entries: "OrderedDict[str, Tuple[tuple, str]]" = OrderedDict()
+
+    def get(self, path: str, st: Optional[os.stat_result] = None) -> Optional[str]:
+        """Return the cached text if the file on disk is unchanged."""
+        path = os.path.abspath(path)
+        if st is None:
+            try:
+                st = os.stat(path)
+            except OSError:
+                return None
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is None or entry[0] != _key(st):
+                return None
+            self._entries.move_to_end(path)
+            return entry[1]
+
+    def put(self, path: str, st: os.stat_result, text: str):
+        """Store text for the version of path described by st."""
+        path = os.path.abspath(path)
+        if st.st_size > min(MAX_ENTRY_BYTES, self.max_bytes) or time.time_ns() - st.st_mtime_ns < RACY_WINDOW_NS:
+            self.discard(path)
+            return
+        with self._lock:
+            old = self._entries.pop(path, None)
+            if old is not None:
+                self.total_bytes -= old[0][3]
+            self._entries[path] = (_key(st), text)
+            self.total_bytes += st.st_size
+            while self.total_bytes > self.max_bytes:
+                _, (key, _) = self._entries.popitem(last=False)
+                self.total_bytes -= key[3]
+
+    def discard(self, path: str):
+        path = os.path.abspath(path)
+        with self._lock:
+            old = self._entries.pop(path, None)
+            if old is not None:
+                self.total_bytes -= old[0][3]
+
+    def read_text(self, path: str) -> str:
+        """Return the file's text from the cache, reading and caching it on a miss.
+
+        Raises OSError and UnicodeDecodeError like reading the file would.
+        """
+        with open(path, "rb") as f:
+            st = os.fstat(f.fileno())
+            text = self.get(path, st)
+            if text is not None:
+                return text
+            text = decode_text(f.read())
+        self.put(path, st, text)
+        return text
+
+    def update(self, path: str, text: str):
+        """Record text just written to path by one of the tools."""
+        try:
+            st = os.stat(path)
+        except OSError:
+            self.discard(path)
+            return
+        self.put(path, st, text.replace("\r\n", "\n").replace("\r", "\n"))
+
+
+_global_cache = ContentCache()
+
+
+def get_content_cache(context=None) -> ContentCache:
+    """Return the cache for the agent session in context (or the global fallback)."""
+    if context is None:
+        return _global_cache
+    cache = context.get(CONTEXT_KEY, None)
+    if cache is None:
+        cache = ContentCache()
+        context.set(CONTEXT_KEY, cache)
+    return cache
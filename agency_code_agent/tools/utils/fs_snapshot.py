@@ -0,0 +1,120 @@
+"""
+Session-scoped filesystem snapshot shared by the LS, Glob and Grep tools.
+
+Directory listings are cached as os.DirEntry objects, so repeated
+exploration of the same tree costs one stat of each directory involved (to
+re-check its mtime) instead of a full re-scan. Only the listing is cached:
+a file edited in place leaves its directory's mtime alone, so file sizes and
+mtimes are always read with a fresh stat (see stat), never from the stat
+results a DirEntry keeps.
+Listings are dropped precisely by the file-mutating tools (Write, Edit,
+MultiEdit, NotebookEdit) through invalidate_path, and wholesale after Bash
+commands, which may change anything.
+"""
+
+import os
+import threading
+import weakref
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+# Constants
+MAX_CACHED_DIRS = 50000
+
+CONTEXT_KEY = "fs_snapshot"
+
+_snapshots: "weakref.WeakSet[FilesystemSnapshot]" = weakref.WeakSet()
+_snapshots_lock = threading.Lock()
+
+
+class FilesystemSnapshot:
+    """Cache of directory listings with stat data, re-validated by directory mtime."""
+
+    def __init__(self, max_dirs: int = MAX_CACHED_DIRS):
+        self.max_dirs = max_dirs
+        self._lock = threading.Lock()
+        # abs dir -> (mtime_ns, entries, entries by name)
+        self._dirs: "OrderedDict[str, Tuple[int, List[os.DirEntry], Dict[str, os.DirEntry]]]" = (
+            OrderedDict()
+        )
+        with _snapshots_lock:
+            _snapshots.add(self)
+
+    def _listing(self, path: str):
+        path = os.path.abspath(path)
+        mtime_ns = os.stat(path).st_mtime_ns
+        with self._lock:
+            cached = self._dirs.get(path)
+            if cached is not None and cached[0] == mtime_ns:
+                self._dirs.move_to_end(path)
+                return cached
+
+        with os.scandir(path) as it:
+            entries = list(it)
+        listing = (mtime_ns, entries, {entry.name: entry for entry in entries})
+        with self._lock:
+            self._dirs[path] = listing
+            self._dirs.move_to_end(path)
+            while len(self._dirs) > self.max_dirs:
+                self._dirs.popitem(last=False)
+        return listing
+
+    def scandir(self, path: str) -> List[os.DirEntry]:
+        """Entries of a directory, like list(os.scandir(path)) but cached."""
+        return self._listing(path)[1]
+
+    def entry(self, path: str) -> Optional[os.DirEntry]:
+        """The cached DirEntry for a path, or None if its parent has no such entry."""
+        path = os.path.abspath(path)
+        parent, name = os.path.split(path)
+        if not name:
+            return None
+        try:
+            return self._listing(parent)[2].get(name)
+        except OSError:
+            return None
+
+    def stat(self, path: str, follow_symlinks: bool = True) -> os.stat_result:
+        """Fresh stat() of a path; listings are cached, file metadata is not."""
+        return os.stat(path, follow_symlinks=follow_symlinks)
+
+    def invalidate(self, path: str):
+        """Forget the listing of path (if a directory) and of its parent."""
+        path = os.path.abspath(path)
+        with self._lock:
+            self._dirs.pop(path, None)
+            self._dirs.pop(os.path.dirname(path), None)
+
+    def clear(self):
+        with self._lock:
+            self._dirs.clear()
+
+
+_global_snapshot = FilesystemSnapshot()
+
+
+def get_snapshot(context=None) -> FilesystemSnapshot:
+    """Return the snapshot for the agent session in context (or the global fallback)."""
+    if context is None:
+        return _global_snapshot
+    snapshot = context.get(CONTEXT_KEY, None)
+    if snapshot is None:
+        snapshot = FilesystemSnapshot()
+        context.set(CONTEXT_KEY, snapshot)
+    return snapshot
+
+
+def invalidate_path(path: str):
+    """Drop cached data about path from every live snapshot (called after writes)."""
+    with _snapshots_lock:
+        snapshots = list(_snapshots)
+    for snapshot in snapshots:
+        snapshot.invalidate(path)
+
+
+def invalidate_all():
+    """Drop every cached listing, e.g. after an arbitrary shell command."""
+    with _snapshots_lock:
+        snapshots = list(_snapshots)
+    for snapshot in snapshots:
+        snapshot.clear()
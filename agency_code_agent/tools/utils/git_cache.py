@@ -0,0 +1,314 @@
+"""
+Cached repository handles and working-tree hashes for the Git tool.
+
+Repositories are opened once per working directory and reused for as long as
+their control directory is the same one (a re-initialised or deleted .git is
+reopened). Each cached repository also keeps the parsed index, reloaded only
+when the index file's stat changes, the staged changes computed from it and
+a stat cache of working-tree blob
+ids keyed by (mtime_ns, size, inode, mode). A status or diff only reads and
+hashes files whose stat differs from both the index entry and the last hash
+we computed, so repeated calls on a large tree cost one lstat per tracked
+file. Files modified within RACY_WINDOW_NS of being hashed are not cached,
+since a second write in the same timestamp tick would go unnoticed.
+
+The index is never written; the Git tool is read-only. dulwich is imported
+lazily so that the other tools work without it.
+"""
+
+import os
+import stat
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# Constants
+MAX_CACHED_REPOS = 16
+RACY_WINDOW_NS = 2_000_000_000
+
+
+def _stat_key(st: os.stat_result) -> Tuple[int, int, int, int]:
+    return (st.st_mtime_ns, st.st_size, st.st_ino, st.st_mode)
+
+
+def _entry_mtime_ns(entry) -> Optional[int]:
+    mtime = entry.mtime
+    if isinstance(mtime, tuple):
+        return mtime[0] * 1_000_000_000 + mtime[1]
+    try:
+        return int(mtime * 1_000_000_000)
+    except TypeError:
+        return None
+
+
+class GitStatus:
+    """Staged changes by kind ("add", "delete", "modify"), unstaged and untracked paths."""
+
+    def __init__(self, staged: Dict[str, List[bytes]], unstaged: List[bytes], untracked: List[str]):
+        self.staged = staged
+        self.unstaged = unstaged
+        self.untracked = untracked
+
+
+class CachedRepo:
+    """A dulwich Repo plus the index and working-tree hashes computed for it."""
+
+    def __init__(self, path: str):
+        from dulwich.repo import Repo
+
+        self.repo = Repo(path)
+        self.root = os.fsencode(self.repo.path)
+        self._control_ino = os.stat(self.repo.controldir()).st_ino
+        self._lock = threading.RLock()
+        self._index = None
+        self._index_key: Optional[tuple] = None
+        # tree path -> (stat key, blob id) of the working-tree file
+        self._hashes: Dict[bytes, Tuple[tuple, bytes]] = {}
+        # (index stat key, tree id) -> staged changes, for the last comparison made
+        self._staged: Optional[Tuple[tuple, Dict[str, List[bytes]]]] = None
+
+    def valid(self) -> bool:
+        try:
+            return os.stat(self.repo.controldir()).st_ino == self._control_ino
+        except OSError:
+            return False
+
+    def index(self):
+        """The parsed index, reloaded only when the index file changed."""
+        with self._lock:
+            try:
+                key = _stat_key(os.stat(self.repo.index_path()))
+            except OSError:
+                key = None
+            if self._index is None or key != self._index_key:
+                self._index = self.repo.open_index()
+                self._index_key = key
+            return self._index
+
+    def _fs_path(self, tree_path: bytes) -> bytes:
+        return os.path.join(self.root, tree_path.replace(b"/", os.fsencode(os.sep)))
+
+    def _normalizer(self):
+        try:
+            return self.repo.get_blob_normalizer()
+        except Exception:
+            return None
+
+    def worktree_blob(self, tree_path: bytes, st: os.stat_result, normalizer=None):
+        """The file at tree_path as a Blob, normalized like `git add` would."""
+        from dulwich.index import blob_from_path_and_stat
+
+        blob = blob_from_path_and_stat(self._fs_path(tree_path), st)
+        if normalizer is not None:
+            blob = normalizer.checkin_normalize(blob, tree_path)
+        return blob
+
+    def worktree_sha(self, tree_path: bytes, st: os.stat_result, normalizer=None) -> bytes:
+        """Blob id of the working-tree file, hashing it only if its stat changed."""
+        key = _stat_key(st)
+        cached = self._hashes.get(tree_path)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        sha = self.worktree_blob(tree_path, st, normalizer).id
+        if time.time_ns() - st.st_mtime_ns > RACY_WINDOW_NS:
+            self._hashes[tree_path] = (key, sha)
+        else:
+            self._hashes.pop(tree_path, None)
+        return sha
+
+    def _unchanged_since_index(self, entry, st: os.stat_result) -> bool:
+        """True when the file's stat is what the index recorded when it was last written."""
+        if self._index_key is None or entry.size != st.st_size & 0xFFFFFFFF:
+            return False
+        if entry.ino and entry.ino != st.st_ino & 0xFFFFFFFF:
+            return False
+        # A file written in the same tick as the index may have changed after it
+        return _entry_mtime_ns(entry) == st.st_mtime_ns and st.st_mtime_ns < self._index_key[0]
+
+    def unstaged_changes(self) -> List[bytes]:
+        """Tracked paths whose working-tree content differs from the index."""
+        from dulwich.objects import S_ISGITLINK
+
+        with self._lock:
+            index = self.index()
+            normalizer = self._normalizer()
+            changed = []
+            seen = set()
+            for tree_path, entry in index.iteritems():
+                seen.add(tree_path)
+                sha = getattr(entry, "sha", None)
+                if sha is None:  # Merge conflict
+                    changed.append(tree_path)
+                    continue
+                try:
+                    st = os.lstat(self._fs_path(tree_path))
+                except FileNotFoundError:
+                    changed.append(tree_path)
+                    continue
+                except OSError:
+                    continue
+                if S_ISGITLINK(entry.mode) or stat.S_ISDIR(st.st_mode):
+                    continue
+                if not (stat.S_ISREG(st.st_mode) or stat.S_ISLNK(st.st_mode)):
+                    continue
+                if self._unchanged_since_index(entry, st):
+                    continue
+                if self.worktree_sha(tree_path, st, normalizer) != sha:
+                    changed.append(tree_path)
+            # Forget files that are no longer tracked
+            for tree_path in [path for path in self._hashes if path not in seen]:
+                del self._hashes[tree_path]
+            return changed
+
+    def _tree_id(self, ref: bytes) -> Optional[bytes]:
+        """Tree of the commit ref names; None for HEAD in a repository without commits."""
+        from dulwich.objectspec import parse_commit
+
+        try:
+            return parse_commit(self.repo, ref).tree
+        except KeyError:
+            if ref == b"HEAD":
+                return None
+            raise
+
+    def staged_changes(self, ref: bytes = b"HEAD") -> Dict[str, List[bytes]]:
+        """Index changes against ref's tree, as add/delete/modify path lists."""
+        with self._lock:
+            tree_id = self._tree_id(ref)
+            index = self.index()
+            key = (self._index_key, tree_id)
+            if self._staged is not None and self._staged[0] == key and key[0] is not None:
+                return {kind: list(paths) for kind, paths in self._staged[1].items()}
+            changes: Dict[str, List[bytes]] = {"add": [], "delete": [], "modify": []}
+            for (old_path, new_path), _, _ in index.changes_from_tree(self.repo.object_store, tree_id):
+                if old_path is None:
+                    changes["add"].append(new_path)
+                elif new_path is None:
+                    changes["delete"].append(old_path)
+                else:
+                    changes["modify"].append(new_path)
+            self._staged = (key, changes)
+            return {kind: list(paths) for kind, paths in changes.items()}
+
+    def untracked(self) -> List[str]:
+        """Untracked, non-ignored paths; wholly untracked directories are listed as "dir/".
+
+        Matches dulwich's untracked_files="normal" without resolving every path.
+        """
+        from dulwich.ignore import IgnoreFilterManager
+
+        index = self.index()
+        tracked = set(index)
+        tracked_dirs = {b""}
+        for tree_path in tracked:
+            parts = tree_path.split(b"/")[:-1]
+            for depth in range(1, len(parts) + 1):
+                tracked_dirs.add(b"/".join(parts[:depth]))
+        ignores = IgnoreFilterManager.from_repo(self.repo)
+
+        def has_unignored_files(path: str, rel: str) -> bool:
+            try:
+                entries = list(os.scandir(path))
+            except OSError:
+                return True
+            for entry in entries:
+                entry_rel = os.path.join(rel, entry.name)
+                if entry.is_dir(follow_symlinks=False):
+                    if has_unignored_files(entry.path, entry_rel):
+                        return True
+                elif ignores.is_ignored(entry_rel) is not True:
+                    return True
+            return False
+
+        untracked: List[str] = []
+        pending = [("", self.repo.path)]
+        while pending:
+            rel_dir, path = pending.pop()
+            try:
+                entries = list(os.scandir(path))
+            except OSError:
+                continue
+            for entry in entries:
+                rel = os.path.join(rel_dir, entry.name)
+                tree_path = os.fsencode(rel).replace(os.fsencode(os.sep), b"/")
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name == ".git" or ignores.is_ignored(os.path.join(rel, "")):
+                        continue
+                    if tree_path in tracked_dirs:
+                        pending.append((rel, entry.path))
+                    elif has_unignored_files(entry.path, rel):
+                        untracked.append(os.path.join(rel, ""))
+                elif tree_path not in tracked and not ignores.is_ignored(rel):
+                    untracked.append(rel)
+        return untracked
+
+    def status(self) -> GitStatus:
+        with self._lock:
+            return GitStatus(self.staged_changes(), self.unstaged_changes(), self.untracked())
+
+    def diff(self, ref: bytes = b"HEAD") -> Iterator[Tuple[bytes, tuple, tuple]]:
+        """Yield (path, (mode, blob) in ref, (mode, blob) in the working tree) per changed file.
+
+        Like `git diff <ref>`: tracked files only, a missing side is (None, None).
+        """
+        from dulwich.index import cleanup_mode
+        from dulwich.object_store import tree_lookup_path
+        from dulwich.objects import S_ISGITLINK
+
+        with self._lock:
+            tree_id = self._tree_id(ref)
+            staged = self.staged_changes(ref)
+            paths = set(self.unstaged_changes())
+            for kind_paths in staged.values():
+                paths.update(kind_paths)
+            index = self.index()
+            normalizer = self._normalizer()
+            store = self.repo.object_store
+
+        for tree_path in sorted(paths):
+            old = (None, None)
+            if tree_id is not None:
+                try:
+                    mode, sha = tree_lookup_path(store.__getitem__, tree_id, tree_path)
+                    if not S_ISGITLINK(mode):
+                        old = (mode, store[sha])
+                except KeyError:
+                    pass
+            new = (None, None)
+            if tree_path in index:
+                try:
+                    st = os.lstat(self._fs_path(tree_path))
+                    if stat.S_ISREG(st.st_mode) or stat.S_ISLNK(st.st_mode):
+                        new = (cleanup_mode(st.st_mode), self.worktree_blob(tree_path, st, normalizer))
+                except OSError:
+                    pass
+            if old[1] is not None and new[1] is not None and old[1].id == new[1].id and old[0] == new[0]:
+                continue
+            if old == (None, None) and new == (None, None):
+                continue
+            yield tree_path, old, new
+
+
+_repos: "OrderedDict[str, CachedRepo]" = OrderedDict()
+_repos_lock = threading.Lock()
+
+
+def get_repo(path: Optional[str] = None) -> CachedRepo:
+    """Return the cached repository for the working directory path (default: cwd)."""
+    key = os.path.realpath(path or os.getcwd())
+    with _repos_lock:
+        cached = _repos.get(key)
+        if cached is not None and cached.valid():
+            _repos.move_to_end(key)
+            return cached
+    # Open outside the lock; a concurrent open of the same path only wastes work.
+    # Replaced and evicted repositories may still be in use, so they are left
+    # for garbage collection rather than closed here.
+    fresh = CachedRepo(key)
+    with _repos_lock:
+        _repos[key] = fresh
+        _repos.move_to_end(key)
+        while len(_repos) > MAX_CACHED_REPOS:
+            _repos.popitem(last=False)
+    return fresh
@@ -0,0 +1,185 @@
+"""
+Compiled .gitignore matching shared by the Glob, LS and Grep fallback walkers.
+
+Every ignore file is translated once into a single regex (one alternative per
+rule, last rule first so the winning rule is the first that matches) and
+cached by (mtime_ns, size). IgnoreMatcher layers .git/info/exclude, the
+.gitignore files of the repository above the search root and the nested
+.gitignore files below it, with git's precedence: the deepest file with a
+matching rule decides, and negated rules (!pattern) re-include paths.
+"""
+
+import os
+import re
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .globbing import translate_glob
+
+_cache: Dict[str, Tuple[int, int, "GitignoreRules"]] = {}
+_cache_lock = threading.Lock()
+
+
+class GitignoreRules:
+    """The rules of one ignore file, compiled into two regexes."""
+
+    def __init__(self, lines: Iterable[str]):
+        file_rules: List[Tuple[str, bool]] = []
+        dir_rules: List[Tuple[str, bool]] = []
+        for raw in lines:
+            line = raw.rstrip("\n").rstrip("\r")
+            # Trailing spaces are ignored unless escaped
+            stripped = line.rstrip(" ")
+            if stripped.endswith("\\") and len(stripped) < len(line):
+                stripped += " "
+            line = stripped
+            if not line or line.startswith("#"):
+                continue
+
+            negated = line.startswith("!")
+            if negated:
+                line = line[1:]
+            elif line.startswith("\\!") or line.startswith("\\#"):
+                line = line[1:]
+
+            dir_only = line.endswith("/")
+            line = line.rstrip("/")
+            if not line:
+                continue
+
+            # A slash at the start or in the middle anchors the pattern to this directory
+            anchored = "/" in line
+            line = line.lstrip("/")
+            regex = translate_glob(line)
+            if not anchored and not regex.startswith("(?:.*/)?"):
+                regex = "(?:.*/)?" + regex
+
+            dir_rules.append((regex, negated))
+            if not dir_only:
+                file_rules.append((regex, negated))
+
+        self.file_regex, self.file_negations = self._compile(file_rules)
+        self.dir_regex, self.dir_negations = self._compile(dir_rules)
+
+    @staticmethod
+    def _compile(rules: List[Tuple[str, bool]]):
+        if not rules:
+            return None, []
+        # Last rule wins in git, so try rules in reverse order
+        rules = list(reversed(rules))
+        regex = re.compile("|".join(f"({r})" for r, _ in rules), re.DOTALL)
+        # Map outer group index -> negated; nested groups are non-capturing
+        return regex, [negated for _, negated in rules]
+
+    def match(self, rel_path: str, is_dir: bool) -> Optional[bool]:
+        """Return True (ignored), False (re-included by !rule) or None (no rule matched)."""
+        regex = self.dir_regex if is_dir else self.file_regex
+        if regex is None:
+            return None
+        m = regex.fullmatch(rel_path)
+        if m is None:
+            return None
+        negations = self.dir_negations if is_dir else self.file_negations
+        return not negations[m.lastindex - 1]
+
+
+def load_rules(path: str) -> Optional[GitignoreRules]:
+    """Load compiled rules for an ignore file, cached by (mtime_ns, size)."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    with _cache_lock:
+        cached = _cache.get(path)
+        if cached is not None and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+            return cached[2]
+    try:
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            rules = GitignoreRules(f)
+    except OSError:
+        return None
+    with _cache_lock:
+        _cache[path] = (st.st_mtime_ns, st.st_size, rules)
+    return rules
+
+
+def _find_repo_root(path: str) -> Optional[str]:
+    current = path
+    while True:
+        if os.path.exists(os.path.join(current, ".git")):
+            return current
+        parent = os.path.dirname(current)
+        if parent == current:
+            return None
+        current = parent
+
+
+class IgnoreMatcher:
+    """Answers "is this path ignored?" for paths below a root directory.
+
+    Walkers should check entries top-down and prune ignored directories, as git
+    does not re-include files inside an ignored directory.
+    """
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+        # rel_dir -> [(strip, add, rules)]: a path relative to root becomes relative
+        # to the rules' directory via add + rel_path[len(strip):]
+        self._dir_rules: Dict[str, List[Tuple[str, str, GitignoreRules]]] = {}
+
+        # Rules that apply to root itself: info/exclude, then the .gitignore files
+        # from the repository root down to (but excluding) root
+        base: List[Tuple[str, str, GitignoreRules]] = []
+        repo_root = _find_repo_root(self.root)
+        if repo_root is not None:
+            # Directories from the repository root down to root's parent
+            ancestors = []
+            current = self.root
+            while current != repo_root:
+                current = os.path.dirname(current)
+                ancestors.append(current)
+            sources = [(repo_root, os.path.join(repo_root, ".git", "info", "exclude"))]
+            sources.extend((d, os.path.join(d, ".gitignore")) for d in reversed(ancestors))
+            for directory, source in sources:
+                rules = load_rules(source)
+                if rules is None:
+                    continue
+                add = os.path.relpath(self.root, directory).replace(os.sep, "/")
+                base.append(("", "" if add == "." else add + "/", rules))
+        self._base = base
+
+    def _rules_for(self, rel_dir: str) -> List[Tuple[str, str, GitignoreRules]]:
+        """Rules applying to entries of rel_dir, shallowest first."""
+        cached = self._dir_rules.get(rel_dir)
+        if cached is not None:
+            return cached
+        if rel_dir:
+            parent = rel_dir.rsplit("/", 1)[0] if "/" in rel_dir else ""
+            inherited = self._rules_for(parent)
+        else:
+            inherited = self._base
+        directory = os.path.join(self.root, rel_dir) if rel_dir else self.root
+        rules = load_rules(os.path.join(directory, ".gitignore"))
+        strip = rel_dir + "/" if rel_dir else ""
+        result = inherited + [(strip, "", rules)] if rules is not None else inherited
+        self._dir_rules[rel_dir] = result
+        return result
+
+    def is_ignored(self, rel_path: str, is_dir: bool = False) -> bool:
+        """Check one path relative to root (using "/" separators)."""
+        rel_path = rel_path.replace(os.sep, "/").strip("/")
+        if not rel_path or rel_path == ".":
+            return False
+        if rel_path == ".git" or rel_path.endswith("/.git"):
+            return True
+        rel_dir = rel_path.rsplit("/", 1)[0] if "/" in rel_path else ""
+        for strip, add, rules in reversed(self._rules_for(rel_dir)):
+            decision = rules.match(add + rel_path[len(strip) :], is_dir)
+            if decision is not None:
+                return decision
+        return False
+
+
+def compile_patterns(patterns: Iterable[str]) -> GitignoreRules:
+    """Compile ad-hoc ignore patterns (gitignore syntax) into one matcher."""
+    return GitignoreRules(patterns)
@@ -0,0 +1,127 @@
+"""
+Glob pattern compilation shared by the Glob tool, gitignore rules and the Grep fallback.
+
+Patterns are brace-expanded and translated once into a single regex over paths
+relative to the search root, so a walk only needs one fullmatch per entry.
+"""
+
+import os
+import re
+from typing import List, Optional
+
+
+def expand_braces(pattern: str) -> List[str]:
+    """Expand shell-style braces: 'src/*.{ts,tsx}' -> ['src/*.ts', 'src/*.tsx']."""
+    depth = 0
+    start = -1
+    for idx, ch in enumerate(pattern):
+        if ch == "{":
+            if depth == 0:
+                start = idx
+            depth += 1
+        elif ch == "}" and depth:
+            depth -= 1
+            if depth == 0:
+                # Split the outermost group on top-level commas
+                options, level, last = [], 0, start + 1
+                for j in range(start + 1, idx):
+                    if pattern[j] == "{":
+                        level += 1
+                    elif pattern[j] == "}":
+                        level -= 1
+                    elif pattern[j] == "," and level == 0:
+                        options.append(pattern[last:j])
+                        last = j + 1
+                options.append(pattern[last:idx])
+                if len(options) == 1:
+                    continue
+                head, tail = pattern[:start], pattern[idx + 1 :]
+                expanded = []
+                for option in options:
+                    expanded.extend(expand_braces(head + option + tail))
+                return expanded
+    return [pattern]
+
+
+def translate_glob(pattern: str) -> str:
+    """Translate one glob (no braces) into a regex over "/"-separated paths.
+
+    "*" and "?" never cross "/", "**/" matches zero or more directories and a
+    trailing "/**" matches everything below. Shared with the gitignore compiler.
+    """
+    out = []
+    i, n = 0, len(pattern)
+    while i < n:
+        ch = pattern[i]
+        if ch == "*":
+            if pattern.startswith("**", i):
+                at_start = i == 0 or pattern[i - 1] == "/"
+                at_end = i + 2 == n or pattern[i + 2] == "/"
+                if at_start and at_end:
+                    if i + 2 == n:
+                        out.append(".*")  # trailing /** matches everything inside
+                        i += 2
+                    else:
+                        out.append("(?:.*/)?")  # **/ matches zero or more directories
+                        i += 3
+                    continue
+                out.append("[^/]*")
+                i += 2
+                continue
+            out.append("[^/]*")
+        elif ch == "?":
+            out.append("[^/]")
+        elif ch == "[":
+            end = pattern.find("]", i + 2 if pattern[i + 1 : i + 2] in ("!", "^") else i + 1)
+            if end == -1:
+                out.append(re.escape(ch))
+            else:
+                body = pattern[i + 1 : end]
+                if body[:1] in ("!", "^"):
+                    body = "^" + body[1:]
+                out.append("[" + body.replace("\\", "\\\\") + "]")
+                i = end
+        elif ch == "\\" and i + 1 < n:
+            i += 1
+            out.append(re.escape(pattern[i]))
+        else:
+            out.append(re.escape(ch))
+        i += 1
+    return "".join(out)
+
+
+def _normalize(pattern: str) -> str:
+    if os.sep != "/":
+        pattern = pattern.replace(os.sep, "/")
+    while pattern.startswith("./"):
+        pattern = pattern[2:]
+    return pattern
+
+
+def compile_glob(pattern: str, flags: int = 0) -> "re.Pattern[str]":
+    """Compile a glob such as 'src/**/test_*.{py,pyi}' into one regex over relative paths."""
+    pattern = _normalize(pattern)
+    alternatives = [translate_glob(p) for p in expand_braces(pattern)]
+    return re.compile("(?:" + "|".join(alternatives) + ")", flags | re.DOTALL)
+
+
+def literal_prefix(pattern: str) -> str:
+    """Leading directory segments of a glob that contain no wildcards or braces."""
+    pattern = _normalize(pattern)
+    segments = pattern.split("/")[:-1]
+    prefix: List[str] = []
+    for segment in segments:
+        if not segment or any(ch in segment for ch in "*?[{\\"):
+            break
+        prefix.append(segment)
+    return "/".join(prefix)
+
+
+def max_depth(pattern: str) -> Optional[int]:
+    """Number of path segments a match can have, or None when "**" allows any depth."""
+    depths = []
+    for expanded in expand_braces(_normalize(pattern)):
+        if "**" in expanded:
+            return None
+        depths.append(expanded.count("/") + 1)
+    return max(depths)
@@ -0,0 +1,301 @@
+"""
+Background jobs started by the Bash tool.
+
+Each job runs in its own session with stdout and stderr piped into a
+pump thread, which appends the output to a per-job log file under CACHE_DIR
+and rotates it after LOG_MAX_BYTES, keeping LOG_BACKUPS older files. The
+manager tracks the pid, start and end time, exit code, number of bytes
+written and, once it exits, the rusage of every job, so the BashJobs tool can poll, tail, wait for or kill
+a job while the agent keeps working. Jobs still running when the process
+exits are killed.
+"""
+
+import atexit
+import os
+import signal
+import subprocess
+import threading
+import time
+import weakref
+from typing import Callable, Dict, List, Optional
+
+from .command_metrics import ResourceUsage, usage_from_rusage
+from .process_limits import kill_session, popen_options, ulimit_script
+from .trigram_index import CACHE_DIR
+
+# Constants
+JOB_LOG_DIR = os.path.join(CACHE_DIR, "jobs")
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_BACKUPS = 2
+READ_CHUNK_SIZE = 64 * 1024
+KILL_GRACE_SECONDS = 5.0
+LOG_MAX_AGE_SECONDS = 7 * 24 * 3600  # Logs of older jobs are removed
+
+CONTEXT_KEY = "bash_jobs"
+
+_managers: "weakref.WeakSet[JobManager]" = weakref.WeakSet()
+_managers_lock = threading.Lock()
+
+
+class RotatingLog:
+    """Append-only log file that moves to path.1, path.2, ... when it gets too large."""
+
+    def __init__(self, path: str, max_bytes: int = LOG_MAX_BYTES, backups: int = LOG_BACKUPS):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._file = open(path, "wb")
+        self._size = 0
+
+    def write(self, data: bytes):
+        if self._size and self._size + len(data) > self.max_bytes:
+            self._rotate()
+        self._file.write(data)
+        self._file.flush()
+        self._size += len(data)
+
+    def _rotate(self):
+        self._file.close()
+        for number in range(self.backups - 1, 0, -1):
+            older = f"{self.path}.{number}"
+            if os.path.exists(older):
+                os.replace(older, f"{self.path}.{number + 1}")
+        if self.backups:
+            os.replace(self.path, f"{self.path}.1")
+        self._file = open(self.path, "wb")
+        self._size = 0
+
+    def files(self) -> List[str]:
+        """Existing log files, newest first."""
+        names = [self.path] + [f"{self.path}.{n}" for n in range(1, self.backups + 1)]
+        return [name for name in names if os.path.exists(name)]
+
+    def close(self):
+        self._file.close()
+
+
+def tail_lines(paths: List[str], count: int) -> List[str]:
+    """Last count lines across files given newest first, reading backwards in blocks."""
+    blocks: List[bytes] = []
+    newlines = 0
+    for path in paths:
+        try:
+            with open(path, "rb") as file:
+                pos = file.seek(0, os.SEEK_END)
+                while pos > 0 and newlines <= count:
+                    step = min(READ_CHUNK_SIZE, pos)
+                    pos -= step
+                    file.seek(pos)
+                    block = file.read(step)
+                    blocks.append(block)
+                    newlines += block.count(b"\n")
+        except OSError:
+            continue
+        if newlines > count:
+            break
+    text = b"".join(reversed(blocks)).decode("utf-8", errors="replace")
+    return text.splitlines()[-count:] if count else []
+
+
+class Job:
+    """One background command and what is known about it."""
+
+    def __init__(
+        self,
+        job_id: int,
+        command: str,
+        cwd: str,
+        log: RotatingLog,
+        process: subprocess.Popen,
+        on_exit: Optional[Callable[["Job"], None]] = None,
+    ):
+        self.id = job_id
+        self.command = command
+        self.cwd = cwd
+        self.log = log
+        self.process = process
+        self.pid = process.pid
+        self.started = time.time()
+        self.ended: Optional[float] = None
+        self.exit_code: Optional[int] = None
+        self.bytes_written = 0
+        self.usage: Optional[ResourceUsage] = None
+        self._on_exit = on_exit
+        self._finished = threading.Event()
+        self._pump = threading.Thread(target=self._pump_output, name=f"bash-job-{job_id}", daemon=True)
+        self._pump.start()
+
+    def _pump_output(self):
+        fd = self.process.stdout.fileno()
+        try:
+            while True:
+                chunk = os.read(fd, READ_CHUNK_SIZE)
+                if not chunk:
+                    break
+                self.log.write(chunk)
+                self.bytes_written += len(chunk)
+        finally:
+            self.process.stdout.close()
+            self.log.close()
+            rusage = self._reap()
+            self.exit_code = self.process.returncode
+            self.ended = time.time()
+            self.usage = usage_from_rusage(self.ended - self.started, rusage, self.bytes_written)
+            self._finished.set()
+            if self._on_exit is not None:
+                try:
+                    self._on_exit(self)
+                except Exception:
+                    pass
+
+    def _reap(self):
+        """Wait for the process and return its rusage (None where os.wait4 is missing)."""
+        if not hasattr(os, "wait4"):
+            self.process.wait()
+            return None
+        try:
+            _, status, rusage = os.wait4(self.pid, 0)
+        except ChildProcessError:
+            self.process.wait()
+            return None
+        self.process.returncode = os.waitstatus_to_exitcode(status)
+        return rusage
+
+    @property
+    def running(self) -> bool:
+        return not self._finished.is_set()
+
+    def wait(self, timeout: Optional[float]) -> bool:
+        """Wait for the job's output to end and the process to exit; False on timeout."""
+        return self._finished.wait(timeout)
+
+    def kill(self, grace: float = KILL_GRACE_SECONDS) -> bool:
+        """SIGTERM the job's session, then SIGKILL it after grace seconds."""
+        if not self.running:
+            return False
+        for sig in (signal.SIGTERM, signal.SIGKILL):
+            if not kill_session(self.pid, sig):
+                break
+            if self.wait(grace):
+                break
+        return True
+
+    def describe(self) -> str:
+        started = time.strftime("%H:%M:%S", time.localtime(self.started))
+        if self.running:
+            state = f"running for {time.time() - self.started:.1f}s"
+        else:
+            state = f"exited with code {self.exit_code} after {self.ended - self.started:.1f}s"
+        description = (
+            f"Job {self.id}: {state} (pid {self.pid}, started {started})\n"
+            f"Command: {self.command}\n"
+            f"Directory: {self.cwd}\n"
+            f"Output: {self.bytes_written} bytes, log {self.log.path}"
+        )
+        if self.usage is not None:
+            description += f"\nUsage: {self.usage.summary()}"
+        return description
+
+
+def _remove_old_logs(log_dir: str):
+    cutoff = time.time() - LOG_MAX_AGE_SECONDS
+    try:
+        entries = list(os.scandir(log_dir))
+    except OSError:
+        return
+    for entry in entries:
+        try:
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                os.unlink(entry.path)
+        except OSError:
+            continue
+
+
+class JobManager:
+    """The background jobs of one agent session."""
+
+    def __init__(self, log_dir: str = JOB_LOG_DIR):
+        self.log_dir = log_dir
+        self._lock = threading.Lock()
+        self._jobs: Dict[int, Job] = {}
+        self._next_id = 1
+        with _managers_lock:
+            _managers.add(self)
+        _remove_old_logs(log_dir)
+
+    def start(
+        self,
+        command: str,
+        cwd: str,
+        wrapper: Optional[List[str]] = None,
+        on_exit: Optional[Callable[[Job], None]] = None,
+        env: Optional[Dict[str, str]] = None,
+    ) -> Job:
+        """Start command as a job; on_exit(job) is called from the job's thread when it ends.
+
+        env is the job's environment (default: this process's).
+        """
+        os.makedirs(self.log_dir, exist_ok=True)
+        with self._lock:
+            job_id = self._next_id
+            self._next_id += 1
+        log = RotatingLog(os.path.join(self.log_dir, f"{os.getpid()}-{id(self):x}-{job_id}.log"))
+        limits = ulimit_script()
+        script = f"{limits}\n{command}" if limits else command
+        try:
+            process = subprocess.Popen(
+                list(wrapper or []) + ["/bin/bash", "-c", script],
+                stdin=subprocess.DEVNULL,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                cwd=cwd,
+                env=dict(env) if env is not None else os.environ.copy(),
+                **popen_options(),  # Own session, killed as a unit
+            )
+        except BaseException:
+            log.close()
+            raise
+        job = Job(job_id, command, cwd, log, process, on_exit)
+        with self._lock:
+            self._jobs[job_id] = job
+        return job
+
+    def get(self, job_id: int) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs(self) -> List[Job]:
+        with self._lock:
+            return list(self._jobs.values())
+
+    def kill_all(self):
+        for job in self.jobs():
+            job.kill(grace=1.0)
+
+
+def _kill_all():
+    with _managers_lock:
+        managers = list(_managers)
+    for manager in managers:
+        manager.kill_all()
+
+
+atexit.register(_kill_all)
+
+_global_manager: Optional[JobManager] = None
+_global_manager_lock = threading.Lock()
+
+
+def get_job_manager(context=None) -> JobManager:
+    """Return the job manager for the agent session in context (or the global fallback)."""
+    global _global_manager
+    if context is None:
+        with _global_manager_lock:
+            if _global_manager is None:
+                _global_manager = JobManager()
+        return _global_manager
+    manager = context.get(CONTEXT_KEY, None)
+    if manager is None:
+        manager = JobManager()
+        context.set(CONTEXT_KEY, manager)
+    return manager
@@ -0,0 +1,307 @@
+"""
+Sparse line-offset index used by the Read tool to page through large files.
+
+The index records the byte offset of every STRIDE-th line and is built lazily,
+only as far as the requested page, from a memory-mapped view of the file. It
+is cached per path and keyed by (inode, mtime_ns, size), so paging through a
+large log decodes only the lines being returned. Line counts come from a
+chunked newline count and reads from the end of a file scan backwards, so
+tail reads never need the forward index.
+
+Compressed files cannot be mapped. For gzip, GzipLineIndex saves copies of
+the decompressor at points spread through the file in one sequential pass, so
+a page is read by resuming decompression at the nearest point before it.
+Other formats only have their line count cached and are read from the start.
+"""
+
+import bisect
+import io
+import os
+import threading
+import zlib
+from array import array
+from collections import OrderedDict
+from itertools import accumulate
+from typing import BinaryIO, Callable, Iterable, Iterator, List, Optional, Tuple
+
+# Constants
+STRIDE = 1024  # A checkpoint is kept for every STRIDE-th line
+CHUNK_SIZE = 4 * 1024 * 1024
+TAIL_SCAN_LINES = 10000  # Longer tails use the forward index instead
+MAX_CACHED_INDEXES = 128
+ACCESS_POINT_SPAN = 8 * 1024 * 1024  # Decompressed bytes between saved gzip decompressor states
+GZIP_READ_SIZE = 64 * 1024
+GZIP_WBITS = 16 + zlib.MAX_WBITS  # zlib reads one gzip member with its header and trailer
+
+_cache: "OrderedDict[str, Tuple[tuple, object]]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+class LineIndex:
+    """Line offsets of one version of a file.
+
+    Methods take the buffer (an mmap or bytes object holding the file) as an
+    argument so that the index can be cached while the mapping is not.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self._lock = threading.Lock()
+        # _checkpoints[j] is the byte offset of line j * STRIDE (0-based lines)
+        self._checkpoints = array("Q", [0])
+        # Everything before _scan_pos (the start of line _scan_line) is indexed
+        self._scan_pos = 0
+        self._scan_line = 0
+        self._line_count = None
+
+    def line_count(self, buf) -> int:
+        """Number of lines, counting a final line without a trailing newline."""
+        with self._lock:
+            if self._line_count is None:
+                newlines = 0
+                for pos in range(0, self.size, CHUNK_SIZE):
+                    newlines += buf[pos : pos + CHUNK_SIZE].count(b"\n")
+                unterminated = self.size > 0 and buf[self.size - 1 : self.size] != b"\n"
+                self._line_count = newlines + (1 if unterminated else 0)
+            return self._line_count
+
+    def _extend(self, buf, line: int):
+        """Scan forward until the checkpoint at or below line is known."""
+        target = (line // STRIDE) * STRIDE
+        while self._scan_line < target and self._scan_pos < self.size:
+            pos = self._scan_pos
+            pieces = buf[pos : pos + CHUNK_SIZE].split(b"\n")
+            # The last piece is an unterminated (or empty) partial line
+            pieces.pop()
+            if not pieces:
+                # A single line longer than a chunk
+                newline = buf.find(b"\n", pos + CHUNK_SIZE)
+                if newline == -1:
+                    self._scan_pos = self.size
+                    break
+                self._scan_pos = newline + 1
+                self._scan_line += 1
+                if self._scan_line % STRIDE == 0:
+                    self._checkpoints.append(self._scan_pos)
+                continue
+
+            # Line (_scan_line + k + 1) starts at pos + ends[k] + k + 1
+            ends = list(accumulate(map(len, pieces)))
+            first = self._scan_line + 1
+            for k in range((-first) % STRIDE, len(ends), STRIDE):
+                self._checkpoints.append(pos + ends[k] + k + 1)
+            self._scan_line += len(ends)
+            self._scan_pos = pos + ends[-1] + len(ends)
+
+    def line_start(self, buf, line: int) -> int:
+        """Byte offset where 0-based line starts (the file size past the end)."""
+        if line >= self.line_count(buf):
+            return self.size
+        with self._lock:
+            self._extend(buf, line)
+            checkpoint = line // STRIDE
+            if checkpoint >= len(self._checkpoints):
+                return self.size
+            pos = self._checkpoints[checkpoint]
+        for _ in range(line - checkpoint * STRIDE):
+            newline = buf.find(b"\n", pos)
+            if newline == -1:
+                return self.size
+            pos = newline + 1
+        return pos
+
+    def tail_start(self, buf, lines: int) -> Tuple[int, int]:
+        """Return (0-based line, byte offset) where the last `lines` lines begin."""
+        total = self.line_count(buf)
+        first = max(0, total - lines)
+        with self._lock:
+            indexed = first // STRIDE < len(self._checkpoints)
+        if indexed or lines > TAIL_SCAN_LINES:
+            return first, self.line_start(buf, first)
+
+        end = self.size - 1 if buf[self.size - 1 : self.size] == b"\n" else self.size
+        start = self.size
+        for _ in range(total - first):
+            newline = buf.rfind(b"\n", 0, end)
+            start = newline + 1
+            if newline == -1:
+                break
+            end = newline
+        return first, start
+
+
+def _count_lines(chunks: Iterable[bytes]) -> Tuple[int, int]:
+    """(decompressed size, line count) of a stream given as chunks."""
+    newlines = 0
+    size = 0
+    last = b""
+    for chunk in chunks:
+        if chunk:
+            newlines += chunk.count(b"\n")
+            size += len(chunk)
+            last = chunk[-1:]
+    return size, newlines + (1 if size and last != b"\n" else 0)
+
+
+class StreamLineIndex:
+    """Line count of a decompressed stream, whose pages are read from its start.
+
+    bz2 and xz decompressors cannot be copied or resumed mid-stream, so paging
+    through these files is linear in the offset.
+    """
+
+    def __init__(self, open_stream: Callable[[], BinaryIO]):
+        self._open_stream = open_stream
+        with open_stream() as stream:
+            self.size, self.line_count = _count_lines(iter(lambda: stream.read(CHUNK_SIZE), b""))
+
+    def open_at(self, line: int) -> Tuple[BinaryIO, int]:
+        """Return a decompressed stream positioned at the start of a line at or
+        before the 0-based line, and that line's number."""
+        return self._open_stream(), 0
+
+
+def _inflate(raw: BinaryIO, decompressor=None) -> Iterator[Tuple[bytes, Optional[object]]]:
+    """Decompress gzip members from raw's current position.
+
+    Yields (data, decompressor) pairs. The decompressor is given only when all
+    input read so far has been consumed, so that a copy of it resumes
+    decompression at raw.tell(); otherwise it is None.
+    """
+    between_members = decompressor is None
+    decompressor = decompressor or zlib.decompressobj(GZIP_WBITS)
+    while True:
+        data = raw.read(GZIP_READ_SIZE)
+        if not data:
+            return
+        while data:
+            if between_members:
+                # Like gzip.open, ignore zero padding after the last member
+                data = data.lstrip(b"\0")
+                if not data:
+                    break
+                between_members = False
+            out = decompressor.decompress(data, CHUNK_SIZE)
+            data = decompressor.unconsumed_tail
+            if decompressor.eof:
+                data = decompressor.unused_data
+                decompressor = zlib.decompressobj(GZIP_WBITS)
+                between_members = True
+            resumable = not data and not between_members
+            yield out, decompressor if resumable else None
+
+
+class _InflateReader(io.RawIOBase):
+    """Raw stream of the data decompressed from a gzip file by _inflate."""
+
+    def __init__(self, raw: BinaryIO, decompressor=None):
+        self._raw = raw
+        self._chunks = _inflate(raw, decompressor)
+        self._pending = memoryview(b"")
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self._pending:
+            try:
+                self._pending = memoryview(next(self._chunks)[0])
+            except StopIteration:
+                return 0
+        count = min(len(buffer), len(self._pending))
+        buffer[:count] = self._pending[:count]
+        self._pending = self._pending[count:]
+        return count
+
+    def close(self):
+        self._raw.close()
+        super().close()
+
+
+class GzipLineIndex:
+    """Line count of a gzip file plus decompressor states to resume reading from.
+
+    Every ACCESS_POINT_SPAN decompressed bytes, a copy of the zlib decompressor
+    is kept with the compressed offset it resumes at, so a page is read by
+    decompressing at most one span before it instead of the whole prefix.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        # Per access point: first line starting at or after it, compressed offset,
+        # decompressor (None at the start of the file) and whether the point is
+        # mid-line
+        self._first_lines = [0]
+        self._points: List[Tuple[int, Optional[object], bool]] = [(0, None, False)]
+        newlines = 0
+        size = 0
+        last = b""
+        next_point = ACCESS_POINT_SPAN
+        with open(path, "rb") as raw:
+            for chunk, decompressor in _inflate(raw):
+                if chunk:
+                    newlines += chunk.count(b"\n")
+                    size += len(chunk)
+                    last = chunk[-1:]
+                if decompressor is not None and size >= next_point:
+                    mid_line = last != b"\n"
+                    self._first_lines.append(newlines + (1 if mid_line else 0))
+                    self._points.append((raw.tell(), decompressor.copy(), mid_line))
+                    next_point = size + ACCESS_POINT_SPAN
+        self.size = size
+        self.line_count = newlines + (1 if size and last != b"\n" else 0)
+
+    def open_at(self, line: int) -> Tuple[BinaryIO, int]:
+        """Return a decompressed stream positioned at the start of a line at or
+        before the 0-based line, and that line's number."""
+        i = bisect.bisect_right(self._first_lines, line) - 1
+        offset, decompressor, mid_line = self._points[i]
+        raw = open(self.path, "rb")
+        try:
+            raw.seek(offset)
+            stream = io.BufferedReader(_InflateReader(raw, decompressor and decompressor.copy()))
+            if mid_line:
+                # Skip the rest of the line the access point falls in
+                while True:
+                    piece = stream.readline(CHUNK_SIZE)
+                    if not piece or piece.endswith(b"\n"):
+                        break
+        except BaseException:
+            raw.close()
+            raise
+        return stream, self._first_lines[i]
+
+
+def _cached(path: str, st: os.stat_result, kind: str, build: Callable[[], object]):
+    path = os.path.abspath(path)
+    key = (kind, st.st_dev, st.st_ino, st.st_mtime_ns, st.st_size)
+    with _cache_lock:
+        cached = _cache.get(path)
+        if cached is not None and cached[0] == key:
+            _cache.move_to_end(path)
+            return cached[1]
+    index = build()
+    with _cache_lock:
+        _cache[path] = (key, index)
+        _cache.move_to_end(path)
+        while len(_cache) > MAX_CACHED_INDEXES:
+            _cache.popitem(last=False)
+    return index
+
+
+def get_line_index(path: str, st: os.stat_result) -> LineIndex:
+    """Return the cached index for path if st still describes the same file."""
+    return _cached(path, st, "mmap", lambda: LineIndex(st.st_size))
+
+
+def get_stream_line_index(
+    path: str, st: os.stat_result, open_stream: Callable[[], BinaryIO]
+):
+    """Return the cached index of a compressed file, decompressing it once on a miss.
+
+    gzip files get a GzipLineIndex; other formats a StreamLineIndex that
+    reopens the file with open_stream.
+    """
+    if path.lower().endswith(".gz"):
+        return _cached(path, st, "gzip", lambda: GzipLineIndex(path))
+    return _cached(path, st, "stream", lambda: StreamLineIndex(open_stream))
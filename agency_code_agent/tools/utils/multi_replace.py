@@ -0,0 +1,108 @@
+"""
+Single-pass multi-needle matching used by MultiEdit.
+
+All needles are compiled into one regex: a lookahead alternation finds every
+position where some needle starts, and one optional capturing lookahead per
+needle records which needles start there. Scanning the text once therefore
+yields every occurrence of every needle, overlapping ones included, much like
+an Aho-Corasick automaton but driven by the C regex engine. The edited text is
+then built with a single join over the selected spans. With only a few
+needles, one str.find scan per needle is cheaper than the combined regex.
+
+Run this module directly for a benchmark against sequential str.replace.
+"""
+
+import re
+from typing import Dict, Iterable, List, Tuple
+
+# Constants
+FIND_LOOP_MAX_NEEDLES = 32  # Up to this many needles, scan once per needle instead
+
+Span = Tuple[int, int, str]  # (start, end, replacement)
+
+
+def find_occurrences(text: str, needles: Iterable[str]) -> Dict[str, List[int]]:
+    """Return the start offsets of every (possibly overlapping) occurrence of each needle."""
+    unique = list(dict.fromkeys(n for n in needles if n))
+    occurrences: Dict[str, List[int]] = {needle: [] for needle in unique}
+    if not unique:
+        return occurrences
+
+    if len(unique) <= FIND_LOOP_MAX_NEEDLES:
+        for needle, positions in occurrences.items():
+            pos = text.find(needle)
+            while pos != -1:
+                positions.append(pos)
+                pos = text.find(needle, pos + 1)
+        return occurrences
+
+    escaped = [re.escape(needle) for needle in unique]
+    pattern = re.compile(
+        "(?=" + "|".join(escaped) + ")" + "".join(f"(?=({e})?)" for e in escaped)
+    )
+    for match in pattern.finditer(text):
+        start = match.start()
+        for needle, found in zip(unique, match.groups()):
+            if found is not None:
+                occurrences[needle].append(start)
+    return occurrences
+
+
+def non_overlapping(positions: List[int], length: int) -> List[int]:
+    """Select occurrences left to right the way str.replace and str.count do."""
+    selected = []
+    next_free = 0
+    for pos in positions:
+        if pos >= next_free:
+            selected.append(pos)
+            next_free = pos + length
+    return selected
+
+
+def apply_spans(text: str, spans: List[Span]) -> str:
+    """Build the edited text in one join; spans must be sorted and disjoint."""
+    pieces = []
+    last = 0
+    for start, end, replacement in spans:
+        pieces.append(text[last:start])
+        pieces.append(replacement)
+        last = end
+    pieces.append(text[last:])
+    return "".join(pieces)
+
+
+if __name__ == "__main__":
+    import random
+    import time
+
+    random.seed(0)
+    for n_lines, n_edits in [(20000, 5), (20000, 20), (100000, 50), (100000, 200)]:
+        text = "".join(
+            f"    value_{i} = compute(item_{i}, factor={i % 7})  # generated line {i}\n"
+            for i in range(n_lines)
+        )
+        edits = [
+            (f"    value_{i} = compute(", f"    value_{i} = compute_fast(")
+            for i in random.sample(range(n_lines), n_edits)
+        ]
+
+        # Sequential approach: two counts per edit, then one replace (copy) per edit
+        start = time.perf_counter()
+        content = text
+        for old, _ in edits:
+            assert old in content and content.count(old) == 1
+        for old, new in edits:
+            content = content.replace(old, new, 1)
+        sequential = time.perf_counter() - start
+
+        start = time.perf_counter()
+        found = find_occurrences(text, [old for old, _ in edits])
+        spans = sorted((found[old][0], found[old][0] + len(old), new) for old, new in edits)
+        result = apply_spans(text, spans)
+        single_pass = time.perf_counter() - start
+
+        assert result == content
+        print(
+            f"{len(text) / 1e6:5.1f} MB, {n_edits:3d} edits: "
+            f"sequential {sequential * 1000:7.1f} ms, single pass {single_pass * 1000:7.1f} ms"
+        )
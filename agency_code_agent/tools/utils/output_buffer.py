@@ -0,0 +1,71 @@
+"""
+Constant-memory capture of command output for the Bash tool.
+
+Output is fed in as it arrives. The first HEAD_BYTES are kept as they are,
+the most recent TAIL_BYTES live in a fixed-size ring buffer, and everything
+in between is only counted, so a command printing gigabytes uses the same
+memory as one printing a few lines. Rendering joins the two windows with a
+note of how many bytes were dropped.
+"""
+
+# Constants
+HEAD_BYTES = 10000
+TAIL_BYTES = 20000
+
+
+class OutputBuffer:
+    """Head window, tail ring buffer and total byte count of a stream."""
+
+    def __init__(self, head_bytes: int = HEAD_BYTES, tail_bytes: int = TAIL_BYTES):
+        self.head_bytes = head_bytes
+        self.total_bytes = 0
+        self._head = bytearray()
+        self._ring = bytearray(tail_bytes)
+        self._ring_pos = 0  # Next write position in the ring
+        self._ring_used = 0
+
+    def write(self, data: bytes):
+        self.total_bytes += len(data)
+        if len(self._head) < self.head_bytes:
+            room = self.head_bytes - len(self._head)
+            self._head += data[:room]
+            data = data[room:]
+        if not data or not self._ring:
+            return
+
+        capacity = len(self._ring)
+        if len(data) >= capacity:
+            # Only the last `capacity` bytes can survive
+            self._ring[:] = data[-capacity:]
+            self._ring_pos = 0
+            self._ring_used = capacity
+            return
+        first = min(len(data), capacity - self._ring_pos)
+        self._ring[self._ring_pos : self._ring_pos + first] = data[:first]
+        self._ring[: len(data) - first] = data[first:]
+        self._ring_pos = (self._ring_pos + len(data)) % capacity
+        self._ring_used = min(capacity, self._ring_used + len(data))
+
+    def head(self) -> bytes:
+        return bytes(self._head)
+
+    def tail(self) -> bytes:
+        """The bytes in the ring, oldest first."""
+        if self._ring_used < len(self._ring):
+            return bytes(self._ring[: self._ring_used])
+        return bytes(self._ring[self._ring_pos :] + self._ring[: self._ring_pos])
+
+    @property
+    def omitted_bytes(self) -> int:
+        return self.total_bytes - len(self._head) - self._ring_used
+
+    def render(self) -> str:
+        """Decode the kept output, marking where bytes were dropped."""
+        head = self.head().decode("utf-8", errors="replace")
+        tail = self.tail().decode("utf-8", errors="replace")
+        if not self.omitted_bytes:
+            return head + tail
+        return (
+            f"{head}\n\n... [{self.omitted_bytes} bytes omitted; the command printed "
+            f"{self.total_bytes} bytes in total] ...\n\n{tail}"
+        )
@@ -0,0 +1,146 @@
+"""
+Process lifecycle and resource limits for commands started by the Bash tool.
+
+Every shell and background job starts as the leader of a new session, so
+the command and everything it spawns can be signalled as one unit. Killing
+covers the leader's process group and, on Linux, any process that moved to a
+group of its own within the session (e.g. `set -m` jobs or test runners that
+start workers in new groups); only processes that call setsid themselves
+escape.
+
+On Linux, the shell applies caps on CPU seconds, open files and the number
+of processes with `ulimit` before it runs anything, so they hold for every
+process the command starts. Nothing runs in the child between fork and
+exec, which would not be safe in this threaded process. The defaults can be
+changed with AGENCY_CODE_BASH_RLIMIT_CPU, _NOFILE and _NPROC; a value of 0
+removes the limit. Address space is not limited unless
+AGENCY_CODE_BASH_RLIMIT_AS is set, because runtimes such as V8, the JVM,
+Go's race detector and ASan reserve far more than they use. Limits never
+exceed the hard limits this process already has, and apply to each process
+on its own, except NPROC, which the kernel counts across all processes of
+the user.
+"""
+
+import os
+import signal
+import sys
+from typing import Dict, List, Tuple
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Constants
+DEFAULT_LIMITS = {
+    "CPU": 3600,  # Seconds of CPU time per process
+    "AS": 0,  # Bytes of address space per process; unlimited unless configured
+    "NOFILE": 4096,
+    "NPROC": 4096,
+}
+CPU_KILL_GRACE_SECONDS = 5  # SIGXCPU at the CPU limit, SIGKILL this much later
+LIMITS_ENABLED = sys.platform.startswith("linux") and resource is not None
+# bash ulimit option and the unit it takes, in bytes, per limit
+ULIMIT_OPTIONS = {"CPU": ("t", 1), "AS": ("v", 1024), "NOFILE": ("n", 1), "NPROC": ("u", 1)}
+
+
+def _configured_limits() -> Dict[str, int]:
+    limits = {}
+    for name, default in DEFAULT_LIMITS.items():
+        value = os.getenv(f"AGENCY_CODE_BASH_RLIMIT_{name}", "")
+        try:
+            limits[name] = int(value) if value.strip() else default
+        except ValueError:
+            limits[name] = default
+    return {name: value for name, value in limits.items() if value > 0}
+
+
+RESOURCE_LIMITS = _configured_limits()
+
+
+def _planned_limits() -> List[Tuple[str, Tuple[int, int]]]:
+    """(limit name, (soft, hard)) pairs, capped at the current hard limits."""
+    planned = []
+    for name, value in RESOURCE_LIMITS.items():
+        which = getattr(resource, f"RLIMIT_{name}", None)
+        if which is None or name not in ULIMIT_OPTIONS:
+            continue
+        # A grace period past the CPU limit lets SIGXCPU arrive before SIGKILL
+        soft, hard = value, value + (CPU_KILL_GRACE_SECONDS if name == "CPU" else 0)
+        _, current_hard = resource.getrlimit(which)
+        if current_hard != resource.RLIM_INFINITY:
+            soft, hard = min(soft, current_hard), min(hard, current_hard)
+        planned.append((name, (soft, hard)))
+    return planned
+
+
+_PLANNED_LIMITS = _planned_limits() if LIMITS_ENABLED else []
+
+
+def ulimit_script() -> str:
+    """Shell code that applies RESOURCE_LIMITS to the shell and its children (Linux only).
+
+    Soft limits are set before hard ones so a soft limit never exceeds its
+    hard limit; a limit the shell cannot set is skipped silently.
+    """
+    commands = []
+    for kind in ("S", "H"):
+        for name, limits in _PLANNED_LIMITS:
+            option, unit = ULIMIT_OPTIONS[name]
+            value = limits[0] if kind == "S" else limits[1]
+            commands.append(f"ulimit -{kind}{option} {max(value // unit, 1)} 2>/dev/null")
+    return "; ".join(commands)
+
+
+def popen_options() -> dict:
+    """Popen keyword arguments that start a command in its own session."""
+    return {"start_new_session": True}
+
+
+def session_members(sid: int) -> List[int]:
+    """pids of processes in session sid, read from /proc (empty elsewhere)."""
+    members = []
+    try:
+        names = os.listdir("/proc")
+    except OSError:
+        return members
+    for name in names:
+        if not name.isdigit():
+            continue
+        try:
+            with open(f"/proc/{name}/stat", "rb") as stat:
+                fields = stat.read().rsplit(b")", 1)[1].split()
+        except (OSError, IndexError):
+            continue
+        # Fields after the command name: state, ppid, pgrp, session, ...
+        if len(fields) > 3 and int(fields[3]) == sid:
+            members.append(int(name))
+    return members
+
+
+def kill_session(sid: int, sig: int = signal.SIGKILL) -> bool:
+    """Send sig to the process group and session led by sid; False if none was left."""
+    found = False
+    try:
+        os.killpg(sid, sig)
+        found = True
+    except ProcessLookupError:
+        pass
+    except OSError:
+        found = True
+    for pid in session_members(sid):
+        try:
+            os.kill(pid, sig)
+            found = True
+        except OSError:
+            pass
+    return found
+
+
+def describe_limit_signal(exit_code: int) -> str:
+    """Explain an exit code caused by hitting a resource limit, or ""."""
+    if not LIMITS_ENABLED or exit_code is None or exit_code <= 128:
+        return ""
+    if exit_code - 128 == signal.SIGXCPU and "CPU" in RESOURCE_LIMITS:
+        return f"The command was stopped after using {RESOURCE_LIMITS['CPU']} seconds of CPU time (the per-process limit)."
+    return ""
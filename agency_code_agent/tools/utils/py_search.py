@@ -0,0 +1,450 @@
+"""
+Pure-Python search engine used by the Grep tool when ripgrep is not installed.
+
+Files are enumerated with ripgrep's default filters (hidden files, nested
+.gitignore rules, --type and --glob) and searched through mmap with compiled bytes regexes. Large
+file sets are fanned out over a process pool sized to the CPU count. Output
+lines use ripgrep's formats so the Grep tool can post-process both engines the
+same way.
+
+Run this module directly to benchmark it against rg on a synthetic tree.
+"""
+
+import atexit
+import fnmatch
+import mmap
+import multiprocessing
+import os
+import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Iterable, List, Optional, Tuple
+
+from .fs_snapshot import FilesystemSnapshot
+from .gitignore import IgnoreMatcher
+from .globbing import compile_glob
+
+# Constants
+BINARY_SNIFF_BYTES = 8192
+PARALLEL_MIN_FILES = 64  # Below this the pool start-up costs more than it saves
+FILES_PER_TASK = 64
+MAX_WORKERS = os.cpu_count() or 1
+
+# Subset of `rg --type-list`; keys are the names accepted by the type parameter
+FILE_TYPES = {
+    "c": ["*.c", "*.h"],
+    "cpp": ["*.cpp", "*.cc", "*.cxx", "*.hpp", "*.hh", "*.hxx", "*.h", "*.inl"],
+    "cs": ["*.cs"],
+    "css": ["*.css", "*.scss", "*.sass", "*.less"],
+    "go": ["*.go"],
+    "html": ["*.html", "*.htm", "*.xhtml"],
+    "java": ["*.java", "*.jsp"],
+    "js": ["*.js", "*.jsx", "*.mjs", "*.cjs", "*.vue"],
+    "json": ["*.json", "*.jsonl", "*.geojson"],
+    "kotlin": ["*.kt", "*.kts"],
+    "lua": ["*.lua"],
+    "md": ["*.md", "*.markdown", "*.mdx"],
+    "markdown": ["*.md", "*.markdown", "*.mdx"],
+    "php": ["*.php", "*.php3", "*.php4", "*.php5", "*.phtml"],
+    "py": ["*.py", "*.pyi"],
+    "rb": ["*.rb", "Gemfile", "*.gemspec", "Rakefile"],
+    "ruby": ["*.rb", "Gemfile", "*.gemspec", "Rakefile"],
+    "rust": ["*.rs"],
+    "scala": ["*.scala", "*.sbt"],
+    "sh": ["*.sh", "*.bash", "*.zsh", ".bashrc", ".zshrc", ".profile"],
+    "sql": ["*.sql", "*.psql"],
+    "swift": ["*.swift"],
+    "toml": ["*.toml", "Cargo.lock"],
+    "ts": ["*.ts", "*.tsx", "*.cts", "*.mts"],
+    "typescript": ["*.ts", "*.tsx", "*.cts", "*.mts"],
+    "txt": ["*.txt"],
+    "xml": ["*.xml", "*.xsd", "*.xsl", "*.svg"],
+    "yaml": ["*.yaml", "*.yml"],
+}
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _compile_filters(file_type: Optional[str], glob: Optional[str]):
+    """Build predicates from --type/--glob filters.
+
+    Returns (matches, excluded_dir): whether a relative file path is searched,
+    and whether a relative directory path is skipped with everything below it.
+    """
+    type_globs = None
+    if file_type:
+        if file_type not in FILE_TYPES:
+            raise ValueError(f"unrecognized file type: {file_type}")
+        type_globs = FILE_TYPES[file_type]
+
+    # Like rg, a glob with a "/" matches the path below the search root (where
+    # "**/" also matches no directory at all); one without matches the file name
+    # A trailing "/" restricts the glob to directories, as in .gitignore
+    glob_regex, glob_has_slash, negated, dirs_only = None, False, False, False
+    if glob:
+        negated = glob.startswith("!")
+        pattern = glob[1:] if negated else glob
+        dirs_only = pattern.endswith("/")
+        pattern = pattern.rstrip("/")
+        glob_has_slash = "/" in pattern
+        glob_regex = compile_glob(pattern.lstrip("/"))
+
+    def glob_hit(rel_path: str) -> bool:
+        target = rel_path if glob_has_slash else rel_path.rsplit("/", 1)[-1]
+        return glob_regex.fullmatch(target) is not None
+
+    def matches(rel_path: str) -> bool:
+        name = rel_path.rsplit("/", 1)[-1]
+        if type_globs is not None and not any(fnmatch.fnmatch(name, g) for g in type_globs):
+            return False
+        if glob_regex is not None:
+            hit = not dirs_only and glob_hit(rel_path)
+            if hit == negated:
+                return False
+        return True
+
+    def excluded_dir(rel_path: str) -> bool:
+        # Like rg, a directory is only pruned by a negated glob; one that misses
+        # a positive glob is still descended into
+        return negated and glob_hit(rel_path)
+
+    return matches, excluded_dir
+
+
+def list_files(
+    search_path: str,
+    file_type: Optional[str] = None,
+    glob: Optional[str] = None,
+    snapshot: Optional[FilesystemSnapshot] = None,
+) -> List[str]:
+    """List the files ripgrep would search below search_path.
+
+    Paths are returned the way rg prints them (prefixed with search_path as
+    given). An explicit file path is always returned, like rg does. Directory
+    listings come from snapshot when one is given.
+    """
+    if os.path.isfile(search_path):
+        return [search_path]
+
+    matches, excluded_dir = _compile_filters(file_type, glob)
+    ignore_matcher = IgnoreMatcher(search_path)
+    results: List[str] = []
+    stack = [""]
+    while stack:
+        rel_dir = stack.pop()
+        try:
+            dir_path = os.path.join(search_path, rel_dir)
+            if snapshot is not None:
+                entries = sorted(snapshot.scandir(dir_path), key=lambda e: e.name)
+            else:
+                with os.scandir(dir_path) as it:
+                    entries = sorted(it, key=lambda e: e.name)
+        except OSError:
+            continue
+        subdirs = []
+        for entry in entries:
+            if entry.name.startswith("."):
+                continue
+            rel = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+            try:
+                is_dir = entry.is_dir(follow_symlinks=False)
+            except OSError:
+                continue
+            if ignore_matcher.is_ignored(rel, is_dir):
+                continue
+            if is_dir:
+                if not excluded_dir(rel):
+                    subdirs.append(rel)
+            elif entry.is_file(follow_symlinks=False) and matches(rel):
+                results.append(os.path.join(search_path, rel))
+        stack.extend(reversed(subdirs))
+    return results
+
+
+def _line_bounds(buf, pos: int, size: int) -> Tuple[int, int]:
+    start = buf.rfind(b"\n", 0, pos) + 1
+    end = buf.find(b"\n", pos)
+    return start, size if end == -1 else end
+
+
+def _decode(line: bytes) -> str:
+    return line.rstrip(b"\r").decode("utf-8", errors="replace")
+
+
+def search_file(
+    display_path: str,
+    pattern: bytes,
+    flags: int,
+    output_mode: str,
+    before: int = 0,
+    after: int = 0,
+    line_numbers: bool = False,
+    multiline: bool = False,
+    with_filename: bool = True,
+) -> List[str]:
+    """Search one file and return its output lines in ripgrep's format."""
+    try:
+        with open(display_path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            if size == 0:
+                return []
+            if b"\x00" in f.read(BINARY_SNIFF_BYTES):
+                return []
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+                return _search_buffer(
+                    display_path,
+                    buf,
+                    size,
+                    re.compile(pattern, flags),
+                    output_mode,
+                    before,
+                    after,
+                    line_numbers,
+                    multiline,
+                    with_filename,
+                )
+    except (OSError, ValueError):
+        return []
+
+
+def _search_buffer(
+    path, buf, size, regex, output_mode, before, after, line_numbers, multiline, with_filename
+):
+    # Collect (start, end) byte ranges of matching lines in file order
+    matched = []
+    pos = 0
+    while pos <= size:
+        m = regex.search(buf, pos)
+        if m is None:
+            break
+        if m.start() == size and (size == 0 or buf[size - 1 : size] == b"\n"):
+            # An empty match after the final newline is not on a line of its own
+            break
+        start, end = _line_bounds(buf, m.start(), size)
+        if multiline:
+            _, end = _line_bounds(buf, max(m.end() - 1, m.start()), size)
+        elif m.end() > end and not regex.search(buf[start:end]):
+            # The match crossed a newline; rg only matches within single lines
+            pos = end + 1
+            continue
+        matched.append((start, end))
+        if output_mode == "files_with_matches":
+            return [path]
+        pos = end + 1
+
+    if not matched:
+        return []
+    if output_mode == "count":
+        return [f"{path}:{len(matched)}" if with_filename else str(len(matched))]
+
+    # Number every line touched by a match, then add context around them
+    lines = {}
+    cursor, cursor_number = 0, 1
+    for start, end in matched:
+        cursor_number += buf[cursor:start].count(b"\n")  # mmap has no count()
+        cursor = start
+        number = cursor_number
+        line_start = start
+        while True:
+            line_end = buf.find(b"\n", line_start, end)
+            line_end = end if line_end == -1 else line_end
+            lines[number] = (":", line_start, line_end)
+            if line_end >= end:
+                break
+            line_start = line_end + 1
+            number += 1
+
+        ctx_end, ctx_number = start - 1, cursor_number
+        for _ in range(before):
+            if ctx_end < 0:
+                break
+            ctx_start = buf.rfind(b"\n", 0, ctx_end) + 1
+            ctx_number -= 1
+            lines.setdefault(ctx_number, ("-", ctx_start, ctx_end))
+            ctx_end = ctx_start - 1
+
+        ctx_start, ctx_number = end + 1, number
+        for _ in range(after):
+            if ctx_start >= size:
+                break
+            ctx_end = buf.find(b"\n", ctx_start)
+            ctx_end = size if ctx_end == -1 else ctx_end
+            ctx_number += 1
+            lines.setdefault(ctx_number, ("-", ctx_start, ctx_end))
+            ctx_start = ctx_end + 1
+
+    output = []
+    previous = None
+    for n in sorted(lines):
+        sep, start, end = lines[n]
+        if (before or after) and previous is not None and previous != n - 1:
+            output.append("--")
+        prefix = f"{path}{sep}" if with_filename else ""
+        if line_numbers:
+            prefix += f"{n}{sep}"
+        output.append(prefix + _decode(buf[start:end]))
+        previous = n
+    return output
+
+
+def _search_batch(paths, *args):
+    return [search_file(path, *args) for path in paths]
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Forking this multithreaded process could copy locks held by other
+            # threads into the workers, so they start from a clean interpreter
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+            _pool = ProcessPoolExecutor(max_workers=MAX_WORKERS, mp_context=context)
+        return _pool
+
+
+def _shutdown_pool():
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+atexit.register(_shutdown_pool)
+
+
+def search_files(
+    paths: Iterable[str],
+    pattern: str,
+    on_line: Callable[[str], bool],
+    output_mode: str = "files_with_matches",
+    ignore_case: bool = False,
+    multiline: bool = False,
+    before: int = 0,
+    after: int = 0,
+    line_numbers: bool = False,
+    with_filename: bool = True,
+    timeout: Optional[float] = None,
+) -> Tuple[int, str, bool]:
+    """Search paths and feed output lines to on_line until it returns True.
+
+    Mirrors the Grep tool's ripgrep streaming contract and returns
+    (returncode, stderr, stopped_early): 0 on matches, 1 without, 2 on error.
+    Raises TimeoutError when timeout (seconds) elapses.
+    """
+    flags = re.MULTILINE
+    if ignore_case:
+        flags |= re.IGNORECASE
+    if multiline:
+        flags |= re.DOTALL
+    try:
+        raw = pattern.encode("utf-8")
+        re.compile(raw, flags)
+    except re.error as e:
+        return 2, f"regex parse error: {e}", False
+
+    deadline = time.monotonic() + timeout if timeout else None
+    args = (raw, flags, output_mode, before, after, line_numbers, multiline, with_filename)
+    paths = list(paths)
+    found = False
+    separate = bool(before or after) and output_mode == "content"
+
+    def emit(file_lines) -> bool:
+        nonlocal found
+        if not file_lines:
+            return False
+        if separate and found and on_line("--"):
+            return True
+        found = True
+        for line in file_lines:
+            if on_line(line):
+                return True
+        return False
+
+    if len(paths) < PARALLEL_MIN_FILES or MAX_WORKERS < 2:
+        for path in paths:
+            if deadline and time.monotonic() > deadline:
+                raise TimeoutError("search timed out")
+            if emit(search_file(path, *args)):
+                return 0, "", True
+        return (0 if found else 1), "", False
+
+    # Keep a bounded window of batches in flight and consume them in order
+    pool = _get_pool()
+    batches = [paths[i : i + FILES_PER_TASK] for i in range(0, len(paths), FILES_PER_TASK)]
+    pending = deque()
+    next_batch = 0
+    try:
+        while next_batch < len(batches) or pending:
+            while next_batch < len(batches) and len(pending) < MAX_WORKERS * 2:
+                pending.append(pool.submit(_search_batch, batches[next_batch], *args))
+                next_batch += 1
+            remaining = deadline - time.monotonic() if deadline else None
+            if remaining is not None and remaining <= 0:
+                raise TimeoutError("search timed out")
+            try:
+                results = pending.popleft().result(timeout=remaining)
+            except Exception as e:
+                if deadline and time.monotonic() > deadline:
+                    raise TimeoutError("search timed out") from e
+                raise
+            for file_lines in results:
+                if emit(file_lines):
+                    return 0, "", True
+    finally:
+        for future in pending:
+            future.cancel()
+    return (0 if found else 1), "", False
+
+
+if __name__ == "__main__":
+    # Benchmark against rg on a synthetic tree
+    import random
+    import shutil
+    import subprocess
+    import tempfile
+
+    root = tempfile.mkdtemp(prefix="py_search_bench_")
+    rng = random.Random(0)
+    words = ["alpha", "beta", "gamma", "delta", "config", "handler", "value", "return"]
+    try:
+        for d in range(40):
+            dir_path = os.path.join(root, f"pkg{d}", "sub")
+            os.makedirs(dir_path)
+            for f_idx in range(50):
+                with open(os.path.join(dir_path, f"mod{f_idx}.py"), "w") as f:
+                    for line_no in range(400):
+                        line = " ".join(rng.choice(words) for _ in range(8))
+                        if rng.random() < 0.001:
+                            line += " NEEDLE_TOKEN"
+                        f.write(f"{line_no}: {line}\n")
+        print(f"Synthetic tree: 2000 files x 400 lines in {root}")
+
+        for mode in ("files_with_matches", "count", "content"):
+            collected: List[str] = []
+            start = time.perf_counter()
+            files = list_files(root)
+            search_files(files, r"NEEDLE_\w+", collected.append, output_mode=mode)
+            py_time = time.perf_counter() - start
+            print(f"py_search {mode:<20} {py_time * 1000:8.1f} ms  {len(collected)} lines")
+
+            if shutil.which("rg"):
+                flag = {"files_with_matches": ["-l"], "count": ["-c"], "content": []}[mode]
+                start = time.perf_counter()
+                out = subprocess.run(
+                    ["rg", "--color=never", *flag, r"NEEDLE_\w+", root],
+                    capture_output=True,
+                    text=True,
+                ).stdout.splitlines()
+                rg_time = time.perf_counter() - start
+                print(f"rg        {mode:<20} {rg_time * 1000:8.1f} ms  {len(out)} lines")
+                if sorted(out) != sorted(collected):
+                    print("  ! outputs differ")
+            else:
+                print("rg not installed; skipping comparison")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
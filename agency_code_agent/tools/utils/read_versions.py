@@ -0,0 +1,142 @@
+"""
+Per-session record of the last version of each file returned by Read.
+
+Read stores the content hash (and, for files up to MAX_VERSION_BYTES, the
+bytes) of every file it returns in full; a partial page is not a version the
+agent has seen. When the agent asks to re-read a file with
+diff=True, Read compares the file against that version: an unchanged file
+costs one stat (or one hash), and a changed one is returned as a unified diff
+instead of the whole page. Stored bytes are bounded by an LRU on total size.
+"""
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from difflib import SequenceMatcher
+from typing import List, Optional, Tuple
+
+# Constants
+MAX_VERSION_BYTES = 4 * 1024 * 1024  # Larger files are not kept for diffing
+MAX_TOTAL_BYTES = 32 * 1024 * 1024
+MAX_DIFF_LINE_CHARS = 2000
+
+CONTEXT_KEY = "read_versions"
+
+
+def _key(st: os.stat_result) -> Tuple[int, int, int, int]:
+    return (st.st_dev, st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+def content_hash(data) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+class ReadVersions:
+    """LRU of abs path -> (stat key, content hash, bytes) of the version last returned."""
+
+    def __init__(self, max_bytes: int = MAX_TOTAL_BYTES, max_entry_bytes: int = MAX_VERSION_BYTES):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self.total_bytes = 0
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[tuple, str, bytes]]" = OrderedDict()
+
+    def get(self, path: str) -> Optional[Tuple[tuple, str, bytes]]:
+        path = os.path.abspath(path)
+        with self._lock:
+            entry = self._entries.get(path)
+            if entry is not None:
+                self._entries.move_to_end(path)
+            return entry
+
+    def unchanged(self, path: str, st: os.stat_result) -> bool:
+        """True if path still has the stat key of the version last returned."""
+        entry = self.get(path)
+        return entry is not None and entry[0] == _key(st)
+
+    def remember(self, path: str, st: os.stat_result, data: bytes, digest: Optional[str] = None):
+        """Record data (the whole file, as described by st) as the version last returned."""
+        path = os.path.abspath(path)
+        if len(data) > self.max_entry_bytes:
+            self.forget(path)
+            return
+        entry = (_key(st), digest or content_hash(data), data)
+        with self._lock:
+            old = self._entries.pop(path, None)
+            if old is not None:
+                self.total_bytes -= len(old[2])
+            self._entries[path] = entry
+            self.total_bytes += len(data)
+            while self.total_bytes > self.max_bytes:
+                _, (_, _, evicted) = self._entries.popitem(last=False)
+                self.total_bytes -= len(evicted)
+
+    def forget(self, path: str):
+        path = os.path.abspath(path)
+        with self._lock:
+            old = self._entries.pop(path, None)
+            if old is not None:
+                self.total_bytes -= len(old[2])
+
+
+_global_versions = ReadVersions()
+
+
+def get_read_versions(context=None) -> ReadVersions:
+    """Return the versions for the agent session in context (or the global fallback)."""
+    if context is None:
+        return _global_versions
+    versions = context.get(CONTEXT_KEY, None)
+    if versions is None:
+        versions = ReadVersions()
+        context.set(CONTEXT_KEY, versions)
+    return versions
+
+
+def _range(start: int, length: int) -> str:
+    """Format a hunk range the way difflib.unified_diff does."""
+    beginning = start + 1
+    if length == 1:
+        return f"{beginning}"
+    if length == 0:
+        beginning -= 1
+    return f"{beginning},{length}"
+
+
+def line_diff(old: List[str], new: List[str], context: int = 3) -> List[str]:
+    """Unified diff hunks (without file headers) between two lists of lines.
+
+    The common prefix and suffix are skipped before difflib runs, so an edit
+    in a large file only costs a comparison of the changed region.
+    """
+    prefix = 0
+    limit = min(len(old), len(new))
+    while prefix < limit and old[prefix] == new[prefix]:
+        prefix += 1
+    suffix = 0
+    while suffix < limit - prefix and old[-1 - suffix] == new[-1 - suffix]:
+        suffix += 1
+
+    # Keep enough of the common lines around the change for the context
+    start = max(0, prefix - context)
+    trim = max(0, suffix - context)
+    old_part = old[start : len(old) - trim]
+    new_part = new[start : len(new) - trim]
+
+    lines = []
+    matcher = SequenceMatcher(None, old_part, new_part)
+    for group in matcher.get_grouped_opcodes(context):
+        first, last = group[0], group[-1]
+        old_range = _range(start + first[1], last[2] - first[1])
+        new_range = _range(start + first[3], last[4] - first[3])
+        lines.append(f"@@ -{old_range} +{new_range} @@")
+        for tag, i1, i2, j1, j2 in group:
+            if tag == "equal":
+                lines.extend(" " + line[:MAX_DIFF_LINE_CHARS] for line in old_part[i1:i2])
+                continue
+            if tag in ("replace", "delete"):
+                lines.extend("-" + line[:MAX_DIFF_LINE_CHARS] for line in old_part[i1:i2])
+            if tag in ("replace", "insert"):
+                lines.extend("+" + line[:MAX_DIFF_LINE_CHARS] for line in new_part[j1:j2])
+    return lines
@@ -0,0 +1,348 @@
+"""
+Long-lived bash process backing the Bash tool's persistent shell session.
+
+Each agent session gets one bash process, driven over pipes. A command is
+written to a script file and sourced by the shell, so `cd`, exported
+variables and activated virtualenvs carry over to the next call, and
+heredocs or quotes in the command never interfere with the protocol. After
+the script, the shell prints a marker line with a per-session token, the
+exit status and the working directory; everything before the marker is the
+command's output. stdout and stderr share one pipe, so they arrive
+interleaved in the order they were written, and are read incrementally into
+an OutputBuffer whose size does not depend on how much the command prints.
+Each command's resource usage is measured as described in command_metrics.
+
+Commands of one session run one at a time, in arrival order, through the
+session's CommandQueue; callers wait for their turn instead of being turned
+away.
+
+A command that times out or is cancelled takes the shell down with it: the
+shell's whole session is killed (see process_limits) and a fresh shell is
+started in the last known directory.
+A shell that exits (e.g. the command ran `exit`) is restarted on the next
+call.
+"""
+
+import atexit
+import os
+import selectors
+import shlex
+import subprocess
+import tempfile
+import threading
+import time
+import uuid
+import weakref
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+from .command_metrics import ResourceUsage, parse_times, peak_rss_bytes
+from .output_buffer import OutputBuffer
+from .process_limits import kill_session, popen_options, session_members, ulimit_script
+
+# Constants
+READ_CHUNK_SIZE = 64 * 1024
+EXIT_POLL_INTERVAL = 0.25  # How often to check whether the shell itself died
+RSS_SAMPLE_INTERVAL = 0.25  # How often to sample the peak RSS of running commands
+SHELL_COMMAND = ["/bin/bash", "--noprofile", "--norc"]
+
+CONTEXT_KEY = "shell_session"
+
+_sessions: "weakref.WeakSet[ShellSession]" = weakref.WeakSet()
+_sessions_lock = threading.Lock()
+
+
+class CommandQueue:
+    """FIFO admission of one caller at a time; waiters give up after a timeout."""
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._waiting: "deque[object]" = deque()
+        self._busy = False
+
+    def acquire(self, timeout: Optional[float]) -> bool:
+        token = object()
+        with self._condition:
+            self._waiting.append(token)
+            admitted = self._condition.wait_for(
+                lambda: not self._busy and self._waiting[0] is token, timeout
+            )
+            self._waiting.remove(token)
+            if admitted:
+                self._busy = True
+            else:
+                # The next waiter may now be at the head of the queue
+                self._condition.notify_all()
+            return admitted
+
+    def release(self):
+        with self._condition:
+            self._busy = False
+            self._condition.notify_all()
+
+    def waiting(self) -> int:
+        """Number of callers waiting for their turn."""
+        with self._condition:
+            return len(self._waiting)
+
+
+class ShellSession:
+    """One bash process whose state persists across commands."""
+
+    def __init__(self, cwd: Optional[str] = None, wrapper: Optional[List[str]] = None):
+        # wrapper prefixes the shell command, e.g. a sandbox launcher
+        self.cwd = cwd or os.getcwd()
+        self.wrapper = list(wrapper or [])
+        self.queue = CommandQueue()
+        self.id = uuid.uuid4().hex[:12]
+        self._lock = threading.Lock()
+        self._process: Optional[subprocess.Popen] = None
+        self._token = uuid.uuid4().hex
+        self._marker = f"\x1e{self._token} ".encode()
+        self._script_dir = tempfile.mkdtemp(prefix="agency_code_shell_")
+        self._script_path = os.path.join(self._script_dir, "command.sh")
+        self._times_path = os.path.join(self._script_dir, "times")
+        self._env_path = os.path.join(self._script_dir, "environ")
+        self._children_cpu = (0.0, 0.0)  # The shell's children's user and sys time so far
+        with _sessions_lock:
+            _sessions.add(self)
+
+    def alive(self) -> bool:
+        return self._process is not None and self._process.poll() is None
+
+    def _start(self):
+        if not os.path.isdir(self.cwd):
+            self.cwd = os.getcwd()
+        # The variables of a previous shell died with it
+        try:
+            os.unlink(self._env_path)
+        except OSError:
+            pass
+        self._process = subprocess.Popen(
+            self.wrapper + SHELL_COMMAND,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            cwd=self.cwd,
+            env=os.environ.copy(),
+            **popen_options(),  # Own session, killed as a unit
+        )
+        limits = ulimit_script()
+        if limits:
+            # Read before any command, so everything the shell starts is limited
+            try:
+                self._process.stdin.write(f"{limits}\n".encode())
+                self._process.stdin.flush()
+            except OSError:
+                pass
+        self._children_cpu = (0.0, 0.0)
+
+    def _kill(self):
+        process, self._process = self._process, None
+        if process is None:
+            return
+        kill_session(process.pid)
+        process.wait()
+        for stream in (process.stdin, process.stdout):
+            try:
+                stream.close()
+            except OSError:
+                pass
+
+    def run(self, command: str, timeout: float) -> Tuple[int, OutputBuffer, str, ResourceUsage]:
+        """Run command in the session and return (exit code, output, status, usage).
+
+        status is "ok", "timeout" (the shell was killed and restarted) or
+        "exited" (the command ended the shell; the next call starts a new one).
+        CPU time is only known when status is "ok".
+        """
+        started = time.monotonic()
+        with self._lock:
+            if not self.alive():
+                self._kill()
+                self._start()
+            with open(self._script_path, "w", encoding="utf-8") as script:
+                script.write(command)
+                script.write("\n")
+
+            # Discard anything left behind by background processes of earlier commands
+            self._drain()
+
+            # `times` reports the CPU time of the shell's children so far and
+            # `env -0` its exported variables, for background jobs to start with
+            protocol = (
+                f". {shlex.quote(self._script_path)} < /dev/null\n"
+                f"__agency_code_status=$?; times > {shlex.quote(self._times_path)}\n"
+                f"command env -0 > {shlex.quote(self._env_path)} 2> /dev/null\n"
+                f"printf '\\036{self._token} %d %s\\n' \"$__agency_code_status\" \"$PWD\"; unset __agency_code_status\n"
+            )
+            try:
+                self._process.stdin.write(protocol.encode())
+                self._process.stdin.flush()
+            except (BrokenPipeError, OSError):
+                self._kill()
+                return 1, OutputBuffer(), "exited", ResourceUsage(time.monotonic() - started)
+
+            try:
+                code, output, status, peak_rss = self._collect(started + timeout)
+            except BaseException:
+                # Cancelled mid-command: take the command's processes down too
+                self._kill()
+                raise
+            user, system = self._cpu_since_last_command() if status == "ok" else (None, None)
+            usage = ResourceUsage(time.monotonic() - started, user, system, peak_rss, output.total_bytes)
+            return code, output, status, usage
+
+    def environ(self) -> Dict[str, str]:
+        """Exported variables of the shell as of its last command.
+
+        Before the shell has run a command (or if its variables could not be
+        read) this is the environment the shell was started with.
+        """
+        try:
+            with open(self._env_path, "rb") as file:
+                data = file.read()
+        except OSError:
+            data = b""
+        # A file without the final NUL is still being written
+        if not data.endswith(b"\0"):
+            return os.environ.copy()
+        env = {}
+        for item in data[:-1].split(b"\0"):
+            name, sep, value = item.partition(b"=")
+            if sep and name and name != b"_":
+                env[os.fsdecode(name)] = os.fsdecode(value)
+        return env
+
+    def _cpu_since_last_command(self) -> Tuple[Optional[float], Optional[float]]:
+        try:
+            with open(self._times_path, encoding="utf-8") as file:
+                times = parse_times(file.read())
+        except OSError:
+            times = None
+        if times is None:
+            return None, None
+        previous, self._children_cpu = self._children_cpu, times
+        return max(0.0, times[0] - previous[0]), max(0.0, times[1] - previous[1])
+
+    def _sample_peak_rss(self, peak: Optional[int]) -> Optional[int]:
+        pids = [pid for pid in session_members(self._process.pid) if pid != self._process.pid]
+        sample = peak_rss_bytes(pids)
+        if sample is None:
+            return peak
+        return sample if peak is None else max(peak, sample)
+
+    def _drain(self):
+        with selectors.DefaultSelector() as selector:
+            selector.register(self._process.stdout, selectors.EVENT_READ)
+            while selector.select(timeout=0):
+                if not os.read(self._process.stdout.fileno(), READ_CHUNK_SIZE):
+                    break
+
+    def _collect(self, deadline: float) -> Tuple[int, OutputBuffer, str, Optional[int]]:
+        """Stream output into a bounded buffer until the marker line, exit or the deadline.
+
+        Also returns the peak RSS of the command's processes seen while sampling.
+        """
+        fd = self._process.stdout.fileno()
+        output = OutputBuffer()
+        # Name the shell rather than the script file in error messages
+        script_tag = self._script_path.encode() + b":"
+        # Bytes held back so a marker or script path split across reads is still found
+        holdback = max(len(self._marker), len(script_tag)) - 1
+        pending = b""
+        peak_rss = None
+        next_sample = time.monotonic() + RSS_SAMPLE_INTERVAL
+        with selectors.DefaultSelector() as selector:
+            selector.register(fd, selectors.EVENT_READ)
+            while True:
+                now = time.monotonic()
+                if now >= next_sample:
+                    peak_rss = self._sample_peak_rss(peak_rss)
+                    next_sample = now + RSS_SAMPLE_INTERVAL
+                remaining = deadline - now
+                if remaining <= 0:
+                    output.write(pending)
+                    self._kill()
+                    return 124, output, "timeout", peak_rss
+                ready = selector.select(timeout=min(remaining, EXIT_POLL_INTERVAL, next_sample - now))
+                chunk = os.read(fd, READ_CHUNK_SIZE) if ready else None
+                if chunk == b"" or (chunk is None and self._process.poll() is not None):
+                    # The command ended the shell; background children may still
+                    # hold the pipe open, so only take what is already buffered
+                    output.write(pending)
+                    while chunk is None and selector.select(timeout=0):
+                        more = os.read(fd, READ_CHUNK_SIZE)
+                        if not more:
+                            break
+                        output.write(more)
+                    process = self._process
+                    self._kill()
+                    return process.returncode, output, "exited", peak_rss
+                if chunk is None:
+                    continue
+
+                data = (pending + chunk).replace(script_tag, b"bash:")
+                start = data.find(self._marker)
+                if start == -1:
+                    cut = max(0, len(data) - holdback)
+                    output.write(data[:cut])
+                    pending = data[cut:]
+                    continue
+
+                output.write(data[:start])
+                line = data[start + len(self._marker) :]
+                while b"\n" not in line:
+                    more = os.read(fd, READ_CHUNK_SIZE)
+                    if not more:
+                        break
+                    line += more
+                status, _, cwd = line.split(b"\n", 1)[0].decode("utf-8", "replace").partition(" ")
+                if cwd:
+                    self.cwd = cwd
+                try:
+                    code = int(status)
+                except ValueError:
+                    code = 1
+                return code, output, "ok", peak_rss
+
+    def close(self):
+        with self._lock:
+            self._kill()
+        for path in (self._script_path, self._times_path, self._env_path):
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+        try:
+            os.rmdir(self._script_dir)
+        except OSError:
+            pass
+
+
+def _close_all():
+    with _sessions_lock:
+        sessions = list(_sessions)
+    for session in sessions:
+        session.close()
+
+
+atexit.register(_close_all)
+
+_global_session: Optional[ShellSession] = None
+_global_session_lock = threading.Lock()
+
+
+def get_shell_session(context=None, wrapper: Optional[List[str]] = None) -> ShellSession:
+    """Return the shell for the agent session in context (or the global fallback)."""
+    global _global_session
+    if context is None:
+        with _global_session_lock:
+            if _global_session is None:
+                _global_session = ShellSession(wrapper=wrapper)
+        return _global_session
+    session = context.get(CONTEXT_KEY, None)
+    if session is None:
+        session = ShellSession(wrapper=wrapper)
+        context.set(CONTEXT_KEY, session)
+    return session
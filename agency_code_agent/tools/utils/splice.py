@@ -0,0 +1,49 @@
+"""
+Atomic byte-level splicing of a file, used by the Edit tool's line-range mode.
+
+The unchanged parts are streamed from a buffer holding the original file (an
+mmap) into a temp file next to the target in fixed-size chunks, with the
+replacements written in between, and the temp file then atomically replaces
+the target. Memory use is bounded by the chunk size, not the file size.
+"""
+
+import os
+import stat
+import tempfile
+from typing import List, Tuple
+
+# Constants
+COPY_CHUNK_SIZE = 1024 * 1024
+
+Splice = Tuple[int, int, bytes]  # (start, end, replacement)
+
+
+def _copy_range(buf, start: int, end: int, out):
+    for pos in range(start, end, COPY_CHUNK_SIZE):
+        out.write(buf[pos : min(end, pos + COPY_CHUNK_SIZE)])
+
+
+def splice_file(path: str, buf, size: int, splices: List[Splice], mode: int):
+    """Write buf[:size] with sorted, disjoint splices applied over path, atomically.
+
+    Symlinks are followed so the link itself is preserved; the new file gets
+    the permission bits of mode.
+    """
+    target = os.path.realpath(path)
+    fd, temp_path = tempfile.mkstemp(
+        dir=os.path.dirname(target), prefix=f".{os.path.basename(target)}.", suffix=".tmp"
+    )
+    try:
+        with os.fdopen(fd, "wb") as out:
+            last = 0
+            for start, end, replacement in splices:
+                _copy_range(buf, last, start, out)
+                out.write(replacement)
+                last = end
+            _copy_range(buf, last, size, out)
+        os.chmod(temp_path, stat.S_IMODE(mode))
+        os.replace(temp_path, target)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
@@ -0,0 +1,144 @@
+"""
+Post-edit syntax validation for the file-mutating tools.
+
+After a tool writes a .py, .json, .ipynb or .toml file, the new contents are
+parsed in-process (ast, json, tomllib) so a broken file is reported in the
+tool result instead of on the next Bash round-trip. Results are cached by a
+hash of the contents, so re-checking an unchanged version is free, and the
+files of one multi-file transaction are checked together on a thread pool.
+
+Set AGENCY_CODE_SYNTAX_CHECK=0 to turn validation off.
+"""
+
+import ast
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+try:
+    import tomllib
+except ImportError:  # pragma: no cover - Python < 3.11
+    try:
+        import tomli as tomllib  # type: ignore[no-redef]
+    except ImportError:
+        tomllib = None
+
+# Constants
+SYNTAX_CHECK_ENABLED = os.getenv("AGENCY_CODE_SYNTAX_CHECK", "1").lower() not in ("0", "false", "no")
+MAX_CHECK_BYTES = 4 * 1024 * 1024  # Larger files are not re-read just to be checked
+MAX_CACHED_RESULTS = 1024
+MAX_CHECK_WORKERS = 4
+
+_results: "OrderedDict[Tuple[str, str], Optional[str]]" = OrderedDict()
+_results_lock = threading.Lock()
+
+
+def _check_python(text: str) -> Optional[str]:
+    try:
+        ast.parse(text)
+    except SyntaxError as e:
+        return f"line {e.lineno}, column {e.offset}: SyntaxError: {e.msg}"
+    except ValueError as e:
+        # e.g. null bytes, which have no position
+        return f"invalid Python source: {e}"
+    return None
+
+
+def _check_json(text: str) -> Optional[str]:
+    try:
+        json.loads(text)
+    except json.JSONDecodeError as e:
+        return f"line {e.lineno}, column {e.colno}: invalid JSON: {e.msg}"
+    return None
+
+
+def _check_notebook(text: str) -> Optional[str]:
+    try:
+        notebook = json.loads(text)
+    except json.JSONDecodeError as e:
+        return f"line {e.lineno}, column {e.colno}: invalid notebook JSON: {e.msg}"
+    if not isinstance(notebook, dict) or not isinstance(notebook.get("cells"), list):
+        return "invalid notebook: no 'cells' list"
+    for number, cell in enumerate(notebook["cells"]):
+        if not isinstance(cell, dict) or "cell_type" not in cell or "source" not in cell:
+            return f"invalid notebook: cell {number} has no cell_type or source"
+    return None
+
+
+def _check_toml(text: str) -> Optional[str]:
+    try:
+        tomllib.loads(text)
+    except tomllib.TOMLDecodeError as e:
+        # The message already ends with "(at line N, column M)"
+        return f"invalid TOML: {e}"
+    return None
+
+
+CHECKERS = {
+    ".py": _check_python,
+    ".json": _check_json,
+    ".ipynb": _check_notebook,
+}
+if tomllib is not None:
+    CHECKERS[".toml"] = _check_toml
+
+
+def check_syntax(path: str, text: Optional[str] = None) -> Optional[str]:
+    """Return a description of the first syntax error in path, or None.
+
+    text is the file's new contents; when omitted, the file is read from
+    disk unless it is larger than MAX_CHECK_BYTES. Unsupported file types
+    and unreadable files are not checked.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    checker = CHECKERS.get(extension)
+    if checker is None or not SYNTAX_CHECK_ENABLED:
+        return None
+    if text is None:
+        try:
+            if os.path.getsize(path) > MAX_CHECK_BYTES:
+                return None
+            with open(path, "r", encoding="utf-8") as file:
+                text = file.read()
+        except (OSError, UnicodeDecodeError):
+            return None
+
+    key = (extension, hashlib.sha256(text.encode("utf-8", "surrogatepass")).hexdigest())
+    with _results_lock:
+        if key in _results:
+            _results.move_to_end(key)
+            return _results[key]
+    result = checker(text)
+    with _results_lock:
+        _results[key] = result
+        while len(_results) > MAX_CACHED_RESULTS:
+            _results.popitem(last=False)
+    return result
+
+
+def check_files(files: List[Tuple[str, Optional[str]]]) -> Dict[str, Optional[str]]:
+    """Check several (path, text) pairs on a thread pool; returns path -> error or None."""
+    checked = [(path, text) for path, text in files if os.path.splitext(path)[1].lower() in CHECKERS]
+    if not checked or not SYNTAX_CHECK_ENABLED:
+        return {}
+    if len(checked) == 1:
+        return {checked[0][0]: check_syntax(*checked[0])}
+    with ThreadPoolExecutor(max_workers=min(MAX_CHECK_WORKERS, len(checked))) as pool:
+        results = pool.map(lambda item: check_syntax(*item), checked)
+        return {path: error for (path, _), error in zip(checked, results)}
+
+
+def syntax_report(files: List[Tuple[str, Optional[str]]]) -> str:
+    """Text to append to a tool result: empty when every checked file parses."""
+    errors = [(path, error) for path, error in check_files(files).items() if error]
+    if not errors:
+        return ""
+    if len(errors) == 1:
+        header = "Warning: the file was written but does not parse:"
+    else:
+        header = f"Warning: {len(errors)} files were written but do not parse:"
+    return "\n\n" + "\n".join([header] + [f"- {path}: {error}" for path, error in errors])
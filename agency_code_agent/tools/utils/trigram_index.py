@@ -0,0 +1,502 @@
+"""
+Persistent trigram index used by the Grep tool to narrow candidate files.
+
+Each indexed file is reduced to the set of (ASCII-lowercased) byte trigrams it
+contains. A regex query is reduced to the literal trigrams every match must
+contain, so only files holding all of them need to be searched. The index is
+kept fresh incrementally by (mtime_ns, size) and pickled under the cache dir
+as a snapshot plus an append-only log of later changes.
+
+Indexing a whole tree for the first time runs on a background thread; until
+it finishes, searches fall back to scanning every file.
+"""
+
+import bisect
+import hashlib
+import os
+import pickle
+import threading
+import uuid
+from array import array
+from itertools import chain
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+try:
+    from re import _parser as sre_parse  # Python 3.11+
+except ImportError:  # pragma: no cover - older interpreters
+    import sre_parse  # type: ignore[no-redef]
+
+# Constants
+CACHE_DIR = os.getenv(
+    "AGENCY_CODE_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "agency_code"),
+)
+INDEX_VERSION = 3
+MAX_INDEXED_FILE_SIZE = 8 * 1024 * 1024  # Larger files are always searched
+MAX_ALTERNATIVES = 32  # Cap on OR-branches kept while analysing a regex
+# Changed files tokenized during a search; more are left to a background build
+MAX_INLINE_REFRESH = int(os.getenv("AGENCY_CODE_GREP_INDEX_INLINE_FILES", "500"))
+BUILD_SAVE_INTERVAL = 2000  # Files tokenized by the background build between saves
+COMPACT_RATIO = 1  # Rewrite the snapshot once the log has this many records per file
+MIN_COMPACT_RECORDS = 10000
+DEAD_PURGE_RATIO = 0.25  # Purge ids of removed files once they are this share of live files
+
+_indexes: Dict[str, "TrigramIndex"] = {}
+_indexes_lock = threading.Lock()
+
+
+def _trigrams_of(data: bytes) -> Set[bytes]:
+    """Return the set of ASCII-lowercased trigrams contained in data."""
+    data = data.lower()
+    return {data[i : i + 3] for i in range(len(data) - 2)}
+
+
+def _literal_alternatives(
+    items, ignore_case: bool
+) -> Optional[List[List[str]]]:
+    """Reduce a parsed regex sequence to OR-of-AND literal requirements.
+
+    Returns a list of alternatives; each alternative is a list of literal
+    strings that all appear in any match of that alternative. An empty
+    alternative means "no requirement". None means the analysis gave up.
+    """
+    alternatives: List[List[str]] = [[]]
+    run = ""
+
+    def flush():
+        nonlocal run
+        if run:
+            for alt in alternatives:
+                alt.append(run)
+        run = ""
+
+    def combine(sub: Optional[List[List[str]]]):
+        nonlocal alternatives
+        if not sub:
+            return
+        product = [alt + s for alt in alternatives for s in sub]
+        if len(product) > MAX_ALTERNATIVES:
+            # Too many combinations; keep the constraints we already have
+            return
+        alternatives = product
+
+    for op, av in items:
+        if op is sre_parse.LITERAL:
+            ch = chr(av)
+            if ignore_case and not ch.isascii():
+                flush()
+            else:
+                run += ch
+        elif op is sre_parse.AT:
+            # Zero-width anchors keep neighbouring literals adjacent
+            continue
+        elif op is sre_parse.SUBPATTERN:
+            flush()
+            group_flags = av[1]
+            combine(
+                _literal_alternatives(
+                    av[-1], ignore_case or bool(group_flags & sre_parse.SRE_FLAG_IGNORECASE)
+                )
+            )
+        elif op is sre_parse.BRANCH:
+            flush()
+            branches: List[List[str]] = []
+            for branch in av[1]:
+                sub = _literal_alternatives(branch, ignore_case)
+                if sub is None:
+                    sub = [[]]
+                branches.extend(sub)
+            if len(branches) <= MAX_ALTERNATIVES:
+                combine(branches)
+        elif op in (
+            sre_parse.MAX_REPEAT,
+            sre_parse.MIN_REPEAT,
+            getattr(sre_parse, "POSSESSIVE_REPEAT", None),
+        ):
+            flush()
+            min_count, _max_count, sub_items = av
+            if min_count >= 1:
+                combine(_literal_alternatives(sub_items, ignore_case))
+        else:
+            flush()
+    flush()
+    return alternatives
+
+
+def required_trigrams(pattern: str, ignore_case: bool = False) -> Optional[List[Set[bytes]]]:
+    """Compute the trigram query for a regex pattern.
+
+    Returns a list of trigram sets (OR of ANDs) or None when the pattern has
+    no usable literal trigrams and a plain scan is required.
+    """
+    if "[[" in pattern:
+        # POSIX classes such as [[:space:]] would parse as a class plus a literal "]"
+        return None
+    try:
+        parsed = sre_parse.parse(pattern)
+    except Exception:
+        # ripgrep syntax that Python's re does not understand (e.g. \p{L})
+        return None
+
+    ignore_case = ignore_case or bool(parsed.state.flags & sre_parse.SRE_FLAG_IGNORECASE)
+    alternatives = _literal_alternatives(list(parsed), ignore_case)
+    if not alternatives:
+        return None
+
+    query: List[Set[bytes]] = []
+    for literals in alternatives:
+        grams: Set[bytes] = set()
+        for literal in literals:
+            grams |= _trigrams_of(literal.encode("utf-8"))
+        if not grams:
+            # One unconstrained branch means every file is a candidate
+            return None
+        query.append(grams)
+    return query
+
+
+def _gram_key(gram: bytes) -> int:
+    return int.from_bytes(gram, "big")
+
+
+class TrigramIndex:
+    """On-disk trigram index for all files below one root directory.
+
+    Postings are sorted arrays of file ids. The bulk of them live in three
+    flat arrays (trigram keys, offsets and ids) that are pickled and loaded
+    as a whole; files indexed since the last compaction add to small
+    per-trigram arrays. File ids only grow, so appending keeps every posting
+    sorted. Ids of removed files stay in the postings (they no longer map to
+    a file) until enough of them pile up to be purged on compaction.
+    """
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+        key = hashlib.sha1(self.root.encode("utf-8")).hexdigest()
+        self.index_path = os.path.join(CACHE_DIR, "trigram", f"{key}.pickle")
+        self.log_path = os.path.join(CACHE_DIR, "trigram", f"{key}.log")
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._builder: Optional[threading.Thread] = None
+        self._generation = uuid.uuid4().hex
+        self._next_id = 0
+        # relpath -> (file_id, mtime_ns, size, whether its trigrams are indexed)
+        self._files: Dict[str, Tuple[int, int, int, bool]] = {}
+        # Compacted postings: ids of _keys[i] are _ids[_offsets[i]:_offsets[i + 1]]
+        self._keys = array("I")
+        self._offsets = array("Q", [0])
+        self._ids = array("I")
+        # Postings of files indexed since the last compaction
+        self._added: Dict[int, array] = {}
+        self._unindexed: Set[int] = set()
+        self._dead_ids = 0
+        # Changes not yet appended to the log: (relpath, mtime_ns, size, trigram
+        # keys as bytes or None), with mtime_ns None for a removed file
+        self._pending: List[tuple] = []
+        self._log_records = 0
+        self._has_snapshot = False
+        self._load()
+
+    @classmethod
+    def for_root(cls, root: str) -> "TrigramIndex":
+        """Return the shared index instance for a root directory."""
+        root = os.path.abspath(root)
+        with _indexes_lock:
+            index = _indexes.get(root)
+            if index is None:
+                index = cls(root)
+                _indexes[root] = index
+            return index
+
+    def _load(self):
+        try:
+            with open(self.index_path, "rb") as f:
+                data = pickle.load(f)
+        except Exception:
+            return
+        if data.get("version") != INDEX_VERSION or data.get("root") != self.root:
+            return
+        self._generation = data["generation"]
+        self._next_id = data["next_id"]
+        self._files = data["files"]
+        self._keys = data["keys"]
+        self._offsets = data["offsets"]
+        self._ids = data["ids"]
+        self._unindexed = data["unindexed"]
+        self._dead_ids = data["dead_ids"]
+        self._has_snapshot = True
+        try:
+            with open(self.log_path, "rb") as f:
+                while True:
+                    generation, records = pickle.load(f)
+                    if generation != self._generation:
+                        # Left over from before the snapshot was last rewritten
+                        continue
+                    for rel, mtime_ns, size, keys in records:
+                        self._remove(rel)
+                        if mtime_ns is not None:
+                            self._add(rel, mtime_ns, size, None if keys is None else array("I", keys))
+                    self._log_records += len(records)
+        except Exception:
+            # EOF, or a chunk cut short by a crash; keep what was replayed
+            pass
+
+    def save(self, compact: bool = False):
+        """Persist the changes made since the last save.
+
+        Changes are appended to a log next to the snapshot; the snapshot is
+        rewritten (and the log emptied) when compact is set or once the log
+        has grown to COMPACT_RATIO times the number of indexed files.
+        """
+        with self._save_lock:
+            with self._lock:
+                if not self._pending and not compact:
+                    return
+                compact = compact or not self._has_snapshot or self._log_records + len(self._pending) > max(
+                    MIN_COMPACT_RECORDS, COMPACT_RATIO * len(self._files)
+                )
+                records, self._pending = self._pending, []
+                if compact:
+                    self._compact()
+                try:
+                    os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+                    if compact:
+                        self._write_snapshot()
+                        return
+                except OSError:
+                    # The index is only an accelerator; never fail a search over it
+                    return
+            try:
+                with open(self.log_path, "ab") as f:
+                    f.write(pickle.dumps((self._generation, records), protocol=pickle.HIGHEST_PROTOCOL))
+                self._log_records += len(records)
+            except OSError:
+                pass
+
+    def _compact(self):
+        """Merge the postings added since the last compaction into the flat arrays."""
+        live = None
+        if self._dead_ids > DEAD_PURGE_RATIO * max(len(self._files), 1):
+            live = {entry[0] for entry in self._files.values()}
+            self._dead_ids = 0
+        keys, offsets, ids = array("I"), array("Q", [0]), array("I")
+        added_keys = sorted(self._added)
+        i = j = 0
+        while i < len(self._keys) or j < len(added_keys):
+            base_key = self._keys[i] if i < len(self._keys) else None
+            added_key = added_keys[j] if j < len(added_keys) else None
+            key = min(k for k in (base_key, added_key) if k is not None)
+            if key == base_key:
+                postings = self._ids[self._offsets[i] : self._offsets[i + 1]]
+                ids.extend(postings if live is None else (x for x in postings if x in live))
+                i += 1
+            if key == added_key:
+                postings = self._added[key]
+                ids.extend(postings if live is None else (x for x in postings if x in live))
+                j += 1
+            if len(ids) > offsets[-1]:
+                keys.append(key)
+                offsets.append(len(ids))
+        self._keys, self._offsets, self._ids = keys, offsets, ids
+        self._added = {}
+
+    def _write_snapshot(self):
+        """Rewrite the snapshot from the in-memory index and start an empty log."""
+        self._generation = uuid.uuid4().hex
+        tmp_path = f"{self.index_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(
+                {
+                    "version": INDEX_VERSION,
+                    "root": self.root,
+                    "generation": self._generation,
+                    "next_id": self._next_id,
+                    "files": self._files,
+                    "keys": self._keys,
+                    "offsets": self._offsets,
+                    "ids": self._ids,
+                    "unindexed": self._unindexed,
+                    "dead_ids": self._dead_ids,
+                },
+                f,
+                protocol=pickle.HIGHEST_PROTOCOL,
+            )
+        os.replace(tmp_path, self.index_path)
+        self._has_snapshot = True
+        # Chunks still in the log carry the old generation and are skipped on load
+        with open(self.log_path, "wb"):
+            pass
+        self._log_records = 0
+
+    def _add(self, rel: str, mtime_ns: int, size: int, keys: Optional[array]):
+        file_id = self._next_id
+        self._next_id += 1
+        self._files[rel] = (file_id, mtime_ns, size, keys is not None)
+        if keys is None:
+            self._unindexed.add(file_id)
+        else:
+            added = self._added
+            for key in keys:
+                postings = added.get(key)
+                if postings is None:
+                    added[key] = array("I", (file_id,))
+                else:
+                    postings.append(file_id)
+
+    def _remove(self, rel: str):
+        entry = self._files.pop(rel, None)
+        if entry is None:
+            return
+        file_id, _, _, indexed = entry
+        if indexed:
+            self._dead_ids += 1
+        else:
+            self._unindexed.discard(file_id)
+
+    def _postings(self, key: int) -> Tuple[int, int, Optional[array]]:
+        """(lo, hi) of key's compacted ids in _ids, and its ids added since."""
+        i = bisect.bisect_left(self._keys, key)
+        if i < len(self._keys) and self._keys[i] == key:
+            lo, hi = self._offsets[i], self._offsets[i + 1]
+        else:
+            lo = hi = 0
+        return lo, hi, self._added.get(key)
+
+    def _contains(self, postings: Tuple[int, int, Optional[array]], file_id: int) -> bool:
+        lo, hi, added = postings
+        if added and file_id >= added[0]:
+            k = bisect.bisect_left(added, file_id)
+            return k < len(added) and added[k] == file_id
+        k = bisect.bisect_left(self._ids, file_id, lo, hi)
+        return k < hi and self._ids[k] == file_id
+
+    def _tokenize(self, full_path: str, size: int) -> Optional[array]:
+        """Return the sorted trigram keys of a file, or None if not indexable."""
+        if size > MAX_INDEXED_FILE_SIZE:
+            return None
+        try:
+            with open(full_path, "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        return array("I", sorted(map(_gram_key, _trigrams_of(data))))
+
+    def _stale(
+        self, rel_paths: List[str], stat: Callable[[str], os.stat_result], prune: bool
+    ) -> List[Tuple[str, os.stat_result]]:
+        """Files of rel_paths whose entry is out of date, with their current stat.
+
+        Entries for files that vanished are dropped; with prune, so is every
+        entry not in rel_paths (deleted, renamed or newly ignored files).
+        """
+        stale = []
+        with self._lock:
+            for rel in rel_paths:
+                try:
+                    st = stat(os.path.join(self.root, rel))
+                except OSError:
+                    if rel in self._files:
+                        self._remove(rel)
+                        self._pending.append((rel, None, None, None))
+                    continue
+                entry = self._files.get(rel)
+                if entry is None or entry[1] != st.st_mtime_ns or entry[2] != st.st_size:
+                    stale.append((rel, st))
+            if prune:
+                listed = set(rel_paths)
+                for rel in [rel for rel in self._files if rel not in listed]:
+                    self._remove(rel)
+                    self._pending.append((rel, None, None, None))
+        return stale
+
+    def _update(self, stale: List[Tuple[str, os.stat_result]]):
+        """Tokenize stale files (outside the lock) and store their new entries."""
+        for rel, st in stale:
+            keys = self._tokenize(os.path.join(self.root, rel), st.st_size)
+            with self._lock:
+                self._remove(rel)
+                self._add(rel, st.st_mtime_ns, st.st_size, keys)
+                self._pending.append(
+                    (rel, st.st_mtime_ns, st.st_size, None if keys is None else keys.tobytes())
+                )
+
+    def _build(self, stale: List[Tuple[str, os.stat_result]]):
+        try:
+            for start in range(0, len(stale), BUILD_SAVE_INTERVAL):
+                self._update(stale[start : start + BUILD_SAVE_INTERVAL])
+                self.save()
+            self.save(compact=True)
+        finally:
+            with self._lock:
+                self._builder = None
+
+    def refresh(
+        self,
+        rel_paths: List[str],
+        stat: Callable[[str], os.stat_result] = os.stat,
+        prune: bool = False,
+    ) -> bool:
+        """Bring the entries for rel_paths up to date by (mtime_ns, size).
+
+        stat may be a cached stat function such as FilesystemSnapshot.stat.
+        Up to MAX_INLINE_REFRESH changed files are tokenized right away; more
+        than that (e.g. the first search of a tree) are indexed by a
+        background thread. Returns False while the index is not usable yet.
+        """
+        with self._lock:
+            if self._builder is not None:
+                return False
+        stale = self._stale(rel_paths, stat, prune)
+        if len(stale) <= MAX_INLINE_REFRESH:
+            self._update(stale)
+            self.save()
+            return True
+        with self._lock:
+            if self._builder is None:
+                self._builder = threading.Thread(
+                    target=self._build, args=(stale,), name="trigram-index-build", daemon=True
+                )
+                self._builder.start()
+        self.save()
+        return False
+
+    def candidates(
+        self,
+        rel_paths: List[str],
+        pattern: str,
+        ignore_case: bool = False,
+        stat: Callable[[str], os.stat_result] = os.stat,
+        prune: bool = False,
+    ) -> Optional[List[str]]:
+        """Narrow rel_paths to files that may contain a match for pattern.
+
+        Returns None when the pattern has no literal trigrams or the index is
+        still being built, in which case the caller should fall back to a
+        plain scan. Pass prune=True when rel_paths lists every file under the
+        root, so entries of files no longer in it are dropped.
+        """
+        query = required_trigrams(pattern, ignore_case)
+        if query is None:
+            return None
+
+        if not self.refresh(rel_paths, stat=stat, prune=prune):
+            return None
+
+        with self._lock:
+            matching_ids: Set[int] = set(self._unindexed)
+            for grams in query:
+                postings = [self._postings(_gram_key(g)) for g in grams]
+                # Walk the shortest posting and probe the others by bisection
+                postings.sort(key=lambda p: p[1] - p[0] + len(p[2] or ()))
+                lo, hi, added = postings[0]
+                for file_id in chain(self._ids[lo:hi], added or ()):
+                    if all(self._contains(other, file_id) for other in postings[1:]):
+                        matching_ids.add(file_id)
+
+            result = []
+            for rel in rel_paths:
+                entry = self._files.get(rel)
+                # Files changed since the refresh are searched rather than missed
+                if entry is None or entry[0] in matching_ids:
+                    result.append(rel)
+            return result
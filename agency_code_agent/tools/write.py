@@ -5,6 +5,12 @@ from pydantic import Field
 
 # Import the global read files registry
 from agency_code_agent.tools.read import _global_read_files
+from agency_code_agent.tools.utils import (
+    checkpoint,
+    get_content_cache,
+    invalidate_path,
+    syntax_report,
+)
 
 
 # Global registry for tracking written files when context is not available
@@ -72,8 +78,11 @@ class Write(BaseTool):
 
             # Write the content to the file
             try:
-                with open(self.file_path, "w", encoding="utf-8") as file:
-                    file.write(self.content)
+                with checkpoint(self.context, "Write", [self.file_path]):
+                    with open(self.file_path, "w", encoding="utf-8") as file:
+                        file.write(self.content)
+                invalidate_path(self.file_path)
+                get_content_cache(self.context).update(self.file_path, self.content)
 
                 # Get file stats
                 file_size = os.path.getsize(self.file_path)
@@ -91,7 +100,8 @@ class Write(BaseTool):
                 # Always mirror into global registry to ensure persistence across tool instances in tests
                 _global_written_files.add(abs_path)
 
-                return f"Successfully {operation} file: {self.file_path}\\nSize: {file_size} bytes, Lines: {line_count}"
+                result = f"Successfully {operation} file: {self.file_path}\\nSize: {file_size} bytes, Lines: {line_count}"
+                return result + syntax_report([(self.file_path, self.content)])
 
             except PermissionError:
                 return f"Error: Permission denied writing to file: {self.file_path}"
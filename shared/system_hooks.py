@@ -23,6 +23,7 @@ class SystemReminderHook(AgentHooks):
         """Called when agent starts processing a user message or is activated."""
         # Inject reminder after every user message
         self._inject_reminder(context, "user_message")
+        self._start_turn(context)
         filter_duplicates(context)
 
     async def on_end(self, context: RunContextWrapper, agent, output) -> None:
@@ -105,6 +106,14 @@ class SystemReminderHook(AgentHooks):
             # Graceful degradation - don't break the flow if reminder injection fails
             print(f"Warning: Failed to inject system reminder: {e}")
 
+    def _start_turn(self, ctx: RunContextWrapper) -> None:
+        """Count user turns in shared context so file checkpoints can be grouped by turn."""
+        try:
+            if hasattr(ctx, "context"):
+                ctx.context.set("user_turn", ctx.context.get("user_turn", 0) + 1)
+        except Exception:
+            pass
+
     def _get_current_todos(self, ctx: RunContextWrapper) -> Optional[list]:
         """Get current todos from shared context."""
         try:
@@ -0,0 +1,5 @@
+import os
+import tempfile
+
+# Read at import by the cache modules; keep test runs out of the user's cache
+os.environ.setdefault("AGENCY_CODE_CACHE_DIR", tempfile.mkdtemp(prefix="agency_code_tests_"))
@@ -0,0 +1,108 @@
+import os
+
+import pytest
+
+from agency_code_agent.tools.utils.checkpoints import BlobStore, CheckpointJournal
+
+
+@pytest.fixture
+def store(tmp_path):
+    return BlobStore(str(tmp_path / "blobs"))
+
+
+def _replace(path, text):
+    """Write the way link=True callers do: a new inode swapped in."""
+    temp = f"{path}.tmp"
+    with open(temp, "w") as f:
+        f.write(text)
+    os.replace(temp, path)
+
+
+def _change(journal, path, text, link=True, tool="Edit", turn=0):
+    operation = journal.record(tool, [path], turn=turn, link=link)
+    if link:
+        _replace(path, text)
+    else:
+        with open(path, "w") as f:
+            f.write(text)
+    journal.finish(operation)
+    return operation
+
+
+@pytest.mark.parametrize("link", [True, False])
+def test_rollback_round_trip(tmp_path, store, link):
+    journal = CheckpointJournal(store)
+    path = str(tmp_path / "f.txt")
+    with open(path, "w") as f:
+        f.write("v1")
+    os.chmod(path, 0o640)
+    created = str(tmp_path / "new.txt")
+
+    _change(journal, path, "v2", link=link, turn=1)
+    _change(journal, path, "v3", link=link, turn=2)
+    operation = journal.record("Write", [created], turn=2)
+    with open(created, "w") as f:
+        f.write("new")
+    journal.finish(operation)
+
+    assert journal.conflicts(journal.select(turns=1)) == []
+    assert journal.rollback(journal.select(turns=1)) == {path: "restored", created: "deleted"}
+    assert open(path).read() == "v2"
+    assert not os.path.exists(created)
+
+    assert journal.rollback(journal.select(operations=1)) == {path: "restored"}
+    assert open(path).read() == "v1"
+    assert os.stat(path).st_mode & 0o777 == 0o640
+    assert journal.operations() == []
+
+
+def test_conflicts_report_outside_changes(tmp_path, store):
+    journal = CheckpointJournal(store)
+    path = str(tmp_path / "f.txt")
+    with open(path, "w") as f:
+        f.write("v1")
+    _change(journal, path, "v2")
+    with open(path, "a") as f:
+        f.write(" and more")
+    assert journal.conflicts(journal.select()) == [path]
+
+
+def test_blob_is_not_shared_with_other_hardlinks(tmp_path, store):
+    journal = CheckpointJournal(store)
+    path = str(tmp_path / "f.txt")
+    other = str(tmp_path / "other.txt")
+    with open(path, "w") as f:
+        f.write("v1")
+    os.link(path, other)
+
+    _change(journal, path, "v2")
+    # Still the old inode: writing through it must not reach the checkpoint
+    with open(other, "w") as f:
+        f.write("changed elsewhere")
+    journal.rollback(journal.select())
+    assert open(path).read() == "v1"
+
+
+def test_discard_keeps_blobs_other_journals_use(tmp_path, store):
+    path = str(tmp_path / "f.txt")
+    same = str(tmp_path / "same.txt")
+    for name in (path, same):
+        with open(name, "w") as f:
+            f.write("v1")
+    first, second = CheckpointJournal(store), CheckpointJournal(store)
+
+    dropped = first.record("Edit", [path], link=True)
+    # Same content, so the same blob, which is still the inode of path
+    kept = second.record("Edit", [same], link=True)
+    _replace(same, "v2")
+    second.finish(kept)
+    first.discard(dropped)
+
+    blob = store.path(kept["files"][same]["digest"])
+    assert os.path.exists(blob)
+    assert not os.path.samefile(blob, path)
+    # The dropped write never happened, so path may still be rewritten in place
+    with open(path, "w") as f:
+        f.write("v3")
+    assert second.rollback([kept]) == {same: "restored"}
+    assert open(same).read() == "v1"
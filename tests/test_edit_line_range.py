@@ -0,0 +1,55 @@
+import os
+
+import pytest
+
+from agency_code_agent.tools import Edit
+from agency_code_agent.tools.read import _global_read_files
+
+
+@pytest.fixture
+def crlf_file(tmp_path):
+    path = tmp_path / "crlf.txt"
+    path.write_bytes(b"a\r\nb\r\nc\r\nd\r\ne")
+    _global_read_files.add(os.path.abspath(str(path)))
+    yield path
+    _global_read_files.discard(os.path.abspath(str(path)))
+
+
+def _edit(path, **kwargs):
+    return Edit(file_path=str(path), **kwargs).run()
+
+
+@pytest.mark.parametrize(
+    "start, end, old, new, expected",
+    [
+        (2, 3, "b\nc", "X\nY\nZ", b"a\r\nX\r\nY\r\nZ\r\nd\r\ne"),
+        # Already CRLF in new_string: not doubled
+        (2, 2, "b", "X\r\nY", b"a\r\nX\r\nY\r\nc\r\nd\r\ne"),
+        (2, 2, "b\r\n", "X\n", b"a\r\nX\r\nc\r\nd\r\ne"),
+        # The unterminated last line stays unterminated
+        (5, 5, "e", "E\nF", b"a\r\nb\r\nc\r\nd\r\nE\r\nF"),
+        (4, 5, "d\ne", "", b"a\r\nb\r\nc\r\n"),
+    ],
+)
+def test_line_range_keeps_crlf(crlf_file, start, end, old, new, expected):
+    result = _edit(crlf_file, start_line=start, end_line=end, old_string=old, new_string=new)
+    assert not result.startswith("Error"), result
+    assert crlf_file.read_bytes() == expected
+
+
+def test_line_range_rejects_stale_text(crlf_file):
+    result = _edit(crlf_file, start_line=2, end_line=3, old_string="b\nX", new_string="Q")
+    assert "does not match" in result
+    assert crlf_file.read_bytes() == b"a\r\nb\r\nc\r\nd\r\ne"
+
+
+def test_line_range_on_lf_file(tmp_path):
+    path = tmp_path / "lf.txt"
+    path.write_bytes(b"one\ntwo\nthree\n")
+    _global_read_files.add(os.path.abspath(str(path)))
+    try:
+        result = _edit(path, start_line=3, old_string="three", new_string="3\n4")
+    finally:
+        _global_read_files.discard(os.path.abspath(str(path)))
+    assert not result.startswith("Error"), result
+    assert path.read_bytes() == b"one\ntwo\n3\n4\n"
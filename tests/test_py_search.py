@@ -0,0 +1,101 @@
+import os
+import shutil
+import subprocess
+
+import pytest
+
+from agency_code_agent.tools.utils import py_search
+
+RG = shutil.which("rg")
+
+
+@pytest.fixture
+def tree(tmp_path):
+    files = {
+        "lf.txt": b"alpha\nbeta\n",
+        "crlf.txt": b"alpha\r\n\r\nbeta",
+        "empty.txt": b"",
+        "a.tsx": b"alpha\n",
+        "src/ui/b.tsx": b"beta alpha\n",
+        "vendor/v.txt": b"alpha\n",
+        "vendor/deep/w.tsx": b"alpha\n",
+    }
+    for rel, data in files.items():
+        path = tmp_path / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+    return str(tmp_path)
+
+
+def _rel(root, paths):
+    return sorted(os.path.relpath(path, root).replace(os.sep, "/") for path in paths)
+
+
+def _search(root, pattern, output_mode, **kwargs):
+    lines = []
+    paths = py_search.list_files(root)
+    rc, _, _ = py_search.search_files(
+        paths, pattern, lambda line: lines.append(line) and False, output_mode=output_mode, **kwargs
+    )
+    prefix = root + os.sep
+    return rc, sorted(line[len(prefix) :] if line.startswith(prefix) else line for line in lines)
+
+
+def _rg(root, *args):
+    result = subprocess.run(["rg", "--no-heading", "--with-filename", *args], cwd=root, capture_output=True)
+    lines = result.stdout.decode("utf-8", errors="replace").splitlines()
+    return result.returncode, sorted(line[2:] if line.startswith("./") else line for line in lines)
+
+
+@pytest.mark.parametrize(
+    "pattern, expected",
+    [
+        # Lines, not the empty match after the final newline
+        ("^", ["a.tsx:1", "crlf.txt:3", "lf.txt:2", "src/ui/b.tsx:1", "vendor/deep/w.tsx:1", "vendor/v.txt:1"]),
+        ("x*", ["a.tsx:1", "crlf.txt:3", "lf.txt:2", "src/ui/b.tsx:1", "vendor/deep/w.tsx:1", "vendor/v.txt:1"]),
+        ("$", ["a.tsx:1", "crlf.txt:3", "lf.txt:2", "src/ui/b.tsx:1", "vendor/deep/w.tsx:1", "vendor/v.txt:1"]),
+        ("beta", ["crlf.txt:1", "lf.txt:1", "src/ui/b.tsx:1"]),
+    ],
+)
+def test_counts(tree, pattern, expected):
+    rc, lines = _search(tree, pattern, "count")
+    assert (rc, lines) == (0, expected)
+    if RG:
+        assert _rg(tree, "--count", "-e", pattern, ".") == (rc, lines)
+
+
+def test_content_and_no_match(tree):
+    rc, lines = _search(tree, "^beta", "content", line_numbers=True)
+    assert rc == 0
+    assert lines == ["crlf.txt:3:beta", "lf.txt:2:beta", "src/ui/b.tsx:1:beta alpha"]
+    assert _search(tree, "gamma", "files_with_matches") == (1, [])
+    if RG:
+        assert _rg(tree, "-n", "-e", "^beta", "lf.txt", "src")[1] == ["lf.txt:2:beta", "src/ui/b.tsx:1:beta alpha"]
+
+
+@pytest.mark.parametrize(
+    "glob, expected",
+    [
+        ("*.tsx", ["a.tsx", "src/ui/b.tsx", "vendor/deep/w.tsx"]),
+        ("**/*.tsx", ["a.tsx", "src/ui/b.tsx", "vendor/deep/w.tsx"]),
+        ("src/**", ["src/ui/b.tsx"]),
+        ("!vendor", ["a.tsx", "crlf.txt", "empty.txt", "lf.txt", "src/ui/b.tsx"]),
+        ("!vendor/", ["a.tsx", "crlf.txt", "empty.txt", "lf.txt", "src/ui/b.tsx"]),
+        ("!*.txt", ["a.tsx", "src/ui/b.tsx", "vendor/deep/w.tsx"]),
+    ],
+)
+def test_globs(tree, glob, expected):
+    assert _rel(tree, py_search.list_files(tree, glob=glob)) == expected
+    if RG:
+        assert _rg(tree, "--files", "--glob", glob)[1] == expected
+
+
+def test_parallel_search_matches_serial(tree, monkeypatch):
+    for n in range(40):
+        with open(os.path.join(tree, f"many{n}.txt"), "w") as f:
+            f.write("alpha\n" * (n % 3))
+    expected = _search(tree, "alpha", "count")
+    monkeypatch.setattr(py_search, "MAX_WORKERS", 2)
+    monkeypatch.setattr(py_search, "PARALLEL_MIN_FILES", 2)
+    monkeypatch.setattr(py_search, "FILES_PER_TASK", 4)
+    assert _search(tree, "alpha", "count") == expected
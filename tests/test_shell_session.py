@@ -0,0 +1,61 @@
+import os
+import time
+
+import pytest
+
+from agency_code_agent.tools.utils.shell_session import ShellSession
+
+
+@pytest.fixture
+def session(tmp_path):
+    session = ShellSession(cwd=str(tmp_path))
+    yield session
+    session.close()
+
+
+def test_state_carries_over(session, tmp_path):
+    (tmp_path / "sub").mkdir()
+    code, output, status, _ = session.run("cd sub && export GREETING=hello", timeout=10)
+    assert (code, status) == (0, "ok")
+    code, output, status, _ = session.run('echo "$GREETING from $PWD"; (exit 3)', timeout=10)
+    assert (code, status) == (3, "ok")
+    assert output.render().strip() == f"hello from {tmp_path / 'sub'}"
+    assert session.environ()["GREETING"] == "hello"
+
+
+def test_timeout_kills_and_restarts_in_last_directory(session, tmp_path):
+    (tmp_path / "sub").mkdir()
+    session.run("cd sub && export GREETING=hello", timeout=10)
+    pid_file = tmp_path / "sleeper.pid"
+
+    started = time.monotonic()
+    code, output, status, _ = session.run(f"echo before; sleep 30 & echo $! > {pid_file}; wait", timeout=1)
+    assert status == "timeout"
+    assert time.monotonic() - started < 10
+    assert "before" in output.render()
+
+    # The command's children went down with the shell
+    pid = int(pid_file.read_text())
+    for _ in range(50):
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            break
+        time.sleep(0.1)
+    else:
+        pytest.fail("background process of the timed-out command survived")
+
+    code, output, status, _ = session.run('pwd; echo "[$GREETING]"', timeout=10)
+    assert (code, status) == (0, "ok")
+    assert output.render().split() == [str(tmp_path / "sub"), "[]"]
+
+
+def test_exit_restarts_on_next_call(session, tmp_path):
+    session.run("cd /", timeout=10)
+    code, _, status, _ = session.run("exit 7", timeout=10)
+    assert status == "exited"
+    assert not session.alive()
+
+    code, output, status, _ = session.run("echo again; pwd", timeout=10)
+    assert (code, status) == (0, "ok")
+    assert output.render().split() == ["again", "/"]
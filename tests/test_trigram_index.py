@@ -0,0 +1,106 @@
+import os
+import random
+import re
+import shutil
+import subprocess
+
+import pytest
+
+from agency_code_agent.tools.utils import trigram_index
+from agency_code_agent.tools.utils.trigram_index import TrigramIndex, required_trigrams
+
+WORDS = ["alpha", "beta", "gamma", "handler", "config", "value", "return", "Parser", "x_y"]
+PATTERNS = [
+    "handler",
+    "alpha.*beta",
+    "(config|Parser)Value",
+    "gamma[12]",
+    "ret(urn|ry)",
+    "x_y[0-9]",
+    "handl",
+    "nothing_like_this",
+]
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(trigram_index, "CACHE_DIR", str(tmp_path / "cache"))
+
+
+def _write_tree(root, rng, files=60):
+    for n in range(files):
+        path = root / f"d{n % 5}" / f"f{n}.txt"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        lines = [" ".join(rng.choice(WORDS) + str(rng.randrange(3)) for _ in range(6)) for _ in range(8)]
+        path.write_text("\n".join(lines) + "\n")
+
+
+def _rel_paths(root):
+    return sorted(
+        os.path.relpath(os.path.join(d, name), root).replace(os.sep, "/")
+        for d, _, names in os.walk(root)
+        for name in names
+    )
+
+
+def _matching(root, pattern, ignore_case=False):
+    """Files with a match, from rg when it is installed."""
+    if shutil.which("rg"):
+        args = ["rg", "--files-with-matches", "--no-messages", "--no-ignore", "--hidden"]
+        if ignore_case:
+            args.append("-i")
+        result = subprocess.run(args + ["-e", pattern, "."], cwd=root, capture_output=True, text=True)
+        return {os.path.normpath(line) for line in result.stdout.splitlines()}
+    regex = re.compile(pattern, re.IGNORECASE if ignore_case else 0)
+    return {rel for rel in _rel_paths(root) if regex.search((root / rel).read_text())}
+
+
+def _assert_superset(index, root, ignore_case=False):
+    rels = _rel_paths(root)
+    for pattern in PATTERNS:
+        candidates = index.candidates(rels, pattern, ignore_case=ignore_case, prune=True)
+        assert candidates is not None
+        assert _matching(root, pattern, ignore_case) <= set(candidates), pattern
+
+
+@pytest.mark.parametrize("ignore_case", [False, True])
+def test_candidates_cover_every_match(tmp_path, ignore_case):
+    root = tmp_path / "tree"
+    _write_tree(root, random.Random(1))
+    index = TrigramIndex(str(root))
+    _assert_superset(index, root, ignore_case)
+    # Some files were pruned, or the index is not doing anything
+    assert len(index.candidates(_rel_paths(root), "nothing_like_this")) < len(_rel_paths(root))
+
+
+def test_candidates_follow_changes_and_reload(tmp_path):
+    rng = random.Random(2)
+    root = tmp_path / "tree"
+    _write_tree(root, rng)
+    index = TrigramIndex(str(root))
+    _assert_superset(index, root)
+
+    rels = _rel_paths(root)
+    for rel in rng.sample(rels, 10):
+        os.unlink(root / rel)
+    for rel in rng.sample(_rel_paths(root), 10):
+        path = root / rel
+        stat = path.stat()
+        path.write_text(path.read_text() + "handler_added\n")
+        # Same size and mtime would look unchanged; make the change visible
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    (root / "d0" / "new.txt").write_text("a fresh handler\n")
+
+    _assert_superset(index, root)
+    assert "d0/new.txt" in index.candidates(_rel_paths(root), "fresh", prune=True)
+    index.save(compact=True)
+
+    # A second instance replays the snapshot and log from disk
+    _assert_superset(TrigramIndex(str(root)), root)
+
+
+def test_patterns_the_index_cannot_read_fall_back():
+    assert required_trigrams("foo[[:space:]]bar") is None
+    assert required_trigrams("a.b") is None
+    assert required_trigrams("foo|b") is None
+    assert required_trigrams("handler") is not None